@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import numpy as np
+import argparse, json, os, time
+from embedding_store import open_store, store_path, create_store, finish_store
+from self_similarity import normalize
+
+'''
+Script for aligning independently trained year slices (train_diachronic_embeddings.py --independent, packed with
+embedding_store.py --independent) onto a reference slice with orthogonal Procrustes. Every slice is rotated onto
+the reference over the vocabulary they share; the rotations of all slices are solved as one batched SVD.
+The aligned slices are written as a separate store (_aligned by default), which the query scripts read with --aligned.
+'''
+
+def procrustes_rotations(store, reference):
+	'''Returns a slice x dim x dim array of orthogonal matrices R minimizing |X_slice R - X_reference|
+	over the words shared by each slice and the reference slice'''
+
+	ref_idx = store.slices.index(reference)
+	dim = store.vectors.shape[2]
+	cross_covariances = np.empty((len(store.slices), dim, dim))
+	for slice_idx in range(len(store.slices)):
+		shared = np.flatnonzero(np.asarray(store.present[slice_idx]) & np.asarray(store.present[ref_idx]))
+		cross_covariances[slice_idx] = np.dot(normalize(store.vectors[slice_idx][shared]).T, normalize(store.vectors[ref_idx][shared]))
+	# Batched SVD over all slices: R = U V^T
+	u, s, vt = np.linalg.svd(cross_covariances)
+	return np.matmul(u, vt)
+
+def align_store(store, reference, out_dir, block_size = 65536):
+	'''Writes all slices of a store, rotated onto the reference slice, to a new store'''
+
+	rotations = procrustes_rotations(store, reference)
+	num_slices, num_words, dim = store.vectors.shape
+	vectors = create_store(out_dir, num_slices, num_words, dim)
+	for slice_idx in range(num_slices):
+		for start in range(0, num_words, block_size):
+			end = min(start + block_size, num_words)
+			vectors[slice_idx, start:end] = np.dot(store.vectors[slice_idx, start:end], rotations[slice_idx])
+	vectors.flush()
+	del vectors
+	meta = dict(store.meta)
+	meta['aligned_to'] = reference
+	finish_store(out_dir, store.vocab, np.asarray(store.present), meta)
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('newspaper', metavar = 'trouw|volkskrant', type = str, help = "Specify which newspaper (Trouw or Volkskrant) to align")
+	parser.add_argument('-rf', '--reference', metavar = 'YEAR', type = int, default = 2016, help = "Year slice to align all other slices onto, default is 2016")
+	parser.add_argument('-o', '--output-suffix', metavar = 'SUFFIX', type = str, default = '_aligned', help = "Suffix of the aligned output store, default is _aligned (read by the query scripts with --aligned)")
+	args = parser.parse_args()
+	paper = args.newspaper
+	if paper not in ['volkskrant', 'trouw']:
+		print 'Not an available newspaper!'
+		raise SystemExit
+
+	time_0 = time.time()
+	store = open_store(paper, '_independent')
+	out_dir = store_path(paper, args.output_suffix)
+	# Only ever replace a previously aligned store, never the chained or independent embeddings
+	meta_fn = os.path.join(out_dir, 'meta.json')
+	if os.path.exists(meta_fn) and 'aligned_to' not in json.load(open(meta_fn)):
+		print 'Quitting: {0} holds embeddings that were not aligned, choose another --output-suffix'.format(out_dir)
+		raise SystemExit
+	print 'Aligning {0} slices of {1} onto {2}...'.format(len(store.slices), paper, args.reference)
+	align_store(store, args.reference, out_dir)
+	print 'Done! Wrote {0}, took {1:.2f} seconds'.format(out_dir, time.time() - time_0)
@@ -3,83 +3,108 @@
 
 import argparse
 import json
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ticker
+import os
+import numpy as np
+import matplotlib
 from math import log, log10
+from multiprocessing import Pool
+from scipy.stats import t as t_distribution
 from scipy.stats.stats import pearsonr, spearmanr
+from results_io import load_results
+from self_similarity import normalized_distance
 
-''' Script that takes the raw data (output of query_words_in_embeddings.py), does frequency cut-off, 
-	frequency discounting, and plotting for a given word. Also calculates some correlations.'''
-
-# Get arguments
-parser = argparse.ArgumentParser(description = '')
-parser.add_argument('results', metavar = 'RESULTS.json', type = str, help = "Specify the file containing the raw data (in json-format) to analyze.")
-parser.add_argument('--avg', '-a', metavar = 'AVG_SIM.json', type = str, help = "Specify the file containing the average similarity to plot.")
-parser.add_argument('--word', '-w', metavar = 'WORD', type = str, help = "Runs the analysis for a given word.")
-parser.add_argument('--min-count', '-mc', metavar = 'COUNT', type = int, help = "If given, returns the list of words with a count > COUNT in all years in both newspapers.")
-parser.add_argument('--min-freq', '-mf', metavar = 'FREQ', type = float, help = "If given, returns the list of words with a freq > FREQ in all years in both newspapers.")
-parser.add_argument('--min-avg-freq', '-maf', metavar = 'FREQ', type = float, help = "If given, returns the list of words with a average freq > FREQ in both newspapers.")
-args = parser.parse_args()
-
-# Read data, remove words which don't occur in both embedding sets
-results = json.load(open(args.results, 'r'))
-clean_results = {}
-for word in results:
-	if len(results[word]) == 133:
-		clean_results[word] = results[word]
-results = clean_results
-
-# Take data for a single word, plot self-distance over time
-if args.word:
-	# Read data
-	try:
-		results = results[args.word]
-	except KeyError:
-		raise SystemExit("Quitting: Word {0} not found".format(args.word))
-	if args.avg:
-		average_similarity = json.load(open(args.avg, 'r'))
-
-	# Get values of different variables
-	years = range(1995,2016)
-	sorted_keys = sorted(results.keys()) # Make sure keys are sorted as to not mix up years!
-	volkskrant_count= [float(results[key]) for key in sorted_keys if 'count_volkskrant' in key][1:]
-	trouw_count = [float(results[key]) for key in sorted_keys if 'count_trouw' in key][1:]
-	volkskrant_frequency = [float(results[key]) for key in sorted_keys if 'frequency_volkskrant' in key][1:]
-	trouw_frequency = [float(results[key]) for key in sorted_keys if 'frequency_trouw' in key][1:]
-	volkskrant_similarity = [float(results[key]) for key in sorted_keys if 'similarity_volkskrant' in key][1:]
-	trouw_similarity = [float(results[key]) for key in sorted_keys if 'similarity_trouw' in key][1:]
-	volkskrant_distance = [1 - similarity for similarity in volkskrant_similarity]
-	trouw_distance = [1 - similarity for similarity in trouw_similarity]
-	if args.avg:
-		volkskrant_average_similarity = [float(average_similarity[key]) for key in sorted(average_similarity.keys()) if 'avg_similarity_volkskrant' in key][1:-1]
-		trouw_average_similarity = [float(average_similarity[key]) for key in sorted(average_similarity.keys()) if 'avg_similarity_trouw' in key][1:-1]
-
-	# Get some correlations
-	print 'Trouw similarity vs. Volkskrant similarity: ' + str(spearmanr(trouw_similarity, volkskrant_similarity))
-	print 'Trouw frequency vs. Volskrant frequency:  ' + str(spearmanr(trouw_frequency, volkskrant_frequency))
-	print 'Trouw similaritys vs. Trouw frequency: ' + str(spearmanr(trouw_similarity, trouw_frequency))
-	print 'Volkskrant similarity vs. Volkskrant frequency: ' + str(spearmanr(volkskrant_similarity, volkskrant_frequency))
-	print 'Average frequency (Trouw, Volkskrant): ' + str((sum(trouw_frequency)/len(trouw_frequency),sum(volkskrant_frequency)/len(volkskrant_frequency)))
-	print 'Average similarity (Trouw, Volkskrant): ' + str((sum(trouw_similarity)/len(trouw_similarity),sum(volkskrant_similarity)/len(volkskrant_similarity)))
-
-	# Calculate a normalized distance
-	volkskrant_min_frequency = min(volkskrant_frequency)
-	volkskrant_log_frequency = [log10(x) + 1 for x in volkskrant_frequency]
-	volkskrant_norm_log_frequency = [x/min(volkskrant_log_frequency) for x in volkskrant_log_frequency]
-	volkskrant_norm_distance = [(1.0 - similarity) / volkskrant_norm_log_frequency[idx] for idx, similarity in enumerate(volkskrant_similarity)]
-	trouw_min_frequency = min(trouw_frequency)
-	trouw_log_frequency = [log10(x) + 1 for x in trouw_frequency]
-	trouw_norm_log_frequency = [x/min(trouw_log_frequency) for x in trouw_log_frequency]
-	trouw_norm_distance = [(1.0 - similarity) / trouw_norm_log_frequency[idx] for idx, similarity in enumerate(trouw_similarity)]
+''' Script that takes the raw data (output of query_words_in_embeddings.py), does frequency cut-off,
+	frequency discounting, and plotting for a given word. Also calculates some correlations.
+	In batch mode, cut-offs, correlations and normalized distances are computed for all words at once.
+	Plots can also be rendered headless to files, for a whole list of words in a pool of processes.'''
+
+def rank_rows(values):
+	'''Ranks the values in each row (1-based, ties get their average rank, as in scipy.stats.rankdata)'''
+
+	less = (values[:, np.newaxis, :] < values[:, :, np.newaxis]).sum(axis = 2)
+	equal = (values[:, np.newaxis, :] == values[:, :, np.newaxis]).sum(axis = 2)
+	return less + (equal + 1) / 2.0
+
+def pearson_rows(x, y):
+	'''Computes the Pearson correlation and two-sided p-value between corresponding rows of two arrays'''
+
+	x = x - x.mean(axis = 1)[:, np.newaxis]
+	y = y - y.mean(axis = 1)[:, np.newaxis]
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		r = (x * y).sum(axis = 1) / np.sqrt((x * x).sum(axis = 1) * (y * y).sum(axis = 1))
+		r = np.clip(r, -1.0, 1.0)
+		dof = x.shape[1] - 2
+		t = r * np.sqrt(dof / ((1.0 - r) * (1.0 + r)))
+	return r, 2 * t_distribution.sf(np.abs(t), dof)
+
+def spearman_rows(x, y):
+	'''Computes the Spearman rank correlation and two-sided p-value between corresponding rows of two arrays'''
+
+	return pearson_rows(rank_rows(x), rank_rows(y))
+
+def word_series(results, word, average_similarity = None):
+	'''Gets the values of all variables by year for a word (from 1995, as the first year is left out).
+	Returns the years, and per newspaper a dict of lists. Raises KeyError if the word is not in the results'''
+
+	row = results.word(word)
+	years = results.years[1:]
+	series = {}
+	for paper_idx, paper in enumerate(results.papers):
+		count = list(results.count[row, paper_idx, 1:])
+		frequency = list(results.frequency[row, paper_idx, 1:])
+		similarity = list(results.similarity[row, paper_idx, 1:])
+		# Calculate a normalized distance
+		log_frequency = [log10(x) + 1 for x in frequency]
+		norm_log_frequency = [x/min(log_frequency) for x in log_frequency]
+		norm_distance = [(1.0 - value) / norm_log_frequency[idx] for idx, value in enumerate(similarity)]
+		series[paper] = {'count': count, 'frequency': frequency, 'similarity': similarity, 'norm_distance': norm_distance}
+		if average_similarity:
+			# Look up the same years as the results (year Y is between Y+1 and Y), missing years are left as gaps
+			series[paper]['average_similarity'] = [float(average_similarity.get('avg_similarity_{0}_{1}_{2}'.format(paper, year + 1, year), np.nan)) for year in years]
+	return years, series
+
+def print_correlations(series):
+	'''Prints the correlations between the variables of a word'''
+
+	trouw = series['trouw']
+	volkskrant = series['volkskrant']
+	print 'Trouw similarity vs. Volkskrant similarity: ' + str(spearmanr(trouw['similarity'], volkskrant['similarity']))
+	print 'Trouw frequency vs. Volskrant frequency:  ' + str(spearmanr(trouw['frequency'], volkskrant['frequency']))
+	print 'Trouw similaritys vs. Trouw frequency: ' + str(spearmanr(trouw['similarity'], trouw['frequency']))
+	print 'Volkskrant similarity vs. Volkskrant frequency: ' + str(spearmanr(volkskrant['similarity'], volkskrant['frequency']))
+	print 'Average frequency (Trouw, Volkskrant): ' + str((sum(trouw['frequency'])/len(trouw['frequency']),sum(volkskrant['frequency'])/len(volkskrant['frequency'])))
+	print 'Average similarity (Trouw, Volkskrant): ' + str((sum(trouw['similarity'])/len(trouw['similarity']),sum(volkskrant['similarity'])/len(volkskrant['similarity'])))
+
+def show_or_save(plt, fig, fn):
+	'''Shows a figure interactively, or writes it to a file and closes it if a filename is given'''
+
+	if fn is None:
+		plt.show()
+	else:
+		fig.savefig(fn)
+		plt.close(fig)
+
+def plot_word(word, years, series, plot_dir = None):
+	'''Plots the analysis of a word, and the figures for slides/paper. Shows the figures interactively,
+	or writes them to {word}_analysis.png, {word}.png and {word}_frequency.png in plot_dir if given'''
+
+	# Imported here, so the backend can be chosen first
+	import matplotlib.pyplot as plt
+	import matplotlib.ticker as ticker
+	trouw = series['trouw']
+	volkskrant = series['volkskrant']
+	fns = [None, None, None]
+	if plot_dir is not None:
+		fns = [os.path.join(plot_dir, fn.format(word.encode('utf-8') if isinstance(word, unicode) else word)) for fn in ['{0}_analysis.png', '{0}.png', '{0}_frequency.png']]
 
 	# Plot all variables for analysis
-	fig = plt.figure(1, figsize=(15,10))
-	fig.suptitle('Analysis of word \'{0}\''.format(args.word), fontweight = 'bold')
+	fig = plt.figure(figsize=(15,10))
+	fig.suptitle('Analysis of word \'{0}\''.format(word.encode('utf-8') if isinstance(word, unicode) else word), fontweight = 'bold')
 
 	plt.subplot(221)
-	lines = plt.plot(years, volkskrant_count, 'b-', label='Volkskrant')
+	lines = plt.plot(years, volkskrant['count'], 'b-', label='Volkskrant')
 	plt.setp(lines, marker = '.')
-	lines = plt.plot(years, trouw_count, 'r-', label='Trouw')
+	lines = plt.plot(years, trouw['count'], 'r-', label='Trouw')
 	plt.setp(lines, marker = '.')
 	plt.legend(framealpha=0.5)
 	plt.ylim(0,)
@@ -88,9 +113,9 @@ if args.word:
 	plt.title("Word count by year")
 
 	plt.subplot(222)
-	lines = plt.plot(years, volkskrant_frequency, 'b-', label='Volkskrant')
+	lines = plt.plot(years, volkskrant['frequency'], 'b-', label='Volkskrant')
 	plt.setp(lines, marker = '.')
-	lines = plt.plot(years, trouw_frequency, 'r-', label='Trouw')
+	lines = plt.plot(years, trouw['frequency'], 'r-', label='Trouw')
 	plt.setp(lines, marker = '.')
 	plt.legend(framealpha=0.5)
 	plt.ylim(0,)
@@ -99,13 +124,13 @@ if args.word:
 	plt.title("Word frequency by year")
 
 	plt.subplot(223)
-	lines = plt.plot(years, volkskrant_similarity, 'b-', label='Volkskrant')
+	lines = plt.plot(years, volkskrant['similarity'], 'b-', label='Volkskrant')
 	plt.setp(lines, marker = '.')
-	lines = plt.plot(years, trouw_similarity, 'r-', label='Trouw')
+	lines = plt.plot(years, trouw['similarity'], 'r-', label='Trouw')
 	plt.setp(lines, marker = '.')
-	if args.avg:
-		lines = plt.plot(years, volkskrant_average_similarity, 'b--', label='Volkskrant average')
-		lines = plt.plot(years, trouw_average_similarity, 'r--', label='Trouw average')
+	if 'average_similarity' in trouw:
+		lines = plt.plot(years, volkskrant['average_similarity'], 'b--', label='Volkskrant average')
+		lines = plt.plot(years, trouw['average_similarity'], 'r--', label='Trouw average')
 	plt.legend(framealpha=0.5)
 	plt.ylim(0,1)
 	plt.xlabel("Year")
@@ -113,9 +138,9 @@ if args.word:
 	plt.title("Cosine self-similarity by year")
 
 	plt.subplot(224)
-	lines = plt.plot(years, volkskrant_norm_distance, 'b-', label='Volkskrant')
+	lines = plt.plot(years, volkskrant['norm_distance'], 'b-', label='Volkskrant')
 	plt.setp(lines, marker = '.')
-	lines = plt.plot(years, trouw_norm_distance, 'r-', label='Trouw')
+	lines = plt.plot(years, trouw['norm_distance'], 'r-', label='Trouw')
 	plt.setp(lines, marker = '.')
 	plt.legend(framealpha=0.5)
 	plt.ylim(0,1)
@@ -123,91 +148,167 @@ if args.word:
 	plt.ylabel("Normalized self-distance")
 	plt.title("Normalized self-distance by year")
 
-	plt.show()
+	show_or_save(plt, fig, fns[0])
 
 	# Plots for slides/paper
-	# #5d0919 = 20% dark crimson 
+	# #5d0919 = 20% dark crimson
 	color_1 = '#5d0919'
 	# #4781eb = 60% dark cornflowerblue
 	color_2 = '#4781eb'
-	
-	plt.rcParams.update({'font.size': 29})
-	fig = plt.figure(1, figsize=(25.58,8), tight_layout = True)
-	lines = plt.plot(years, volkskrant_similarity, linestyle='solid', color=color_2, label='Volkskrant', linewidth = 4.0, markeredgewidth = 7.5)
-	plt.setp(lines, marker = '.')
-	lines = plt.plot(years, trouw_similarity, linestyle='solid', color=color_1, label='Trouw', linewidth = 4.0, markeredgewidth = 7.5)
-	plt.setp(lines, marker = 's')
-	if args.avg:
-		lines = plt.plot(years, volkskrant_average_similarity, linestyle='dashed', color=color_2, label='Volkskrant average', linewidth = 3.0)
-		lines = plt.plot(years, trouw_average_similarity, linestyle='dashed', color=color_1, label='Trouw average', linewidth = 3.0)
-	plt.legend(framealpha=0.5)
-	plt.ylim(0,1)
-	plt.xlim(years[0]-.5,years[-1]+.5)
-	plt.xlabel("Year")
-	plt.ylabel("Self-similarity of year to year+1")
-	ax = plt.gca()
-	ax.xaxis.set_major_locator(ticker.MultipleLocator(1))
-	plt.show()
-
-	plt.rcParams.update({'font.size': 29})
-	fig = plt.figure(1, figsize=(25.58,8), tight_layout = True)
-	lines = plt.plot(years, volkskrant_frequency, linestyle='solid', color=color_2, label='Volkskrant', linewidth = 4.0, markeredgewidth = 7.5)
-	plt.setp(lines, marker = '.')
-	lines = plt.plot(years, trouw_frequency, linestyle='solid', color=color_1, label='Trouw', linewidth = 4.0, markeredgewidth = 7.5)
-	plt.setp(lines, marker = 's')
-	plt.legend(framealpha=0.5)
-	plt.ylim(0,)
-	plt.xlim(years[0]-.5,years[-1]+.5)
-	plt.xlabel("Year")
-	plt.ylabel("Frequency (words per million)")
-	ax = plt.gca()
-	ax.xaxis.set_major_locator(ticker.MultipleLocator(1))
-	plt.show()
-
-# Give word list with minimum count
-word_list = []
-if args.min_count:
-	for word in results:
-		under_count = False
-		word_results = results[word]
-		for key in word_results:
-			if 'count' in key:
-				if int(word_results[key]) < args.min_count:
-					under_count = True
-					print '{0} has too low count in at least one year'.format(word)
-					break
-		if not under_count:
-			word_list.append(word.encode('utf-8'))	
-	print 'Remaining words: {0}'.format(', '.join(word_list))
-
-# Give word list with minimum count
-word_list = []
-if args.min_freq:
-	for word in results:
-		under_count = False
-		word_results = results[word]
-		for key in word_results:
-			if 'frequency' in key:
-				if float(word_results[key]) < args.min_freq:
-					under_count = True
-					print '{0} has too low frequency in at least one year'.format(word)
-					break
-		if not under_count:
-			word_list.append(word.encode('utf-8'))	
-	print 'Remaining words: {0}'.format(', '.join(word_list))
-
-# Give word list with minimum count
-word_list = []
-if args.min_avg_freq:
-	for word in results:
-		word_results = results[word]
-		freqs = []
-		for key in word_results:
-			if 'frequency' in key:
-				freqs.append(float(word_results[key]))
-		if sum(freqs)/len(freqs) > args.min_avg_freq:
-			word_list.append(word.encode('utf-8'))	
+
+	with plt.rc_context({'font.size': 29}):
+		fig = plt.figure(figsize=(25.58,8), tight_layout = True)
+		lines = plt.plot(years, volkskrant['similarity'], linestyle='solid', color=color_2, label='Volkskrant', linewidth = 4.0, markeredgewidth = 7.5)
+		plt.setp(lines, marker = '.')
+		lines = plt.plot(years, trouw['similarity'], linestyle='solid', color=color_1, label='Trouw', linewidth = 4.0, markeredgewidth = 7.5)
+		plt.setp(lines, marker = 's')
+		if 'average_similarity' in trouw:
+			lines = plt.plot(years, volkskrant['average_similarity'], linestyle='dashed', color=color_2, label='Volkskrant average', linewidth = 3.0)
+			lines = plt.plot(years, trouw['average_similarity'], linestyle='dashed', color=color_1, label='Trouw average', linewidth = 3.0)
+		plt.legend(framealpha=0.5)
+		plt.ylim(0,1)
+		plt.xlim(years[0]-.5,years[-1]+.5)
+		plt.xlabel("Year")
+		plt.ylabel("Self-similarity of year to year+1")
+		ax = plt.gca()
+		ax.xaxis.set_major_locator(ticker.MultipleLocator(1))
+		show_or_save(plt, fig, fns[1])
+
+		fig = plt.figure(figsize=(25.58,8), tight_layout = True)
+		lines = plt.plot(years, volkskrant['frequency'], linestyle='solid', color=color_2, label='Volkskrant', linewidth = 4.0, markeredgewidth = 7.5)
+		plt.setp(lines, marker = '.')
+		lines = plt.plot(years, trouw['frequency'], linestyle='solid', color=color_1, label='Trouw', linewidth = 4.0, markeredgewidth = 7.5)
+		plt.setp(lines, marker = 's')
+		plt.legend(framealpha=0.5)
+		plt.ylim(0,)
+		plt.xlim(years[0]-.5,years[-1]+.5)
+		plt.xlabel("Year")
+		plt.ylabel("Frequency (words per million)")
+		ax = plt.gca()
+		ax.xaxis.set_major_locator(ticker.MultipleLocator(1))
+		show_or_save(plt, fig, fns[2])
+
+def init_plot_worker(results_fn, average_fn, plot_dir):
+	'''Loads the results (and average similarity) once per worker process'''
+
+	global worker_results, worker_average, worker_plot_dir
+	matplotlib.use('Agg')
+	worker_results = load_results(results_fn).complete()
+	worker_average = json.load(open(average_fn, 'r')) if average_fn else None
+	worker_plot_dir = plot_dir
+
+def plot_word_job(word):
+	'''Renders the plots of a single word to files in a worker process, returns the word and whether it was found'''
+
+	try:
+		years, series = word_series(worker_results, word, worker_average)
+	except KeyError:
+		return word, False
+	plot_word(word, years, series, worker_plot_dir)
+	return word, True
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('results', metavar = 'RESULTS.npz', type = str, help = "Specify the file containing the raw data (columnar .npz, or old json-format) to analyze.")
+	parser.add_argument('--avg', '-a', metavar = 'AVG_SIM.json', type = str, help = "Specify the file containing the average similarity to plot.")
+	parser.add_argument('--word', '-w', metavar = 'WORD', type = str, help = "Runs the analysis for a given word.")
+	parser.add_argument('--min-count', '-mc', metavar = 'COUNT', type = int, help = "If given, returns the list of words with a count > COUNT in all years in both newspapers.")
+	parser.add_argument('--min-freq', '-mf', metavar = 'FREQ', type = float, help = "If given, returns the list of words with a freq > FREQ in all years in both newspapers.")
+	parser.add_argument('--min-avg-freq', '-maf', metavar = 'FREQ', type = float, help = "If given, returns the list of words with a average freq > FREQ in both newspapers.")
+	parser.add_argument('--batch', '-b', metavar = 'SUMMARY.tsv', type = str, help = "Analyzes all words passing the given cut-offs at once, and writes a summary table of correlations and normalized distances.")
+	parser.add_argument('--plot-list', '-pl', metavar = 'LIST', type = str, help = "Renders the plots of every word in the list (one-per-line) to files, without showing them.")
+	parser.add_argument('--plot-dir', '-pd', metavar = 'DIR', type = str, help = "Writes the plots to files in DIR instead of showing them, default for --plot-list is plots.")
+	parser.add_argument('--processes', '-p', metavar = 'NUM_PROCESSES', type = int, help = "Number of processes to render plots with, default is the number of cores")
+	args = parser.parse_args()
+	if args.plot_list and not args.plot_dir:
+		args.plot_dir = 'plots'
+	if args.plot_dir:
+		matplotlib.use('Agg')
+		if not os.path.exists(args.plot_dir):
+			os.makedirs(args.plot_dir)
+
+	# Read data, remove words which don't occur in both embedding sets
+	results = load_results(args.results).complete()
+
+	# Take data for a single word, plot self-distance over time
+	if args.word:
+		# Read data
+		if args.avg:
+			average_similarity = json.load(open(args.avg, 'r'))
 		else:
-			pass
-			print '{0} has too low frequency in at least one year'.format(word)
-	print 'Remaining words: {0}'.format(', '.join(word_list))
+			average_similarity = None
+		try:
+			years, series = word_series(results, args.word, average_similarity)
+		except KeyError:
+			raise SystemExit("Quitting: Word {0} not found".format(args.word))
+
+		# Get some correlations
+		print_correlations(series)
+
+		# Plot all variables for analysis
+		plot_word(args.word, years, series, args.plot_dir)
+
+	# Render plots for a list of words in a pool of processes
+	if args.plot_list:
+		words = [line.strip() for line in open(args.plot_list, 'r') if line.strip()]
+		pool = Pool(args.processes, init_plot_worker, (args.results, args.avg, args.plot_dir))
+		num_plotted = 0
+		for word, found in pool.imap_unordered(plot_word_job, words):
+			if found:
+				num_plotted += 1
+				print 'Plotted {0}'.format(word)
+			else:
+				print 'No results for {0}'.format(word)
+		pool.close()
+		pool.join()
+		print 'Wrote plots of {0} of {1} words to {2}'.format(num_plotted, len(words), args.plot_dir)
+
+	# Apply cut-offs as masks over all words
+	keep = np.ones(len(results.words), dtype = bool)
+	cutoffs = []
+	if args.min_count:
+		cutoffs.append(('count', (results.count >= args.min_count).all(axis = (1, 2))))
+	if args.min_freq:
+		cutoffs.append(('frequency', (results.frequency >= args.min_freq).all(axis = (1, 2))))
+	if args.min_avg_freq:
+		cutoffs.append(('frequency', results.frequency.mean(axis = (1, 2)) > args.min_avg_freq))
+
+	# Give word list for each cut-off
+	for cat, mask in cutoffs:
+		word_list = []
+		for word_idx, word in enumerate(results.words):
+			if mask[word_idx]:
+				word_list.append(word.encode('utf-8'))
+			else:
+				print '{0} has too low {1} in at least one year'.format(word, cat)
+		print 'Remaining words: {0}'.format(', '.join(word_list))
+		keep &= mask
+
+	# Analyze all remaining words at once, write summary table
+	if args.batch:
+		batch = results.select(keep)
+		similarity = dict((paper, batch.similarity[:, idx, 1:]) for idx, paper in enumerate(batch.papers))
+		frequency = dict((paper, batch.frequency[:, idx, 1:]) for idx, paper in enumerate(batch.papers))
+		norm_distance = dict((paper, normalized_distance(similarity[paper], frequency[paper])) for paper in batch.papers)
+		columns = [
+			('spearman_similarity_trouw_volkskrant', spearman_rows(similarity['trouw'], similarity['volkskrant'])),
+			('spearman_frequency_trouw_volkskrant', spearman_rows(frequency['trouw'], frequency['volkskrant'])),
+			('spearman_similarity_frequency_trouw', spearman_rows(similarity['trouw'], frequency['trouw'])),
+			('spearman_similarity_frequency_volkskrant', spearman_rows(similarity['volkskrant'], frequency['volkskrant'])),
+			('pearson_similarity_trouw_volkskrant', pearson_rows(similarity['trouw'], similarity['volkskrant'])),
+		]
+		header = ['word']
+		values = []
+		for name, (r, p) in columns:
+			header += [name, name + '_p']
+			values += [r, p]
+		for paper in ['trouw', 'volkskrant']:
+			header += ['avg_frequency_' + paper, 'avg_similarity_' + paper, 'avg_norm_distance_' + paper, 'max_norm_distance_' + paper, 'max_norm_distance_year_' + paper]
+			values += [frequency[paper].mean(axis = 1), similarity[paper].mean(axis = 1), np.nanmean(norm_distance[paper], axis = 1), np.nanmax(norm_distance[paper], axis = 1),
+				np.array(batch.years[1:])[np.argmax(np.nan_to_num(norm_distance[paper]), axis = 1)]]
+		with open(args.batch, 'w') as of:
+			of.write('\t'.join(header) + '\n')
+			for word_idx, word in enumerate(batch.words):
+				of.write('\t'.join([word.encode('utf-8')] + ['{0:.6g}'.format(column[word_idx]) for column in values]) + '\n')
+		print 'Wrote summary of {0} words to {1}'.format(len(batch.words), args.batch)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Crash-safe store of scraped articles, keyed by URL hash, so interrupted scrapes can be resumed'''
+
+import hashlib, sqlite3, time
+
+def url_hash(url):
+	'''Returns the key of an article URL in the store'''
+
+	return hashlib.sha1(url.encode('utf-8') if isinstance(url, unicode) else url).hexdigest()
+
+class ArticleStore(object):
+	'''SQLite store with fetch status, HTTP status and text per article URL'''
+
+	def __init__(self, fn, commit_every = 100):
+		self.connection = sqlite3.connect(fn)
+		self.connection.execute('CREATE TABLE IF NOT EXISTS articles (url_hash TEXT PRIMARY KEY, url TEXT, status TEXT, http_status INTEGER, text TEXT, fetched REAL)')
+		self.connection.commit()
+		self.commit_every = commit_every
+		self.uncommitted = 0
+
+	def done_urls(self):
+		'''Returns the set of URLs that have been fetched successfully'''
+
+		return set(row[0] for row in self.connection.execute("SELECT url FROM articles WHERE status = 'done'"))
+
+	def add(self, url, http_status, text):
+		'''Records the result of fetching an article, http_status is None if no response was received'''
+
+		status = 'failed' if http_status is None else 'done'
+		self.connection.execute('INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?, ?)', (url_hash(url), url, status, http_status, text, time.time()))
+		self.uncommitted += 1
+		if self.uncommitted >= self.commit_every:
+			self.commit()
+
+	def commit(self):
+		self.connection.commit()
+		self.uncommitted = 0
+
+	def articles(self):
+		'''Yields (url hash, text) of all fetched articles, in the order they were stored'''
+
+		for row in self.connection.execute("SELECT url_hash, text FROM articles WHERE status = 'done' ORDER BY rowid"):
+			yield row
+
+	def export(self, fn, urls = None, exclude = ()):
+		'''Writes the text of all fetched articles to a flat text file, in the order of urls (or of the store if urls is None),
+		skipping articles whose URL hash is in exclude. Returns number of articles written'''
+
+		num_articles = 0
+		with open(fn, 'w') as of:
+			if urls is None:
+				rows = self.articles()
+			else:
+				rows = (self.connection.execute("SELECT url_hash, text FROM articles WHERE url_hash = ? AND status = 'done'", (url_hash(url),)).fetchone() for url in urls)
+			for row in rows:
+				if row is not None and row[0] not in exclude:
+					of.write(row[1].encode('utf-8'))
+					num_articles += 1
+		return num_articles
+
+	def close(self):
+		self.commit()
+		self.connection.close()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import hashlib, json, os, shutil, tempfile, time
+
+'''
+Content-addressed cache for derived artifacts (trained slices, frequency indexes, embedding stores, query results).
+A stage's outputs are stored under a fingerprint of everything they depend on: the content hashes of its input
+files, its parameters (e.g. Word2Vec hyperparameters and flags) and, for chained slices, the fingerprint of the
+previous slice. A stage whose fingerprint is in the cache is skipped and its outputs are copied back, so
+re-running an experiment with one changed flag only recomputes what that flag affects. File hashes are
+remembered by path, size and modification time, so unchanged inputs are not hashed again. The cache is bounded
+in size by evicting the least recently used entries. It is only used by scripts run with --cache.
+'''
+
+def add_arguments(parser):
+	'''Adds the --cache, --cache-dir and --cache-size arguments to a script's argument parser'''
+
+	parser.add_argument('-ca', '--cache', action = 'store_true', help = "Skip stages whose outputs are in the artifact cache, and store new outputs in it")
+	parser.add_argument('-cd', '--cache-dir', metavar = 'DIR', type = str, default = 'working/cache', help = "Specify the directory of the artifact cache, default is working/cache")
+	parser.add_argument('-cs', '--cache-size', metavar = 'GB', type = float, default = 20.0, help = "Maximum size of the artifact cache in GB, default is 20")
+
+def open_cache(args):
+	'''Returns the artifact cache configured by the command line arguments, or None without --cache'''
+
+	if not args.cache:
+		return None
+	return ArtifactCache(args.cache_dir, int(args.cache_size * 1024 ** 3))
+
+def directory_size(directory):
+	'''Returns the total size in bytes of the files in a directory'''
+
+	return sum(os.path.getsize(os.path.join(directory, fn)) for fn in os.listdir(directory))
+
+class ArtifactCache(object):
+	'''Directory of cache entries, one subdirectory per stage and fingerprint holding the output files of that stage'''
+
+	def __init__(self, directory = 'working/cache', max_bytes = 20 * 1024 ** 3):
+		self.directory = directory
+		self.max_bytes = max_bytes
+		if not os.path.exists(directory):
+			os.makedirs(directory)
+		self.digests_fn = os.path.join(directory, 'digests.json')
+		self.digests = {}
+		if os.path.exists(self.digests_fn):
+			with open(self.digests_fn, 'r') as f:
+				self.digests = json.load(f)
+
+	def digest(self, fn, block_size = 1 << 20):
+		'''Returns the SHA-1 of a file's content, hashing it only if its size or modification time changed'''
+
+		path = os.path.abspath(fn)
+		stat = os.stat(path)
+		known = self.digests.get(path)
+		if known and known[0] == stat.st_size and known[1] == stat.st_mtime:
+			return known[2]
+		sha1 = hashlib.sha1()
+		with open(path, 'rb') as f:
+			for block in iter(lambda: f.read(block_size), b''):
+				sha1.update(block)
+		self.digests[path] = [stat.st_size, stat.st_mtime, sha1.hexdigest()]
+		self.write_json(self.digests_fn, self.digests)
+		return sha1.hexdigest()
+
+	def fingerprint(self, stage, inputs = (), params = None):
+		'''Returns the fingerprint of a stage, from the content of its input files and its parameters'''
+
+		key = {'stage': stage, 'inputs': [self.digest(fn) for fn in inputs], 'params': params or {}}
+		return hashlib.sha1(json.dumps(key, sort_keys = True)).hexdigest()
+
+	def entry_path(self, stage, fingerprint):
+		'''Returns the directory of a cache entry'''
+
+		return os.path.join(self.directory, '{0}_{1}'.format(stage, fingerprint))
+
+	def has(self, stage, fingerprint):
+		'''Returns whether the outputs of a stage are cached under a fingerprint'''
+
+		return os.path.exists(os.path.join(self.entry_path(stage, fingerprint), 'entry.json'))
+
+	def restore(self, stage, fingerprint, out_dir):
+		'''Copies the cached outputs of a stage to out_dir, returns the restored filenames, or None if not cached'''
+
+		entry = self.entry_path(stage, fingerprint)
+		if not self.has(stage, fingerprint):
+			return None
+		with open(os.path.join(entry, 'entry.json'), 'r') as f:
+			outputs = json.load(f)['outputs']
+		if not os.path.exists(out_dir):
+			os.makedirs(out_dir)
+		restored = []
+		for fn in outputs:
+			shutil.copy2(os.path.join(entry, fn), os.path.join(out_dir, fn))
+			restored.append(os.path.join(out_dir, fn))
+		os.utime(entry, None) # Mark as recently used
+		return restored
+
+	def store(self, stage, fingerprint, outputs, meta = None):
+		'''Copies the output files of a stage into the cache under a fingerprint, then evicts old entries if needed'''
+
+		entry = self.entry_path(stage, fingerprint)
+		if self.has(stage, fingerprint):
+			return
+		# Write to a temporary directory first, so concurrent processes never see a partial entry
+		tmp_entry = tempfile.mkdtemp(prefix = '.tmp_', dir = self.directory)
+		for fn in outputs:
+			shutil.copy2(fn, os.path.join(tmp_entry, os.path.basename(fn)))
+		self.write_json(os.path.join(tmp_entry, 'entry.json'), {'stage': stage, 'fingerprint': fingerprint, 'outputs': [os.path.basename(fn) for fn in outputs], 'meta': meta or {}, 'created': time.time()})
+		try:
+			os.rename(tmp_entry, entry)
+		except OSError: # Stored by another process in the meantime
+			shutil.rmtree(tmp_entry)
+		self.evict()
+
+	def evict(self):
+		'''Removes the least recently used entries until the cache fits in its maximum size'''
+
+		entries = []
+		for name in os.listdir(self.directory):
+			entry = os.path.join(self.directory, name)
+			if os.path.isdir(entry) and not name.startswith('.tmp_'):
+				entries.append((os.path.getmtime(entry), directory_size(entry), entry))
+		total = sum(size for mtime, size, entry in entries)
+		for mtime, size, entry in sorted(entries):
+			if total <= self.max_bytes:
+				break
+			shutil.rmtree(entry, ignore_errors = True)
+			total -= size
+
+	def write_json(self, fn, data):
+		'''Writes a JSON file atomically'''
+
+		tmp_fn = '{0}.{1}.tmp'.format(fn, os.getpid())
+		with open(tmp_fn, 'w') as of:
+			json.dump(data, of)
+		os.rename(tmp_fn, fn)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Measures article text extraction throughput per backend over a directory of saved article pages'''
+
+import argparse, os, time, multiprocessing
+import extractors
+
+if __name__ == '__main__':
+	# Parse arguments
+	parser = argparse.ArgumentParser(description = 'Arguments for extraction benchmark')
+	parser.add_argument('newspaper', metavar = 'trouw|volkskrant', type = str, help = 'Specify which newspaper the saved pages are from')
+	parser.add_argument('sample_dir', metavar = 'DIR', type = str, help = 'Specify the directory containing saved article pages (one HTML file per article)')
+	parser.add_argument('-b', '--backends', metavar = 'lxml|soup', type = str, nargs = '+', default = ['soup', 'lxml'], help = 'Backends to benchmark, default is both')
+	parser.add_argument('-p', '--processes', metavar = 'NUM', type = int, default = 1, help = 'Number of parsing processes, default is 1')
+	parser.add_argument('-r', '--repeat', metavar = 'NUM', type = int, default = 3, help = 'Number of passes over the sample pages, default is 3')
+	args = parser.parse_args()
+	if 'lxml' in args.backends and not extractors.lxml:
+		print 'lxml is not installed, skipping it'
+		args.backends.remove('lxml')
+
+	# Read sample pages
+	pages = []
+	for fn in sorted(os.listdir(args.sample_dir)):
+		with open(os.path.join(args.sample_dir, fn), 'rb') as f:
+			pages.append(f.read())
+	num_bytes = sum(len(page) for page in pages)
+	print 'Read {0} sample pages ({1:.2f} MB)'.format(len(pages), num_bytes / 1e6)
+
+	pool = multiprocessing.Pool(args.processes) if args.processes > 1 else None
+	texts = {}
+	for backend in args.backends:
+		jobs = [(args.newspaper, backend, 200, page) for page in pages]
+		time_0 = time.time()
+		for _ in range(args.repeat):
+			if pool:
+				results = pool.map(extractors.extract_fetched_article, jobs, chunksize = 16)
+			else:
+				results = map(extractors.extract_fetched_article, jobs)
+		seconds = (time.time() - time_0) / args.repeat
+		texts[backend] = [text for http_status, text in results]
+		print '{0}: {1:.1f} pages per second, {2:.2f} MB per second ({3} processes)'.format(backend, len(pages) / seconds, num_bytes / 1e6 / seconds, args.processes)
+	if pool:
+		pool.close()
+		pool.join()
+
+	# Check that backends extract the same text
+	if len(texts) > 1:
+		reference = args.backends[0]
+		for backend in args.backends[1:]:
+			num_different = sum(1 for idx in range(len(pages)) if texts[backend][idx] != texts[reference][idx])
+			print '{0} differs from {1} on {2} of {3} pages'.format(backend, reference, num_different, len(pages))
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Measures the throughput of every stage of the pipeline on synthetic diachronic corpora and embeddings,
+and writes a machine-readable report, so regressions in any stage show up. Generates tokenized year slices
+(Zipf-distributed words) and word2vec text files of configurable size in a temporary directory, so no
+newspaper data or network is needed. Stages: training per slice, model loading, packing and opening the
+embedding store, batch self-similarity, frequency counting and lookup, batch analysis, and plotting.'''
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import argparse, codecs, json, os, platform, re, shutil, subprocess, sys, tempfile, time
+from embedding_store import pack_embeddings, open_store, w2v_path
+from frequency_index import build_frequency_index, open_frequency_index
+from self_similarity import self_similarity_matrix, normalized_distance
+from analyze_and_plot_words import spearman_rows, word_series, plot_word
+from results_io import Results
+try:
+	import gensim
+except ImportError:
+	gensim = None
+
+papers = ['volkskrant', 'trouw']
+code_dir = os.path.dirname(os.path.abspath(__file__))
+
+def generate_corpus(paper, years, vocab_size, num_sentences, sentence_length, rng):
+	'''Writes tokenized year slices of Zipf-distributed words to working/, returns the number of tokens written'''
+
+	probabilities = 1.0 / np.arange(1, vocab_size + 1)
+	probabilities /= probabilities.sum()
+	for year in years:
+		ids = rng.choice(vocab_size, (num_sentences, sentence_length), p = probabilities)
+		with codecs.open('working/{0}_{1}_tokenized'.format(paper, year), 'w', encoding = 'utf-8') as of:
+			for sentence in ids:
+				of.write(u' '.join(u'w{0}'.format(idx) for idx in sentence) + u'\n')
+	return len(years) * num_sentences * sentence_length
+
+def generate_embeddings(paper, years, vocab_size, dim, rng, drift = 0.2):
+	'''Writes word2vec text files of all year slices (trained in reverse) to working/, with vectors drifting over time'''
+
+	vectors = rng.randn(vocab_size, dim).astype(np.float32)
+	for year in years:
+		vectors += drift * rng.randn(vocab_size, dim).astype(np.float32)
+		with codecs.open(w2v_path(paper, year, '_reverse'), 'w', encoding = 'utf-8') as of:
+			of.write(u'{0} {1}\n'.format(vocab_size, dim))
+			for idx in range(vocab_size):
+				of.write(u'w{0} {1}\n'.format(idx, ' '.join('{0:.6f}'.format(x) for x in vectors[idx])))
+
+def timed(report, stage, items, unit, func, *args):
+	'''Runs a stage, adds its time and throughput to the report, returns the result of the stage'''
+
+	time_0 = time.time()
+	clock_0 = time.clock()
+	result = func(*args)
+	seconds = time.time() - time_0
+	report['stages'].append({'stage': stage, 'seconds': seconds, 'cpu_seconds': time.clock() - clock_0, 'items': items, 'unit': unit, 'rate': items / seconds if seconds > 0 else None})
+	print '{0}: {1:.3f} seconds, {2:.1f} {3} per second'.format(stage, seconds, items / seconds if seconds > 0 else float('inf'), unit)
+	return result
+
+def train_slices(paper, years, max_threads):
+	'''Trains year slices with train_diachronic_embeddings.py --independent, returns the time per slice as printed by the trainer'''
+
+	script = os.path.join(code_dir, 'train_diachronic_embeddings.py')
+	output = subprocess.check_output([sys.executable, '-u', script, paper, '--independent', '--max-threads', str(max_threads), '--years'] + [str(year) for year in years])
+	return dict((int(year), float(seconds)) for year, seconds in re.findall(r'Training on year (\d+) took ([\d.]+) seconds', output))
+
+def plot_words(results, words, plot_dir):
+	'''Renders the plots of a list of words to files'''
+
+	for word in words:
+		years, series = word_series(results, word)
+		plot_word(word, years, series, plot_dir)
+
+if __name__ == '__main__':
+	# Parse arguments
+	parser = argparse.ArgumentParser(description = 'Arguments for pipeline benchmark')
+	parser.add_argument('-o', '--output', metavar = 'REPORT.json', type = str, default = 'benchmark_report.json', help = 'Specify the file to write the report to, default is benchmark_report.json')
+	parser.add_argument('-v', '--vocab-size', metavar = 'NUM', type = int, default = 20000, help = 'Number of words in the synthetic vocabulary, default is 20000')
+	parser.add_argument('-dm', '--dim', metavar = 'NUM', type = int, default = 200, help = 'Dimension of the synthetic embeddings, default is 200')
+	parser.add_argument('-s', '--slices', metavar = 'NUM', type = int, default = 23, help = 'Number of year slices, default is 23 (1994-2016)')
+	parser.add_argument('-ns', '--sentences', metavar = 'NUM', type = int, default = 20000, help = 'Number of sentences per year slice, default is 20000')
+	parser.add_argument('-sl', '--sentence-length', metavar = 'NUM', type = int, default = 20, help = 'Number of tokens per sentence, default is 20')
+	parser.add_argument('-q', '--query-words', metavar = 'NUM', type = int, default = 5000, help = 'Number of words to query self-similarity and frequencies for, default is 5000')
+	parser.add_argument('-ts', '--train-slices', metavar = 'NUM', type = int, default = 2, help = 'Number of year slices to train on (requires gensim), 0 to skip training, default is 2')
+	parser.add_argument('-t', '--max-threads', metavar = 'NUM_THREADS', type = int, default = 4, help = 'Maximum number of threads to train with, default is 4')
+	parser.add_argument('-pw', '--plot-words', metavar = 'NUM', type = int, default = 5, help = 'Number of words to render plots for, default is 5')
+	parser.add_argument('-sd', '--seed', metavar = 'SEED', type = int, default = 1, help = 'Random seed of the synthetic data, default is 1')
+	parser.add_argument('-k', '--keep', action = 'store_true', help = 'Keep the temporary directory with the synthetic data')
+	args = parser.parse_args()
+	output = os.path.abspath(args.output)
+	years = range(2017 - args.slices, 2017)
+	reverse_years = list(reversed(years))
+
+	report = {'config': vars(args), 'python': platform.python_version(), 'numpy': np.__version__, 'gensim': gensim.__version__ if gensim else None,
+		'platform': platform.platform(), 'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'stages': []}
+	rng = np.random.RandomState(args.seed)
+	tmp_dir = tempfile.mkdtemp(prefix = 'benchmark_')
+	cwd = os.getcwd()
+	os.chdir(tmp_dir)
+	os.mkdir('working')
+	os.mkdir('plots')
+	try:
+		# Generate synthetic data
+		print 'Generating synthetic data in {0}...'.format(tmp_dir)
+		for paper in papers:
+			timed(report, 'generate_corpus_{0}'.format(paper), args.slices * args.sentences, 'sentences', generate_corpus, paper, years, args.vocab_size, args.sentences, args.sentence_length, rng)
+			timed(report, 'generate_embeddings_{0}'.format(paper), args.slices * args.vocab_size, 'vectors', generate_embeddings, paper, reverse_years, args.vocab_size, args.dim, rng)
+
+		# Training per slice
+		if args.train_slices and gensim is None:
+			print 'gensim is not installed, skipping training'
+		elif args.train_slices:
+			train_years = years[:args.train_slices]
+			slice_seconds = timed(report, 'train', len(train_years) * args.sentences, 'sentences', train_slices, 'trouw', train_years, args.max_threads)
+			for year in train_years:
+				report['stages'].append({'stage': 'train_slice_{0}'.format(year), 'seconds': slice_seconds.get(year), 'items': args.sentences, 'unit': 'sentences',
+					'rate': args.sentences / slice_seconds[year] if slice_seconds.get(year) else None})
+
+		# Frequency counting
+		for paper in papers:
+			timed(report, 'frequency_index_{0}'.format(paper), args.slices * args.sentences * args.sentence_length, 'tokens', build_frequency_index, 'working', paper, years)
+
+		# Model loading: word2vec text (as before the store), packing and opening the store
+		if gensim is not None:
+			timed(report, 'load_w2v_text', args.vocab_size, 'vectors', gensim.models.Word2Vec.load_word2vec_format, w2v_path('trouw', years[0], '_reverse'))
+		for paper in papers:
+			timed(report, 'pack_store_{0}'.format(paper), args.slices * args.vocab_size, 'vectors', pack_embeddings, paper, reverse_years, '_reverse')
+		stores = dict((paper, timed(report, 'open_store_{0}'.format(paper), args.slices, 'slices', open_store, paper, '_reverse')) for paper in papers)
+
+		# Batch self-similarity and frequency lookup, as in query_words_in_embeddings.py
+		words = [u'w{0}'.format(idx) for idx in rng.choice(args.vocab_size, min(args.query_words, args.vocab_size), replace = False)]
+		pair_years = years[:-1]
+		similarity = np.empty((len(words), len(papers), len(pair_years)))
+		count = np.empty_like(similarity)
+		frequency = np.empty_like(similarity)
+		for paper_idx, paper in enumerate(papers):
+			found, labels, similarities = timed(report, 'self_similarity_{0}'.format(paper), len(words) * len(pair_years), 'similarities', self_similarity_matrix, stores[paper], words)
+			columns = [pair_years.index(year) for year in labels]
+			similarity[:, paper_idx, columns] = similarities
+			counts = open_frequency_index('working', paper)
+			count[:, paper_idx] = timed(report, 'count_lookup_{0}'.format(paper), len(words) * len(pair_years), 'lookups', counts.count_matrix, words, pair_years)
+			frequency[:, paper_idx] = timed(report, 'frequency_lookup_{0}'.format(paper), len(words) * len(pair_years), 'lookups', counts.frequency_matrix, words, pair_years)
+		results = Results(words, papers, pair_years, similarity, count, frequency, np.ones((len(words), len(papers)), dtype = bool))
+
+		# Batch analysis, as in analyze_and_plot_words.py --batch
+		trouw_similarity = similarity[:, papers.index('trouw'), 1:]
+		trouw_frequency = frequency[:, papers.index('trouw'), 1:]
+		timed(report, 'spearman_batch', len(words), 'words', spearman_rows, trouw_similarity, similarity[:, papers.index('volkskrant'), 1:])
+		timed(report, 'normalized_distance_batch', len(words), 'words', normalized_distance, trouw_similarity, trouw_frequency)
+
+		# Plotting
+		if args.plot_words:
+			# Only words occurring in every slice, as the normalized distance needs their log-frequency
+			plottable = [word for word_idx, word in enumerate(words) if (frequency[word_idx] > 0).all()][:args.plot_words]
+			timed(report, 'plot', len(plottable), 'words', plot_words, results, plottable, 'plots')
+	finally:
+		os.chdir(cwd)
+		if args.keep:
+			print 'Kept synthetic data in {0}'.format(tmp_dir)
+		else:
+			shutil.rmtree(tmp_dir)
+
+	with open(output, 'w') as of:
+		json.dump(report, of, indent = 1)
+	print 'Wrote report of {0} stages to {1}'.format(len(report['stages']), output)
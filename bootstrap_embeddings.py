@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import argparse, multiprocessing, os, sys, time
+from multiprocessing.pool import ThreadPool
+import schedule_training
+from schedule_training import Manifest, chain_name, run_chain
+from embedding_store import pack_embeddings, bootstrap_suffix
+from frequency_index import build_frequency_index, open_frequency_index, index_path
+from shard_corpus import build_shard, shard_path
+from instrumentation import add_arguments, configure_from_args
+import artifact_cache
+
+'''
+Script for training bootstrap replicates of the reverse embedding chain of each newspaper, to estimate how much
+self-similarity varies with training noise and sampling. Every replicate trains the whole chain with its own
+random seed and, with --resample, on a Poisson resample of every slice (see train_diachronic_embeddings.py). The
+replicates share one vocabulary (from the frequency index) and, with --shards, the integer sentence shards, so
+nothing is counted or converted more than once. They run in parallel (as in schedule_training.py), splitting the
+available cores, and are packed into stores that query_words_in_embeddings.py --bootstrap summarizes per word.
+'''
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('-p', '--papers', metavar = 'trouw|volkskrant', type = str, nargs = '+', default = ['trouw', 'volkskrant'], help = "Specify which newspapers to train on, default is both")
+	parser.add_argument('-k', '--replicates', metavar = 'NUM', type = int, default = 10, help = "Number of bootstrap replicates per newspaper, default is 10")
+	parser.add_argument('-rs', '--resample', metavar = 'RATE', type = float, default = 1.0, help = "Repeat each sentence Poisson(RATE) times in every replicate, 0 to only change the random seed, default is 1.0")
+	parser.add_argument('-sd', '--seed', metavar = 'SEED', type = int, default = 1, help = "Random seed of the first replicate (the others count up from it), default is 1")
+	parser.add_argument('-va', '--vocab-all', action = 'store_true', help = "Use the whole corpus (all years) to generate the vocabulary")
+	parser.add_argument('-sh', '--shards', action = 'store_true', help = "Read the year slices from binary sentence shards (see shard_corpus.py), converting missing shards first")
+	parser.add_argument('-t', '--max-threads', metavar = 'NUM_THREADS', type = int, default = multiprocessing.cpu_count(), help = "Total number of threads to split between the replicates, default is the number of cores")
+	parser.add_argument('-j', '--jobs', metavar = 'NUM_JOBS', type = int, help = "Number of replicates to train at the same time, default is one per 4 threads")
+	parser.add_argument('-m', '--manifest', metavar = 'MANIFEST.json', type = str, default = 'working/bootstrap_manifest.json', help = "Specify where to write the manifest of finished slices")
+	add_arguments(parser)
+	artifact_cache.add_arguments(parser)
+	args = parser.parse_args()
+	configure_from_args(args)
+	cache = artifact_cache.open_cache(args)
+	for paper in args.papers:
+		if paper not in ['volkskrant', 'trouw']:
+			print '{0} is not an available newspaper!'.format(paper)
+			raise SystemExit
+	start_time = time.time()
+	years = range(1994,2017)
+
+	# Count all slices once (and convert them to shards), all replicates build their vocabulary from these counts
+	for paper in args.papers:
+		if not os.path.exists(os.path.join(index_path('working', paper), 'meta.json')):
+			print 'Counting tokens in {0}...'.format(paper)
+			build_frequency_index('working', paper, years, cache)
+		if args.shards:
+			vocab_index = open_frequency_index('working', paper).index
+			for year in years:
+				if not os.path.exists(shard_path('working', paper, year)):
+					print 'Converting {0}_{1} to a shard...'.format(paper, year)
+					build_shard('working', paper, year, vocab_index)
+
+	# Generate a chain for every replicate and newspaper
+	chains = []
+	for replicate in range(args.replicates):
+		for paper in args.papers:
+			call = [sys.executable, '-u', 'train_diachronic_embeddings.py', paper, '--reverse', '--vocab-counts', '--tag', bootstrap_suffix(replicate, False), '--seed', str(args.seed + replicate)]
+			if args.resample:
+				call += ['--resample', str(args.resample)]
+			for flag in ['vocab_all', 'shards', 'cache']:
+				if getattr(args, flag):
+					call.append('--' + flag.replace('_', '-'))
+			call += ['--cache-dir', args.cache_dir, '--cache-size', str(args.cache_size)]
+			chains.append((chain_name(paper, True) + bootstrap_suffix(replicate, False), call))
+	num_jobs = min(args.jobs or max(1, args.max_threads // 4), len(chains))
+	threads_per_chain = max(1, args.max_threads // num_jobs)
+	for name, call in chains:
+		call += ['--max-threads', str(threads_per_chain)]
+
+	# Train replicates in parallel
+	schedule_training.manifest = Manifest(args.manifest)
+	print 'Training {0} replicates x {1} newspapers, {2} chains at a time with {3} threads each'.format(args.replicates, len(args.papers), num_jobs, threads_per_chain)
+	pool = ThreadPool(num_jobs)
+	failed = []
+	for name, returncode in pool.imap_unordered(run_chain, chains):
+		print 'Chain {0} finished with exit code {1} after {2:.2f} seconds'.format(name, returncode, time.time() - start_time)
+		if returncode != 0:
+			failed.append(name)
+	pool.close()
+	pool.join()
+	if failed:
+		print 'Quitting: training failed for {0}, see working/train_*.log'.format(', '.join(sorted(failed)))
+		raise SystemExit(1)
+
+	# Pack every replicate into an embedding store
+	for replicate in range(args.replicates):
+		for paper in args.papers:
+			print 'Packing {0}{1}...'.format(paper, bootstrap_suffix(replicate))
+			pack_embeddings(paper, list(reversed(years)), bootstrap_suffix(replicate), cache = cache)
+	print 'Done! Query with query_words_in_embeddings.py --bootstrap {0}, total time elapsed: {1:.2f} seconds'.format(args.replicates, time.time() - start_time)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import numpy as np
+import argparse, json, os, time
+from embedding_store import open_store, store_path, create_store, finish_store
+from self_similarity import self_similarity_matrix, normalize
+from results_io import load_results
+
+'''
+Script for writing a compact copy of an embedding store for query workloads, which only need cosines: every row
+is normalized to unit length and stored as float16, or as int8 scaled to the full int8 range (the scale drops out
+of cosines), optionally after projecting all slices onto their top principal components (PCA). This reduces
+the store 2x (float16) to 4x (int8), and further with PCA. The compact store is read by the query scripts like
+any other store. The accuracy of its self-similarities is measured against reference results (by default the
+float32 values in word_list_combined_results.json), and against the original store.
+'''
+
+dtypes = {'float16': np.float16, 'int8': np.int8}
+
+def quantize(vectors, dtype):
+	'''Normalizes rows and converts them to float16, or to int8 with every row scaled to the int8 range'''
+
+	vectors = normalize(vectors, np.float32)
+	if dtype == 'float16':
+		return vectors.astype(np.float16)
+	peaks = np.abs(vectors).max(axis = 1)
+	peaks[peaks == 0] = 1.0
+	return np.round(vectors * (127.0 / peaks)[:, np.newaxis]).astype(np.int8)
+
+def pca_basis(store, components, sample_size = 200000, seed = 1):
+	'''Returns a components x dim orthonormal basis: the top eigenvectors of X^T X for a sample X of normalized rows
+	from all slices (i.e. its top right singular vectors). X^T X is only dim x dim and is summed slice by slice, so
+	the sample is never held in memory at once. The rows are not centered, so the projection preserves their dot
+	products as well as possible'''
+
+	rng = np.random.RandomState(seed)
+	per_slice = max(1, sample_size // len(store.slices))
+	dim = store.vectors.shape[2]
+	gram = np.zeros((dim, dim))
+	for slice_idx in range(len(store.slices)):
+		rows = np.flatnonzero(store.present[slice_idx])
+		if len(rows) > per_slice:
+			rows = np.sort(rng.choice(rows, per_slice, replace = False))
+		sample = normalize(store.vectors[slice_idx][rows]).astype(np.float64)
+		gram += np.dot(sample.T, sample)
+	# Eigenvalues in ascending order, take the eigenvectors of the largest ones
+	eigenvalues, eigenvectors = np.linalg.eigh(gram)
+	return eigenvectors[:, ::-1][:, :components].T
+
+def compact_store(store, out_dir, dtype = 'float16', components = None, block_size = 65536):
+	'''Writes all slices of a store as normalized float16 or int8 rows, optionally PCA-reduced, to a new store'''
+
+	num_slices, num_words, dim = store.vectors.shape
+	basis = pca_basis(store, components) if components else None
+	vectors = create_store(out_dir, num_slices, num_words, components or dim, dtypes[dtype])
+	for slice_idx in range(num_slices):
+		for start in range(0, num_words, block_size):
+			end = min(start + block_size, num_words)
+			block = np.asarray(store.vectors[slice_idx, start:end], dtype = np.float32)
+			if basis is not None:
+				block = np.dot(block, basis.T)
+			vectors[slice_idx, start:end] = quantize(block, dtype)
+	vectors.flush()
+	del vectors
+	meta = dict(store.meta)
+	meta.update({'dtype': dtype, 'normalized': True, 'components': components, 'compacted_from': store.directory, 'dim': components or dim})
+	if basis is not None:
+		np.save(os.path.join(out_dir, 'components.npy'), basis.astype(np.float32))
+	finish_store(out_dir, store.vocab, np.asarray(store.present), meta)
+
+def errors(similarities, expected):
+	'''Returns error statistics of similarities against expected values, over the cells where both are known'''
+
+	known = ~np.isnan(similarities) & ~np.isnan(expected)
+	difference = similarities[known] - expected[known]
+	if not len(difference):
+		return {'values': 0}
+	return {'values': int(known.sum()), 'mean_abs_error': float(np.abs(difference).mean()), 'max_abs_error': float(np.abs(difference).max()),
+		'rmse': float(np.sqrt((difference * difference).mean())), 'pearson': float(np.corrcoef(similarities[known], expected[known])[0, 1])}
+
+def accuracy_report(compact, store, results, paper, initialize = False):
+	'''Compares the self-similarities in a compact store with the reference results of a newspaper,
+	and with the self-similarities in the original store. Returns a dict with error statistics and sizes'''
+
+	report = {'bytes': int(compact.vectors.nbytes), 'original_bytes': int(store.vectors.nbytes), 'reduction': float(store.vectors.nbytes) / compact.vectors.nbytes}
+	found, pair_years, similarities = self_similarity_matrix(compact, results.words, initialize)
+	if paper in results.papers:
+		years = [year for year in pair_years if year in results.years]
+		expected = results.similarity[:, results.papers.index(paper)][:, [results.years.index(year) for year in years]]
+		report['reference'] = errors(similarities[:, [pair_years.index(year) for year in years]], expected)
+	original_found, original_years, original_similarities = self_similarity_matrix(store, results.words, initialize)
+	report['original'] = errors(similarities, original_similarities)
+	return report
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('newspaper', metavar = 'trouw|volkskrant', type = str, help = "Specify which newspaper (Trouw or Volkskrant) to compact")
+	parser.add_argument('-s', '--suffix', metavar = 'SUFFIX', type = str, default = '_reverse', help = "Suffix of the store to compact, default is _reverse, i.e. the store read by the query scripts")
+	parser.add_argument('-dt', '--dtype', metavar = 'float16|int8', type = str, default = 'float16', help = "Type of the compact vectors, default is float16")
+	parser.add_argument('-pc', '--components', metavar = 'NUM', type = int, help = "Reduce the vectors to this many principal components")
+	parser.add_argument('-rf', '--reference', metavar = 'RESULTS', type = str, default = 'word_list_combined_results.json', help = "Specify the results (.json or .npz) to measure accuracy against, default is word_list_combined_results.json")
+	parser.add_argument('-in', '--initialize', action = 'store_true', help = "Also compare the similarities with the initial slice")
+	args = parser.parse_args()
+	paper = args.newspaper
+	if paper not in ['volkskrant', 'trouw']:
+		print 'Not an available newspaper!'
+		raise SystemExit
+	if args.dtype not in dtypes:
+		print 'Not an available type: {0}'.format(args.dtype)
+		raise SystemExit
+	# Check the reference results before writing the store, so a missing file does not waste the compaction
+	if not os.path.exists(args.reference):
+		print 'The reference results {0} don\'t exist! Specify them with --reference'.format(args.reference)
+		raise SystemExit
+
+	time_0 = time.time()
+	store = open_store(paper, args.suffix)
+	out_suffix = '{0}_{1}{2}'.format(args.suffix, args.dtype, '_pca{0}'.format(args.components) if args.components else '')
+	out_dir = store_path(paper, out_suffix)
+	print 'Compacting {0} slices of {1} to {2}...'.format(len(store.slices), paper, args.dtype + (' with {0} components'.format(args.components) if args.components else ''))
+	compact_store(store, out_dir, args.dtype, args.components)
+	print 'Done! Wrote {0}, took {1:.2f} seconds'.format(out_dir, time.time() - time_0)
+
+	# Measure accuracy of the self-similarities
+	report = accuracy_report(open_store(paper, out_suffix), store, load_results(args.reference), paper, args.initialize)
+	with open(os.path.join(out_dir, 'accuracy.json'), 'w') as of:
+		json.dump(report, of, indent = 1, sort_keys = True)
+	print 'Size: {0:.1f} MB instead of {1:.1f} MB ({2:.1f}x smaller)'.format(report['bytes'] / 1024.0 ** 2, report['original_bytes'] / 1024.0 ** 2, report['reduction'])
+	for reference, name in [('reference', args.reference), ('original', 'float32 store')]:
+		if report.get(reference, {}).get('values'):
+			stats = report[reference]
+			print 'Against {0} ({1} values): mean absolute error {2:.5f}, max {3:.5f}, RMSE {4:.5f}, Pearson r {5:.5f}'.format(
+				name, stats['values'], stats['mean_abs_error'], stats['max_abs_error'], stats['rmse'], stats['pearson'])
+		else:
+			print 'No self-similarities to compare with in {0}'.format(name)
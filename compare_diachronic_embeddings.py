@@ -1,13 +1,13 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
-import gensim
 import codecs, argparse, time, re
 from scipy.spatial.distance import cosine
+from embedding_store import open_store
 
 '''
-Script for interactively comparing multiple embeddings of a word across time. Loads all models (takes a while), 
-asks user for word input, shows year-to-year self-similarity.
+Script for interactively comparing multiple embeddings of a word across time. Opens the packed embedding store
+(see embedding_store.py), asks user for word input, shows year-to-year self-similarity.
 '''
 
 # Get arguments
@@ -33,18 +33,11 @@ else:
 	reverse = ''
 
 # Load models
-print 'Loading models, should take a while...'
+print 'Opening embedding store...'
 time_0 = time.time()
-models = []
-if args.initialize:
-	print 'Loading initial model...'
-	models.append(gensim.models.Word2Vec.load_word2vec_format('working/{0}_initial{1}.w2v'.format(paper, reverse)))
-	print 'Done! took {0} seconds'.format(time.time() - time_0)
-for year in years:
-	print 'Loading model {0}_{1}'.format(paper, year)
-	time_0 = time.time()
-	models.append(gensim.models.Word2Vec.load_word2vec_format('working/{0}_{1}{2}.w2v'.format(paper, year, reverse)))
-	print 'Done! took {0:.2f} seconds'.format(time.time() - time_0)
+store = open_store(paper, reverse)
+models = store.models(args.initialize)
+print 'Done! took {0:.2f} seconds'.format(time.time() - time_0)
 
 # Set up querying
 while True:
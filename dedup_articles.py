@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import numpy as np
+import argparse, hashlib, json, multiprocessing, os, sqlite3, struct, time, zlib
+from collections import deque
+from article_store import ArticleStore
+from instrumentation import add_arguments, configure_from_args, stage
+
+'''
+Script for finding near-duplicate articles (syndicated, republished or slightly edited copies) in the scraped
+article stores of a newspaper, within and across years. Every article gets a MinHash signature of its word
+shingles, computed by a process pool. The signatures are indexed with locality-sensitive hashing (LSH) in an
+SQLite index on disk, so memory use does not grow with the number of articles. An article is a duplicate of an
+earlier article if they share an LSH band and their estimated Jaccard similarity reaches the threshold. Years are
+processed in order, so the first occurrence is kept. Duplicates are flagged in the index, and with --export the
+raw year slices are written again without them. Statistics are written in the style of corpus_stats.txt.
+'''
+
+prime = (1 << 61) - 1 # Mersenne prime for the hash permutations
+max_hash = (1 << 32) - 1
+
+def permutations(num_perm, seed = 1):
+	'''Returns the coefficients (a, b) of num_perm random hash permutations h -> (a * h + b) mod prime'''
+
+	rng = np.random.RandomState(seed)
+	a = rng.randint(1, 1 << 28, num_perm).astype(np.uint64)
+	b = rng.randint(0, 1 << 28, num_perm).astype(np.uint64)
+	return a, b
+
+def shingle_hashes(text, shingle_size):
+	'''Returns the 32-bit hashes of the (lowercased) word shingles of a text'''
+
+	tokens = text.lower().split()
+	if len(tokens) < shingle_size:
+		shingles = [u' '.join(tokens)] if tokens else []
+	else:
+		shingles = [u' '.join(tokens[idx:idx + shingle_size]) for idx in xrange(len(tokens) - shingle_size + 1)]
+	return np.array(list(set(zlib.crc32(shingle.encode('utf-8')) & max_hash for shingle in shingles)), dtype = np.uint64)
+
+def minhash(hashes, a, b, block_size = 4096):
+	'''Returns the MinHash signature of a set of shingle hashes, as uint32 array'''
+
+	signature = np.empty(len(a), dtype = np.uint64)
+	signature.fill(max_hash)
+	for start in xrange(0, len(hashes), block_size):
+		block = hashes[start:start + block_size]
+		values = ((a[:, np.newaxis] * block[np.newaxis, :] + b[:, np.newaxis]) % prime) & max_hash
+		np.minimum(signature, values.min(axis = 1), out = signature)
+	return signature.astype(np.uint32)
+
+def init_minhash_worker(num_perm, seed, shingle_size):
+	'''Process pool initializer: sets up the hash permutations of this worker'''
+
+	global worker_permutations, worker_shingle_size
+	worker_permutations = permutations(num_perm, seed)
+	worker_shingle_size = shingle_size
+
+def minhash_chunk(articles):
+	'''Process pool worker: takes a list of (url hash, text), returns a list of (url hash, signature bytes or None if empty)'''
+
+	results = []
+	for url_hash, text in articles:
+		hashes = shingle_hashes(text, worker_shingle_size)
+		results.append((url_hash, minhash(hashes, *worker_permutations).tostring() if len(hashes) else None))
+	return results
+
+def ordered_results(pool, func, chunks, max_pending):
+	'''Applies func to chunks in the process pool, yields the results in order, with at most max_pending chunks queued'''
+
+	pending = deque()
+	for chunk in chunks:
+		pending.append(pool.apply_async(func, (chunk,)))
+		if len(pending) >= max_pending:
+			yield pending.popleft().get()
+	while pending:
+		yield pending.popleft().get()
+
+def read_chunks(rows, chunk_size):
+	'''Yields chunks of (at most chunk_size) rows'''
+
+	chunk = []
+	for row in rows:
+		chunk.append(row)
+		if len(chunk) >= chunk_size:
+			yield chunk
+			chunk = []
+	if chunk:
+		yield chunk
+
+class DedupIndex(object):
+	'''SQLite index of article signatures and LSH bands, flagging every article that duplicates an earlier one'''
+
+	def __init__(self, fn, num_perm = 128, bands = 16):
+		if num_perm % bands:
+			raise ValueError('Number of permutations ({0}) must be a multiple of the number of bands ({1})'.format(num_perm, bands))
+		self.connection = sqlite3.connect(fn)
+		self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+		self.connection.execute('CREATE TABLE IF NOT EXISTS articles (id INTEGER PRIMARY KEY, paper TEXT, year INTEGER, url_hash TEXT, signature BLOB, duplicate_of INTEGER, similarity REAL)')
+		self.connection.execute('CREATE INDEX IF NOT EXISTS articles_year ON articles (paper, year)')
+		# Every original is listed in the bucket of each of its bands, a bucket can hold any number of articles
+		self.connection.execute('CREATE TABLE IF NOT EXISTS bands (band INTEGER, key INTEGER, article INTEGER)')
+		self.connection.execute('CREATE INDEX IF NOT EXISTS bands_key ON bands (band, key)')
+		# Signatures are only comparable with the same settings
+		settings = json.dumps({'num_perm': num_perm, 'bands': bands})
+		known = self.connection.execute("SELECT value FROM meta WHERE key = 'settings'").fetchone()
+		if known is None:
+			self.connection.execute("INSERT INTO meta VALUES ('settings', ?)", (settings,))
+		elif known[0] != settings:
+			raise ValueError('Index {0} was built with different settings: {1}'.format(fn, known[0]))
+		self.connection.commit()
+		self.num_perm = num_perm
+		self.bands = bands
+		self.rows = num_perm // bands
+
+	def has_year(self, paper, year):
+		'''Returns whether the articles of a year slice have been indexed'''
+
+		return self.connection.execute('SELECT 1 FROM articles WHERE paper = ? AND year = ? LIMIT 1', (paper, year)).fetchone() is not None
+
+	def band_keys(self, signature):
+		'''Returns the LSH key (64-bit hash) of every band of a signature'''
+
+		return [struct.unpack('<q', hashlib.md5(signature[band * self.rows:(band + 1) * self.rows].tostring()).digest()[:8])[0] for band in range(self.bands)]
+
+	def add(self, paper, year, url_hash, signature, threshold = 0.8):
+		'''Adds an article, returns (id of the earlier article it duplicates or None, estimated similarity)'''
+
+		if signature is None: # Empty article
+			self.connection.execute('INSERT INTO articles VALUES (NULL, ?, ?, ?, NULL, NULL, NULL)', (paper, year, url_hash))
+			return None, None
+		signature = np.frombuffer(signature, dtype = np.uint32)
+		keys = self.band_keys(signature)
+		candidates = set()
+		for band, key in enumerate(keys):
+			for row in self.connection.execute('SELECT article FROM bands WHERE band = ? AND key = ?', (band, key)):
+				candidates.add(row[0])
+		duplicate_of, similarity = None, None
+		for candidate in candidates:
+			other = np.frombuffer(self.connection.execute('SELECT signature FROM articles WHERE id = ?', (candidate,)).fetchone()[0], dtype = np.uint32)
+			estimate = float((signature == other).mean())
+			if estimate >= threshold and (similarity is None or estimate > similarity):
+				duplicate_of, similarity = candidate, estimate
+		article_id = self.connection.execute('INSERT INTO articles VALUES (NULL, ?, ?, ?, ?, ?, ?)', (paper, year, url_hash, sqlite3.Binary(signature.tostring()), duplicate_of, similarity)).lastrowid
+		# Only originals are indexed, so every duplicate points at the first occurrence
+		if duplicate_of is None:
+			self.connection.executemany('INSERT INTO bands VALUES (?, ?, ?)', [(band, key, article_id) for band, key in enumerate(keys)])
+		return duplicate_of, similarity
+
+	def duplicates(self, paper, year):
+		'''Returns the set of URL hashes of the duplicate articles in a year slice'''
+
+		return set(row[0] for row in self.connection.execute('SELECT url_hash FROM articles WHERE paper = ? AND year = ? AND duplicate_of IS NOT NULL', (paper, year)))
+
+	def year_stats(self, paper, year):
+		'''Returns the number of articles, of duplicates, and of duplicates of articles from other years or newspapers'''
+
+		num_articles, num_duplicates = self.connection.execute('SELECT COUNT(*), COUNT(duplicate_of) FROM articles WHERE paper = ? AND year = ?', (paper, year)).fetchone()
+		num_across = self.connection.execute('''SELECT COUNT(*) FROM articles AS duplicate JOIN articles AS original ON duplicate.duplicate_of = original.id
+			WHERE duplicate.paper = ? AND duplicate.year = ? AND (original.paper != duplicate.paper OR original.year != duplicate.year)''', (paper, year)).fetchone()[0]
+		return num_articles, num_duplicates, num_across
+
+	def commit(self):
+		self.connection.commit()
+
+	def close(self):
+		self.connection.commit()
+		self.connection.close()
+
+def dedup_year(pool, index, paper, year, threshold, chunk_size = 100, max_pending = 8):
+	'''Indexes the articles of a year slice, flagging near-duplicates. Returns the number of articles and duplicates'''
+
+	store = ArticleStore('working/{0}_{1}.db'.format(paper, year))
+	num_articles = 0
+	num_duplicates = 0
+	with stage('dedup_slice', paper = paper, year = year, unit = 'articles') as dedup_stage:
+		for results in ordered_results(pool, minhash_chunk, read_chunks(store.articles(), chunk_size), max_pending):
+			for url_hash, signature in results:
+				duplicate_of, similarity = index.add(paper, year, url_hash, signature, threshold)
+				num_articles += 1
+				num_duplicates += duplicate_of is not None
+			dedup_stage.progress(num_articles, every = 60)
+		dedup_stage.items = num_articles
+		index.commit()
+	store.close()
+	return num_articles, num_duplicates
+
+def export_year(index, paper, year):
+	'''Writes the raw year slice again, without the duplicates, in the same article order as scrape_news.py'''
+
+	store = ArticleStore('working/{0}_{1}.db'.format(paper, year))
+	urls = None
+	fn = 'working/{0}_article_urls_{1}.json'.format(paper, year)
+	if os.path.exists(fn):
+		with open(fn, 'r') as f:
+			urls = list(set(json.load(f)))
+	num_articles = store.export('working/{0}_{1}'.format(paper, year), urls, index.duplicates(paper, year))
+	store.close()
+	return num_articles
+
+def format_stats(index, paper, years):
+	'''Returns the duplicate statistics of the year slices of a newspaper, in the style of corpus_stats.txt'''
+
+	lines = ['NEAR-DUPLICATE ARTICLES, PER YEAR, {0}'.format(paper.upper())]
+	total_articles, total_duplicates, total_across = 0, 0, 0
+	for year in years:
+		num_articles, num_duplicates, num_across = index.year_stats(paper, year)
+		lines.append('{0} - {1} of {2} ({3:.1f}%), {4} across years'.format(year, num_duplicates, num_articles, 100.0 * num_duplicates / max(1, num_articles), num_across))
+		total_articles += num_articles
+		total_duplicates += num_duplicates
+		total_across += num_across
+	lines.append('TOTAL - {0} of {1} ({2:.1f}%), {3} across years'.format(total_duplicates, total_articles, 100.0 * total_duplicates / max(1, total_articles), total_across))
+	lines.append('AVERAGE - {0}'.format(total_duplicates // max(1, len(years))))
+	return '\n'.join(lines) + '\n'
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('newspaper', metavar = 'trouw|volkskrant', type = str, help = "Specify which newspaper (Trouw or Volkskrant) to deduplicate")
+	parser.add_argument('-y', '--years', metavar = 'YEAR', type = int, nargs = '+', default = range(1994,2017), help = "Specify which years to deduplicate (in this order), default is 1994-2016")
+	parser.add_argument('-i', '--index', metavar = 'INDEX.db', type = str, help = "Specify the dedup index, default is working/{paper}_dedup.db. Use the same index for both newspapers to also find duplicates across newspapers")
+	parser.add_argument('-th', '--threshold', metavar = 'JACCARD', type = float, default = 0.8, help = "Minimum estimated Jaccard similarity of a near-duplicate, default is 0.8")
+	parser.add_argument('-np', '--num-perm', metavar = 'NUM', type = int, default = 128, help = "Number of MinHash permutations, default is 128")
+	parser.add_argument('-b', '--bands', metavar = 'NUM', type = int, default = 16, help = "Number of LSH bands (num-perm must be a multiple), default is 16")
+	parser.add_argument('-sh', '--shingle-size', metavar = 'NUM', type = int, default = 5, help = "Number of words per shingle, default is 5")
+	parser.add_argument('-p', '--processes', metavar = 'NUM', type = int, help = "Number of processes computing signatures, default is the number of cores")
+	parser.add_argument('-e', '--export', action = 'store_true', help = "Write the raw year slices (working/{paper}_{year}) again without the duplicates")
+	add_arguments(parser)
+	args = parser.parse_args()
+	configure_from_args(args)
+	paper = args.newspaper
+	if paper not in ['volkskrant', 'trouw']:
+		print 'Not an available newspaper!'
+		raise SystemExit
+
+	time_0 = time.time()
+	index = DedupIndex(args.index or 'working/{0}_dedup.db'.format(paper), args.num_perm, args.bands)
+	pool = multiprocessing.Pool(args.processes, init_minhash_worker, (args.num_perm, 1, args.shingle_size))
+	max_pending = 2 * (args.processes or multiprocessing.cpu_count())
+	for year in args.years:
+		if index.has_year(paper, year):
+			print 'Skipping {0}_{1}, already indexed'.format(paper, year)
+		else:
+			print 'Deduplicating {0}_{1}...'.format(paper, year)
+			time_1 = time.time()
+			num_articles, num_duplicates = dedup_year(pool, index, paper, year, args.threshold, max_pending = max_pending)
+			print 'Done! {0} near-duplicates in {1} articles, took {2:.2f} seconds'.format(num_duplicates, num_articles, time.time() - time_1)
+		if args.export:
+			print '\tWrote {0} articles to working/{1}_{2}'.format(export_year(index, paper, year), paper, year)
+	pool.close()
+	pool.join()
+
+	stats = format_stats(index, paper, args.years)
+	index.close()
+	with open('working/{0}_dedup_stats.txt'.format(paper), 'w') as of:
+		of.write(stats)
+	print '\n' + stats
+	print 'Done! Total time elapsed: {0:.2f} seconds'.format(time.time() - time_0)
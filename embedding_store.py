@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import numpy as np
+import codecs, argparse, time, json, os
+from instrumentation import add_arguments, configure_from_args, stage
+import artifact_cache
+
+'''
+Script for packing all year slices of a newspaper (word2vec text files) into a single aligned binary store:
+a shared vocabulary, and a 3-D slice x vocabulary x dimension float32 array. Query scripts open the store
+via numpy.memmap, so loading is nearly instant and only the rows actually used are read from disk.
+'''
+
+def w2v_path(paper, year, suffix = ''):
+	'''Returns the filename of the word2vec text file for a given newspaper and year slice (or 'initial'),
+	suffix is '_reverse' for embeddings trained in reverse, '_independent' for independently trained slices'''
+
+	if year == 'initial':
+		return 'working/{0}_initial{1}.w2v'.format(paper, suffix)
+	return 'working/{0}_{1}{2}.w2v'.format(paper, year, suffix)
+
+def store_path(paper, suffix = ''):
+	'''Returns the directory of the binary store for a given newspaper and filename suffix'''
+
+	return 'working/{0}{1}_store'.format(paper, suffix)
+
+def bootstrap_suffix(replicate, reverse = True):
+	'''Returns the filename suffix of a bootstrap replicate (see bootstrap_embeddings.py)'''
+
+	return '{0}_boot{1}'.format('_reverse' if reverse else '', replicate)
+
+def read_w2v_header(fn):
+	'''Reads the vocabulary of a word2vec text file, returns list of words and vector dimension'''
+
+	words = []
+	with codecs.open(fn, 'r', encoding = 'utf-8') as f:
+		num_words, dim = [int(x) for x in f.readline().split()]
+		for line in f:
+			words.append(line.split(' ', 1)[0])
+	return words, dim
+
+def create_store(directory, num_slices, num_words, dim, dtype = np.float32):
+	'''Creates a store directory, returns the memory-mapped slice x vocabulary x dimension array to fill'''
+
+	if not os.path.exists(directory):
+		os.makedirs(directory)
+	return np.lib.format.open_memmap(os.path.join(directory, 'vectors.npy'), mode = 'w+', dtype = dtype, shape = (num_slices, num_words, dim))
+
+def finish_store(directory, vocab, present, meta):
+	'''Writes the vocabulary, the slice x vocabulary presence mask and the metadata of a store'''
+
+	np.save(os.path.join(directory, 'present.npy'), present)
+	with codecs.open(os.path.join(directory, 'vocab.txt'), 'w', encoding = 'utf-8') as of:
+		for word in vocab:
+			of.write(word + '\n')
+	with open(os.path.join(directory, 'meta.json'), 'w') as of:
+		json.dump(meta, of)
+
+def pack_embeddings(paper, years, suffix = '', initialize = False, cache = None):
+	'''Packs the word2vec text files of all year slices (in chain order) into a single store, returns the store directory.
+	With an artifact cache, a store packed before from the same files is restored instead'''
+
+	slices = list(years)
+	if initialize:
+		slices = ['initial'] + slices
+	out_dir = store_path(paper, suffix)
+	inputs = [w2v_path(paper, label, suffix) for label in slices]
+	# Only fingerprint existing files, a missing slice is reported when packing
+	if cache is not None and not all(os.path.exists(fn) for fn in inputs):
+		cache = None
+	if cache is not None:
+		fingerprint = cache.fingerprint('store', inputs, {'paper': paper, 'suffix': suffix, 'slices': slices})
+		if cache.restore('store', fingerprint, out_dir):
+			print '\tRestored from the cache'
+			return out_dir
+	# First pass: collect shared vocabulary
+	vocab = []
+	vocab_index = {}
+	dim = None
+	for label in slices:
+		words, slice_dim = read_w2v_header(w2v_path(paper, label, suffix))
+		if dim is None:
+			dim = slice_dim
+		elif dim != slice_dim:
+			raise ValueError('Slice {0} has dimension {1}, expected {2}'.format(label, slice_dim, dim))
+		for word in words:
+			if word not in vocab_index:
+				vocab_index[word] = len(vocab)
+				vocab.append(word)
+	# Second pass: write vectors directly into memory-mapped output
+	vectors = create_store(out_dir, len(slices), len(vocab), dim)
+	present = np.zeros((len(slices), len(vocab)), dtype = bool)
+	for slice_idx, label in enumerate(slices):
+		with stage('pack_slice', paper = paper, year = label, suffix = suffix, unit = 'vectors') as pack_stage:
+			with codecs.open(w2v_path(paper, label, suffix), 'r', encoding = 'utf-8') as f:
+				f.readline()
+				for line in f:
+					word, vector = line.rstrip().split(' ', 1)
+					row = vocab_index[word]
+					vectors[slice_idx, row] = np.fromstring(vector, sep = ' ', dtype = np.float32)
+					present[slice_idx, row] = True
+			pack_stage.items = int(present[slice_idx].sum())
+	vectors.flush()
+	del vectors
+	finish_store(out_dir, vocab, present, {'paper': paper, 'suffix': suffix, 'slices': slices, 'dim': dim, 'vocab_size': len(vocab)})
+	if cache is not None:
+		cache.store('store', fingerprint, [os.path.join(out_dir, fn) for fn in ['vectors.npy', 'present.npy', 'vocab.txt', 'meta.json']], {'paper': paper})
+	return out_dir
+
+class SliceView(object):
+	'''Read-only view on a single slice of a store, indexable by word like a gensim model'''
+
+	def __init__(self, store, slice_idx):
+		self.store = store
+		self.slice_idx = slice_idx
+
+	def __contains__(self, word):
+		row = self.store.index.get(word)
+		return row is not None and bool(self.store.present[self.slice_idx, row])
+
+	def __getitem__(self, word):
+		row = self.store.index[word]
+		if not self.store.present[self.slice_idx, row]:
+			raise KeyError(word)
+		# Compact stores (see compact_store.py) hold float16 or int8 rows
+		return np.asarray(self.store.vectors[self.slice_idx, row], dtype = np.float32)
+
+class EmbeddingStore(object):
+	'''Memory-mapped store of all year slices of one newspaper, as written by pack_embeddings'''
+
+	def __init__(self, directory):
+		self.directory = directory
+		with open(os.path.join(directory, 'meta.json'), 'r') as f:
+			self.meta = json.load(f)
+		self.slices = self.meta['slices']
+		with codecs.open(os.path.join(directory, 'vocab.txt'), 'r', encoding = 'utf-8') as f:
+			self.vocab = [line.rstrip('\n') for line in f]
+		self.index = dict((word, idx) for idx, word in enumerate(self.vocab))
+		self.vectors = np.load(os.path.join(directory, 'vectors.npy'), mmap_mode = 'r')
+		self.present = np.load(os.path.join(directory, 'present.npy'), mmap_mode = 'r')
+
+	def slice_labels(self, initialize = False):
+		'''Returns the slice labels in chain order, with or without the initial slice'''
+
+		if initialize:
+			if 'initial' not in self.slices:
+				raise KeyError('Store has no initial slice, pack it with --initialize')
+			return list(self.slices)
+		return [label for label in self.slices if label != 'initial']
+
+	def slice(self, label):
+		'''Returns a view on the slice with the given label (year or 'initial')'''
+
+		return SliceView(self, self.slices.index(label))
+
+	def models(self, initialize = False):
+		'''Returns slice views in chain order, as a drop-in replacement for a list of loaded gensim models'''
+
+		return [self.slice(label) for label in self.slice_labels(initialize)]
+
+def open_store(paper, suffix = ''):
+	'''Opens the store for a newspaper and filename suffix, quits with a message if it has not been packed yet'''
+
+	directory = store_path(paper, suffix)
+	if not os.path.exists(os.path.join(directory, 'meta.json')):
+		raise SystemExit('Quitting: no embedding store in {0}, run embedding_store.py {1}{2} first'.format(directory, paper, ' --reverse' if suffix == '_reverse' else ''))
+	with stage('open_store', paper = paper, suffix = suffix, unit = 'words') as open_stage:
+		store = EmbeddingStore(directory)
+		open_stage.items = len(store.vocab)
+	return store
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('newspaper', metavar = 'trouw|volkskrant', type = str, help = "Specify which newspaper (Trouw or Volkskrant) to pack")
+	parser.add_argument('-r', '--reverse', action = 'store_true', help = "Pack embeddings trained in reverse, i.e. from recent years to older years")
+	parser.add_argument('-in', '--initialize', action = 'store_true', help = "Also pack the embedding of the initial slice")
+	parser.add_argument('-id', '--independent', action = 'store_true', help = "Pack independently trained slices (see train_diachronic_embeddings.py --independent), in reverse year order")
+	add_arguments(parser)
+	artifact_cache.add_arguments(parser)
+	args = parser.parse_args()
+	configure_from_args(args)
+	paper = args.newspaper
+	if paper not in ['volkskrant', 'trouw']:
+		print 'Not an available newspaper!'
+		raise SystemExit
+
+	# Generate year slice numbers
+	years = range(1994,2017)
+	if args.reverse or args.independent:
+		years.reverse()
+	if args.independent:
+		suffix = '_independent'
+	elif args.reverse:
+		suffix = '_reverse'
+	else:
+		suffix = ''
+
+	time_0 = time.time()
+	print 'Packing {0} slices of {1}...'.format(len(years) + int(args.initialize), paper)
+	out_dir = pack_embeddings(paper, years, suffix, args.initialize, artifact_cache.open_cache(args))
+	print 'Done! Wrote {0}, took {1:.2f} seconds'.format(out_dir, time.time() - time_0)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Extraction of dates, article URLs and article text from archive pages, with a BeautifulSoup and an lxml backend'''
+
+import re
+from bs4 import BeautifulSoup, UnicodeDammit
+try:
+	import lxml.html
+	from lxml.etree import XPath
+except ImportError:
+	lxml = None
+
+# Backend used when none is specified: lxml if it is installed, else BeautifulSoup
+default_backend = 'lxml' if lxml else 'soup'
+
+def class_starts_with(prefix):
+	'''Returns XPath condition for an element whose first class starts with prefix'''
+
+	return "starts-with(normalize-space(@class), '{0}')".format(prefix)
+
+if lxml:
+	# Precompiled XPath selectors, equivalent to the BeautifulSoup tree walks below
+	xpath_links = XPath('//a/@href')
+	xpath_trouw_articles = XPath("//div[substring-before(concat(normalize-space(@class), ' '), ' ') = 'articleOverview']/dl/dd/a/@href")
+	xpath_volkskrant_articles = XPath('//article/a/@href')
+	xpath_volkskrant_next_page = XPath("//a[contains(concat(' ', normalize-space(@class), ' '), ' pager--next ')]/@href")
+	xpath_headers = {
+		'trouw': XPath("//h1[@id = 'articleDetailTitle']"),
+		'volkskrant': XPath("//h1[contains(concat(' ', normalize-space(@class), ' '), ' article__title ')]"),
+	}
+	xpath_paragraphs = {
+		'trouw': XPath("//div[starts-with(@id, 'art_box')]/p"),
+		'volkskrant': XPath('//div[{0} or {1}]/p'.format(class_starts_with('article__intro'), class_starts_with('article__body'))),
+	}
+
+def page_encoding(content):
+	'''Returns the encoding of raw page content: UTF-8 if it decodes as such, else the declared or detected encoding,
+	so that both backends decode a page the same way (None for content that is already unicode)'''
+
+	if isinstance(content, unicode):
+		return None
+	return UnicodeDammit(content, ['utf-8'], is_html = True).original_encoding
+
+def parse_soup(content):
+	'''Parses page content with BeautifulSoup'''
+
+	return BeautifulSoup(content, 'html.parser', from_encoding = page_encoding(content))
+
+def parse_html(content):
+	'''Parses page content with lxml, returns None for empty pages'''
+
+	if not content.strip():
+		return None
+	encoding = page_encoding(content)
+	if encoding is None:
+		return lxml.html.fromstring(content)
+	return lxml.html.fromstring(content, parser = lxml.html.HTMLParser(encoding = encoding))
+
+def extract_links(content, backend = default_backend):
+	'''Returns the targets of all links on a page'''
+
+	if backend == 'lxml':
+		tree = parse_html(content)
+		return [] if tree is None else [unicode(href) for href in xpath_links(tree)]
+	soup = parse_soup(content)
+	return [link['href'] for link in soup.find_all('a') if link.has_attr('href')]
+
+def extract_articles_trouw(content, backend = default_backend):
+	'''Returns the article URLs on a Trouw date page'''
+
+	if backend == 'lxml':
+		tree = parse_html(content)
+		candidate_urls = [] if tree is None else [unicode(href) for href in xpath_trouw_articles(tree)]
+	else:
+		candidate_urls = []
+		date_soup = parse_soup(content)
+		for link in date_soup.find_all('a'):
+			try:
+				if link.parent.parent.parent.name == 'div' and link.parent.parent.parent['class'][0] == 'articleOverview':
+					if link.parent.parent.name == 'dl':
+						if link.parent.name == 'dd':
+							candidate_urls.append(link['href'])
+			except (AttributeError, KeyError):
+				pass
+	return [article_url for article_url in candidate_urls if re.match('http://www.trouw.nl/tr/nl/.*/archief/article/detail/', article_url)]
+
+def extract_articles_volkskrant(content, backend = default_backend):
+	'''Returns the article URLs on a Volkskrant date page, and the URL of the next page (None if there is none)'''
+
+	if backend == 'lxml':
+		tree = parse_html(content)
+		if tree is None:
+			return [], None
+		next_pages = xpath_volkskrant_next_page(tree)
+		return [unicode(href) for href in xpath_volkskrant_articles(tree)], unicode(next_pages[0]) if next_pages else None
+	date_soup = parse_soup(content)
+	article_urls = [link['href'] for link in date_soup.find_all('a') if link.parent.name == 'article']
+	next_pages = date_soup.find_all('a', class_='pager--next')
+	return article_urls, next_pages[0]['href'] if next_pages else None
+
+def clean_paragraph(text):
+	'''Removes extra newlines and spaces from paragraph text'''
+
+	text = re.sub('\n+', '\n', text)
+	text = re.sub(' +', ' ', text)
+	return text.strip() + '\n'
+
+def extract_article_text(newspaper, content, backend = default_backend):
+	'''Extracts all the content text from an article page of a given newspaper, returns text'''
+
+	article_text = ''
+	if backend == 'lxml':
+		tree = parse_html(content)
+		if tree is None:
+			return article_text
+		for header in xpath_headers[newspaper](tree):
+			article_text += header.text_content().strip() + '\n'
+		for paragraph in xpath_paragraphs[newspaper](tree):
+			text = paragraph.text_content()
+			if text:
+				article_text += clean_paragraph(text)
+		return article_text
+	article_soup = parse_soup(content)
+	# Newspaper-specific things
+	headers = []
+	if newspaper == 'trouw':
+		headers = article_soup.find_all('h1', id='articleDetailTitle')
+	if newspaper == 'volkskrant':
+		headers = article_soup.find_all('h1', class_='article__title')
+	# Scrape header text
+	for header in headers:
+		article_text += header.text.strip() + '\n'
+	# Scrape text body
+	for paragraph in article_soup.find_all('p'):
+		try:
+			if paragraph.parent.name == 'div':
+				is_correct_parent = False
+				# Newspaper-specific things
+				if newspaper == 'trouw':
+					is_correct_parent = re.match('art_box', paragraph.parent['id'])
+				if newspaper == 'volkskrant':
+					is_correct_parent = re.match('article__intro', paragraph.parent['class'][0]) or re.match('article__body', paragraph.parent['class'][0])
+				if is_correct_parent:
+					if paragraph.text:
+						article_text += clean_paragraph(paragraph.text)
+		except KeyError:
+			pass
+	return article_text
+
+def extract_fetched_article(job):
+	'''Process pool worker: takes (newspaper, backend, http_status, content), returns (http_status, text)'''
+
+	newspaper, backend, http_status, content = job
+	if http_status is None:
+		return http_status, ''
+	return http_status, extract_article_text(newspaper, content, backend)
+
+if __name__ == '__main__':
+	# Check that both backends extract the same text from canned pages, with and without a declared charset
+	body = u'<h1 id="articleDetailTitle">Caf\xe9 in Utrecht</h1><div id="art_box1"><p>Een \u20ac  voor de  cr\xe8me br\xfbl\xe9e.</p></div>'
+	pages = [
+		('short utf-8 without meta charset', u'<html><body><h1 id="articleDetailTitle">Caf\xe9</h1></body></html>'.encode('utf-8')),
+		('utf-8 without meta charset', u'<html><body>{0}</body></html>'.format(body).encode('utf-8')),
+		('utf-8 with meta charset', u'<html><head><meta charset="utf-8"></head><body>{0}</body></html>'.format(body).encode('utf-8')),
+		('windows-1252 with meta charset', u'<html><head><meta http-equiv="Content-Type" content="text/html; charset=windows-1252"></head><body>{0}</body></html>'.format(body).encode('windows-1252')),
+	]
+	if not lxml:
+		raise SystemExit('lxml is not installed, nothing to compare')
+	failed = 0
+	for name, page in pages:
+		texts = dict((backend, extract_article_text('trouw', page, backend)) for backend in ['soup', 'lxml'])
+		if texts['soup'] == texts['lxml'] and texts['lxml'].startswith(u'Caf\xe9'):
+			print '{0}: backends agree'.format(name)
+		else:
+			failed += 1
+			print '{0}: wrong text, soup {1!r}, lxml {2!r}'.format(name, texts['soup'], texts['lxml'])
+	if failed:
+		raise SystemExit(1)
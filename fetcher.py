@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Concurrent HTTP fetching for the news scraper: pooled connections, per-host rate limiting and retries'''
+
+import requests, threading, time, urlparse
+from multiprocessing.pool import ThreadPool
+
+class Fetcher(object):
+	'''Fetches pages over a pooled session, with a limit on concurrent requests and on requests per second per host'''
+
+	def __init__(self, concurrency = 8, rate = 5.0, retries = 3, backoff = 1.0, timeout = 30):
+		self.concurrency = concurrency
+		self.min_interval = 1.0 / rate if rate else 0.0
+		self.retries = retries
+		self.backoff = backoff
+		self.timeout = timeout
+		self.session = requests.Session()
+		adapter = requests.adapters.HTTPAdapter(pool_connections = concurrency, pool_maxsize = concurrency)
+		self.session.mount('http://', adapter)
+		self.session.mount('https://', adapter)
+		self.lock = threading.Lock()
+		self.next_request = {} # {host: earliest time of next request}
+
+	def wait_for_host(self, url):
+		'''Blocks until a request to the host of url is allowed by the rate limit'''
+
+		host = urlparse.urlparse(url).netloc
+		with self.lock:
+			now = time.time()
+			request_time = max(now, self.next_request.get(host, now))
+			self.next_request[host] = request_time + self.min_interval
+		if request_time > now:
+			time.sleep(request_time - now)
+
+	def get(self, url, cookies = None):
+		'''Gets a page, retrying with exponential backoff on connection errors and server errors.
+		Returns the response, or None if the page could not be fetched'''
+
+		for attempt in range(self.retries + 1):
+			if attempt:
+				time.sleep(self.backoff * 2 ** (attempt - 1))
+			self.wait_for_host(url)
+			try:
+				response = self.session.get(url, cookies = cookies, timeout = self.timeout)
+			except requests.exceptions.TooManyRedirects: # Sometimes the page just redirects, then skip it
+				return None
+			except (requests.exceptions.ConnectionError, requests.exceptions.Timeout): # Instable connection? Try again
+				continue
+			if response.status_code == 429 or response.status_code >= 500:
+				continue
+			return response
+		return None
+
+	def map(self, func, items):
+		'''Applies func to all items using concurrency threads, yields results in the order of items'''
+
+		pool = ThreadPool(self.concurrency)
+		try:
+			for result in pool.imap(func, items):
+				yield result
+		finally:
+			pool.close()
+			pool.join()
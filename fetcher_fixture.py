@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''Local stand-in for the newspaper archives, serving canned archive and article pages, with checks of the fetcher's
+rate limiting, retries and ordered map against it. Run this script to check fetcher.py without network access'''
+
+import threading, time, urlparse
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from fetcher import Fetcher
+import extractors
+
+num_articles = 12
+
+def article_text(number):
+	'''Returns the canned text of an article'''
+
+	return u'Artikel {0}\nDit is de tekst van artikel {0} over het caf\xe9.\n'.format(number)
+
+def archive_page(base_url):
+	'''Returns a canned Volkskrant-style archive page linking to all articles'''
+
+	links = ''.join('<article><a href="{0}/article/{1}">Artikel {1}</a></article>'.format(base_url, number) for number in range(num_articles))
+	return '<html><body>{0}</body></html>'.format(links)
+
+def article_page(number):
+	'''Returns a canned Volkskrant-style article page'''
+
+	title, body = article_text(number).strip().split('\n')
+	return u'<html><body><h1 class="article__title">{0}</h1><div class="article__body"><p>{1}</p></div></body></html>'.format(title, body).encode('utf-8')
+
+class FixtureHandler(BaseHTTPRequestHandler):
+	'''Serves the canned pages. /flaky/KEY?fail=N fails with 503 the first N times, /down always fails with 500,
+	/redirect redirects to itself. Articles with lower numbers are served slower, so they finish out of order'''
+
+	def do_GET(self):
+		url = urlparse.urlparse(self.path)
+		with self.server.lock:
+			self.server.requests.append((time.time(), url.path))
+			self.server.counts[url.path] = self.server.counts.get(url.path, 0) + 1
+			count = self.server.counts[url.path]
+		parts = url.path.strip('/').split('/')
+		if parts[0] == 'archive':
+			self.send_page(200, archive_page(self.server.base_url))
+		elif parts[0] == 'article' and len(parts) == 2 and parts[1].isdigit():
+			time.sleep(0.02 * (num_articles - int(parts[1])))
+			self.send_page(200, article_page(int(parts[1])))
+		elif parts[0] == 'flaky':
+			fail = int(urlparse.parse_qs(url.query).get('fail', ['0'])[0])
+			self.send_page(503 if count <= fail else 200, 'attempt {0}'.format(count))
+		elif parts[0] == 'down':
+			self.send_page(500, 'down')
+		elif parts[0] == 'redirect':
+			self.send_response(302)
+			self.send_header('Location', self.path)
+			self.end_headers()
+		else:
+			self.send_page(404, 'not found')
+
+	def send_page(self, status, body):
+		self.send_response(status)
+		self.send_header('Content-Type', 'text/html')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		pass
+
+class FixtureServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+def serve_fixture():
+	'''Starts the fixture server on a free local port in a background thread, returns the server'''
+
+	server = FixtureServer(('localhost', 0), FixtureHandler)
+	server.base_url = 'http://localhost:{0}'.format(server.server_address[1])
+	server.lock = threading.Lock()
+	server.requests = []
+	server.counts = {}
+	thread = threading.Thread(target = server.serve_forever)
+	thread.daemon = True
+	thread.start()
+	return server
+
+def check_rate_limit(server):
+	'''Requests to one host are spaced by at least 1 / rate, also with several threads'''
+
+	rate = 20.0
+	fetcher = Fetcher(concurrency = 4, rate = rate, retries = 0)
+	start = len(server.requests)
+	list(fetcher.map(lambda idx: fetcher.get('{0}/flaky/rate{1}'.format(server.base_url, idx)), range(10)))
+	times = sorted(request_time for request_time, path in server.requests[start:])
+	gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+	# Allow for some scheduling jitter between sending a request and the server receiving it
+	return min(gaps) >= 0.8 / rate, 'smallest gap between requests {0:.3f} seconds, limit {1:.3f}'.format(min(gaps), 1.0 / rate)
+
+def check_retries(server):
+	'''Server errors are retried until they succeed, or until the retries run out'''
+
+	fetcher = Fetcher(concurrency = 1, rate = 0, retries = 3, backoff = 0.01)
+	recovered = fetcher.get(server.base_url + '/flaky/recover?fail=2')
+	failed = fetcher.get(server.base_url + '/flaky/fail?fail=5')
+	down = fetcher.get(server.base_url + '/down')
+	redirect = fetcher.get(server.base_url + '/redirect')
+	ok = recovered is not None and recovered.status_code == 200 and server.counts['/flaky/recover'] == 3
+	ok = ok and failed is None and server.counts['/flaky/fail'] == 4 and down is None and server.counts['/down'] == 4 and redirect is None
+	return ok, 'recovered after {0} attempts, gave up after {1} and {2} attempts, redirect loop skipped: {3}'.format(
+		server.counts['/flaky/recover'], server.counts['/flaky/fail'], server.counts['/down'], redirect is None)
+
+def check_ordered_map(server):
+	'''Archive and article pages are fetched and extracted, map yields the articles in order although they finish out of order'''
+
+	fetcher = Fetcher(concurrency = 6, rate = 0, retries = 0)
+	archive = fetcher.get(server.base_url + '/archive/20160101')
+	article_urls, next_page = extractors.extract_articles_volkskrant(archive.content)
+	texts = [extractors.extract_article_text('volkskrant', response.content) for response in fetcher.map(fetcher.get, article_urls)]
+	ok = len(article_urls) == num_articles and next_page is None and texts == [article_text(number) for number in range(num_articles)]
+	return ok, 'fetched {0} articles, {1} in order with the expected text'.format(len(texts), sum(1 for number, text in enumerate(texts) if text == article_text(number)))
+
+if __name__ == '__main__':
+	server = serve_fixture()
+	print 'Serving canned pages on {0}'.format(server.base_url)
+	failed = 0
+	for check in [check_rate_limit, check_retries, check_ordered_map]:
+		time_0 = time.time()
+		ok, message = check(server)
+		print '{0}: {1} ({2}), took {3:.2f} seconds'.format(check.__name__, 'ok' if ok else 'FAILED', message, time.time() - time_0)
+		failed += not ok
+	server.shutdown()
+	if failed:
+		raise SystemExit(1)
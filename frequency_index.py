@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import numpy as np
+import codecs, argparse, time, json, os
+from instrumentation import add_arguments, configure_from_args, stage
+import artifact_cache
+
+'''
+Script for building a token-count index of the tokenized year slices of a newspaper. Streams every
+{paper}_{year}_tokenized file exactly once and stores a year x vocabulary count matrix, plus the total
+number of tokens and sentences per slice, so counts and frequencies become dictionary lookups.
+'''
+
+def index_path(corpus_dir, paper):
+	'''Returns the directory of the frequency index for a given newspaper'''
+
+	return os.path.join(corpus_dir, '{0}_counts'.format(paper))
+
+def count_slice(fn, vocab_index, vocab):
+	'''Streams a tokenized slice, adds unseen words to the vocabulary.
+	Returns per-word counts (indexed by vocabulary id), and the number of tokens and sentences'''
+
+	counts = {}
+	num_tokens = 0
+	num_sentences = 0
+	with codecs.open(fn, 'r', encoding = 'utf-8') as f:
+		for line in f:
+			tokens = line.split()
+			num_tokens += len(tokens)
+			num_sentences += 1
+			for token in tokens:
+				counts[token] = counts.get(token, 0) + 1
+	slice_counts = np.zeros(len(vocab) + len(counts), dtype = np.uint32)
+	for word, count in counts.iteritems():
+		idx = vocab_index.get(word)
+		if idx is None:
+			idx = vocab_index[word] = len(vocab)
+			vocab.append(word)
+		slice_counts[idx] = count
+	return slice_counts[:len(vocab)], num_tokens, num_sentences
+
+def build_frequency_index(corpus_dir, paper, years, cache = None):
+	'''Counts all year slices of a newspaper, writes the index and returns its directory.
+	With an artifact cache, an index counted before from the same slices is restored instead'''
+
+	out_dir = index_path(corpus_dir, paper)
+	inputs = [os.path.join(corpus_dir, '{0}_{1}_tokenized'.format(paper, year)) for year in years]
+	# Only fingerprint existing files, a missing slice is reported when counting
+	if cache is not None and not all(os.path.exists(fn) for fn in inputs):
+		cache = None
+	if cache is not None:
+		fingerprint = cache.fingerprint('frequency_index', inputs, {'paper': paper, 'years': list(years)})
+		if cache.restore('frequency_index', fingerprint, out_dir):
+			print '\tRestored from the cache'
+			return out_dir
+	vocab = []
+	vocab_index = {}
+	year_counts = []
+	totals = []
+	sentences = []
+	for year in years:
+		print '\tCounting {0}_{1}...'.format(paper, year)
+		with stage('count_slice', paper = paper, year = year, unit = 'tokens') as count_stage:
+			slice_counts, num_tokens, num_sentences = count_slice(os.path.join(corpus_dir, '{0}_{1}_tokenized'.format(paper, year)), vocab_index, vocab)
+			count_stage.items = num_tokens
+		year_counts.append(slice_counts)
+		totals.append(num_tokens)
+		sentences.append(num_sentences)
+	if not os.path.exists(out_dir):
+		os.makedirs(out_dir)
+	counts = np.lib.format.open_memmap(os.path.join(out_dir, 'counts.npy'), mode = 'w+', dtype = np.uint32, shape = (len(years), len(vocab)))
+	for idx, slice_counts in enumerate(year_counts):
+		counts[idx, :len(slice_counts)] = slice_counts
+	counts.flush()
+	del counts
+	with codecs.open(os.path.join(out_dir, 'vocab.txt'), 'w', encoding = 'utf-8') as of:
+		for word in vocab:
+			of.write(word + '\n')
+	with open(os.path.join(out_dir, 'meta.json'), 'w') as of:
+		json.dump({'paper': paper, 'years': list(years), 'totals': totals, 'sentences': sentences}, of)
+	if cache is not None:
+		cache.store('frequency_index', fingerprint, [os.path.join(out_dir, fn) for fn in ['counts.npy', 'vocab.txt', 'meta.json']], {'paper': paper})
+	return out_dir
+
+class FrequencyIndex(object):
+	'''Memory-mapped token counts of all year slices of one newspaper, as written by build_frequency_index'''
+
+	def __init__(self, directory):
+		with open(os.path.join(directory, 'meta.json'), 'r') as f:
+			self.meta = json.load(f)
+		self.years = self.meta['years']
+		self.year_index = dict((year, idx) for idx, year in enumerate(self.years))
+		self.totals = dict(zip(self.years, self.meta['totals']))
+		with codecs.open(os.path.join(directory, 'vocab.txt'), 'r', encoding = 'utf-8') as f:
+			self.index = dict((line.rstrip('\n'), idx) for idx, line in enumerate(f))
+		self.counts = np.load(os.path.join(directory, 'counts.npy'), mmap_mode = 'r')
+
+	def count(self, word, year):
+		'''Returns the number of occurrences of a word (as token) in a year slice'''
+
+		if isinstance(word, str):
+			word = word.decode('utf-8')
+		idx = self.index.get(word)
+		if idx is None:
+			return 0
+		return int(self.counts[self.year_index[year], idx])
+
+	def frequency(self, word, year):
+		'''Returns the frequency of a word in a year slice, in occurrences per million tokens'''
+
+		return float(self.count(word, year)) / float(self.totals[year]) * 1000000.0
+
+	def count_matrix(self, words, years):
+		'''Returns a words x years array of counts, zero for unknown words'''
+
+		ids = np.array([self.index.get(word.decode('utf-8') if isinstance(word, str) else word, -1) for word in words], dtype = np.int64)
+		known = ids >= 0
+		counts = np.zeros((len(words), len(years)), dtype = np.int64)
+		counts[known] = np.asarray(self.counts[:, ids[known]])[[self.year_index[year] for year in years]].T
+		return counts
+
+	def frequency_matrix(self, words, years):
+		'''Returns a words x years array of frequencies (occurrences per million tokens), zero for unknown words'''
+
+		return self.count_matrix(words, years) / np.array([self.totals[year] for year in years], dtype = np.float64) * 1000000.0
+
+def open_frequency_index(corpus_dir, paper):
+	'''Opens the frequency index for a newspaper, quits with a message if it has not been built yet'''
+
+	directory = index_path(corpus_dir, paper)
+	if not os.path.exists(os.path.join(directory, 'meta.json')):
+		raise SystemExit('Quitting: no frequency index in {0}, run frequency_index.py {1} first'.format(directory, paper))
+	with stage('open_frequency_index', paper = paper, unit = 'words') as open_stage:
+		index = FrequencyIndex(directory)
+		open_stage.items = len(index.index)
+	return index
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('newspaper', metavar = 'trouw|volkskrant', type = str, help = "Specify which newspaper (Trouw or Volkskrant) to count")
+	parser.add_argument('-d', '--corpus-dir', metavar = 'DIR', type = str, default = 'working', help = "Specify the directory containing the tokenized year slices, default is working")
+	add_arguments(parser)
+	artifact_cache.add_arguments(parser)
+	args = parser.parse_args()
+	configure_from_args(args)
+	paper = args.newspaper
+	if paper not in ['volkskrant', 'trouw']:
+		print 'Not an available newspaper!'
+		raise SystemExit
+
+	time_0 = time.time()
+	print 'Counting tokens in {0}...'.format(paper)
+	out_dir = build_frequency_index(args.corpus_dir, paper, range(1994,2017), artifact_cache.open_cache(args))
+	print 'Done! Wrote {0}, took {1:.2f} seconds'.format(out_dir, time.time() - time_0)
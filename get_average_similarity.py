@@ -1,23 +1,34 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
-import gensim
-from scipy.spatial.distance import cosine
+from embedding_store import store_path
+from slice_cache import SliceCache
+from instrumentation import add_arguments, configure_from_args, stage
+import artifact_cache
 import argparse
 import json
 import time
+import os
 
 ''' 
 Script that takes a list of words (one per line) and a directory containing one or more 
 sets of diachronic embeddings. Outputs average self-similarity from year-to-year for 
-the words in the list.
+the words in the list. Slices are loaded on demand, from the packed embedding store (see embedding_store.py)
+or the word2vec files, through an LRU cache holding at most --max-slices slices (see slice_cache.py).
 '''
 
 parser = argparse.ArgumentParser(description = '')
 parser.add_argument('word_list', metavar = 'LIST', type = str, help = "Specify the file containing the list of words (one-per-line) to query.")
 parser.add_argument('embedding_dir', metavar = 'DIR', type = str, help = "Specify the directory containing the Volkskrant and Trouw embeddings.")
 parser.add_argument('-in', '--initialize', action = 'store_true', help = "Initialize embedding using first slice")
+parser.add_argument('-al', '--aligned', action = 'store_true', help = "Read the stores of independently trained, aligned slices (see align_embeddings.py) instead of the chained embeddings")
+parser.add_argument('-ms', '--max-slices', metavar = 'NUM', type = int, default = 2, help = "Maximum number of year slices to hold at a time, default is 2")
+add_arguments(parser)
+artifact_cache.add_arguments(parser)
 args = parser.parse_args()
+configure_from_args(args)
+cache = artifact_cache.open_cache(args)
+suffix = '_aligned' if args.aligned else '_reverse'
 
 # Read in word list
 words = []
@@ -29,57 +40,43 @@ for line in word_list_file:
 		words.append(line.strip())
 print 'Read list of {0} words'.format(len(words))
 
-# Generate year-slice numbers
-years = range(2016, 1993, -1)
+# Skip querying if the averages for the same word list and stores are cached
+papers = ['volkskrant', 'trouw']
+out_fn = '{1}/{0}_average_similarity.json'.format(args.word_list[:-4], args.embedding_dir)
+if cache is not None:
+	inputs = [args.word_list]
+	for paper in papers:
+		inputs += [os.path.join(store_path(paper, suffix), fn) for fn in ['vectors.npy', 'present.npy', 'vocab.txt', 'meta.json']]
+	if all(os.path.exists(fn) for fn in inputs):
+		fingerprint = cache.fingerprint('average_similarity', inputs, {'initialize': args.initialize})
+		if cache.restore('average_similarity', fingerprint, os.path.dirname(out_fn)):
+			print 'Restored {0} from the cache'.format(out_fn)
+			raise SystemExit
+	else:
+		cache = None
 
 # Load models, query words, store results
 results = {} # format: {avg_similarity_volkskrant_1995_1994: 0.1, ...}
-papers = ['volkskrant', 'trouw']
+slice_cache = SliceCache(args.max_slices)
 for paper in papers:
-	time_0 = time.time()
-	num_words = len(words)
 	print 'Querying against embeddings from {0}'.format(paper)
-	print '\tLoading models, should take a while...'
-	models = []
-	if args.initialize:
-		print '\tLoading initial model...'
-		models.append(gensim.models.Word2Vec.load_word2vec_format('working/{0}_initial_reverse.w2v'.format(paper)))
-		print '\tDone! took {0} seconds'.format(time.time() - time_0)
-	for year in years:
-		print '\tLoading model {0}_{1}...'.format(paper, year)
-		time_0 = time.time()
-		models.append(gensim.models.Word2Vec.load_word2vec_format('working/{0}_{1}_reverse.w2v'.format(paper, year)))
-		print '\tDone! took {0:.2f} seconds'.format(time.time() - time_0)
-
 	print '\nQuerying words...'
 	time_0 = time.time()
-	for word in words:
-		try:
-			for idx, model in enumerate(models):
-				if idx == 0:
-					continue
-				else:
-					prev_model = models[idx-1]
-					similarity = 1 - cosine(model[word], prev_model[word])
-					if args.initialize:
-						year = years[idx-1]
-					else:
-						year = years[idx]
-					try:
-						results['avg_similarity_{0}_{1}_{2}'.format(paper, year + 1, year)] += similarity
-					except KeyError:
-						results['avg_similarity_{0}_{1}_{2}'.format(paper, year + 1, year)] = similarity
-		except KeyError:
-			print 'Word {0} not found.'.format(word)
-			num_words -= 1
-			continue
+	with stage('self_similarity', paper = paper, unit = 'words', items = len(words)):
+		found, pair_years, similarities = slice_cache.self_similarity_matrix(paper, words, suffix, args.initialize)
+		averages = similarities[found].mean(axis = 0)
+	for word in [word for idx, word in enumerate(words) if not found[idx]]:
+		print 'Word {0} not found.'.format(word)
+	num_words = int(found.sum())
 	print 'Got similarities for {0} of {1} words'.format(num_words, len(words))
 	print 'Took {0:.4f} seconds'.format(time.time() - time_0)
 
-	# Get avg from sum
-	for key in results:
-		if paper in key:
-			results[key] /= num_words
+	# Get avg over found words
+	for idx, year in enumerate(pair_years):
+		results['avg_similarity_{0}_{1}_{2}'.format(paper, year + 1, year)] = float(averages[idx])
 
 # Output results to file
-json.dump(results, open('{1}/{0}_average_similarity.json'.format(args.word_list[:-4], args.embedding_dir), 'w'))
+with open(out_fn, 'w') as of:
+	json.dump(results, of)
+if cache is not None:
+	cache.store('average_similarity', fingerprint, [out_fn], {'word_list': args.word_list})
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import cProfile, json, os, resource, socket, threading, time
+
+'''
+Structured instrumentation shared by the pipeline scripts. Stages (a slice being trained, a year being scraped,
+a store being loaded, ...) are timed as context managers, and emit one JSON line each to a metrics file, with
+the stage name, extra fields such as paper and year, items processed, wall time, CPU time and peak RSS. Long
+stages can also emit progress events with throughput and ETA. Nothing is written unless a metrics file is
+configured (--metrics, or the PIPELINE_METRICS environment variable, which child processes inherit).
+With a profile directory (--profile, or PIPELINE_PROFILE), every outermost stage is also run under cProfile.
+'''
+
+lock = threading.Lock()
+active_profile = threading.local()
+
+def add_arguments(parser):
+	'''Adds the --metrics and --profile arguments to a script's argument parser'''
+
+	parser.add_argument('-me', '--metrics', metavar = 'METRICS.jsonl', type = str, help = "Append structured per-stage metrics (JSON lines) to this file")
+	parser.add_argument('-pf', '--profile', metavar = 'DIR', type = str, help = "Write a cProfile dump of every stage to this directory")
+
+def configure(metrics = None, profile = None):
+	'''Sets the metrics file and profile directory, for this process and any child processes started afterwards'''
+
+	if metrics:
+		os.environ['PIPELINE_METRICS'] = os.path.abspath(metrics)
+	if profile:
+		if not os.path.exists(profile):
+			os.makedirs(profile)
+		os.environ['PIPELINE_PROFILE'] = os.path.abspath(profile)
+
+def configure_from_args(args):
+	'''Configures instrumentation from parsed --metrics and --profile arguments'''
+
+	configure(args.metrics, args.profile)
+
+def enabled():
+	'''Returns whether a metrics file is configured'''
+
+	return bool(os.environ.get('PIPELINE_METRICS'))
+
+def cpu_seconds():
+	'''Returns the CPU time (user and system, all threads) used by this process so far'''
+
+	usage = resource.getrusage(resource.RUSAGE_SELF)
+	return usage.ru_utime + usage.ru_stime
+
+def peak_rss_mb():
+	'''Returns the peak resident set size of this process in MB (ru_maxrss is in KB on Linux)'''
+
+	return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def emit(event):
+	'''Appends an event to the metrics file, if one is configured'''
+
+	fn = os.environ.get('PIPELINE_METRICS')
+	if not fn:
+		return
+	event.setdefault('time', time.time())
+	event.setdefault('host', socket.gethostname())
+	event.setdefault('pid', os.getpid())
+	line = json.dumps(event, sort_keys = True) + '\n'
+	with lock:
+		with open(fn, 'a') as of:
+			of.write(line)
+
+class Stage(object):
+	'''Context manager timing a stage of the pipeline. Count processed items with add(), or set items directly'''
+
+	def __init__(self, name, items = None, unit = None, total = None, **fields):
+		self.name = name
+		self.items = items
+		self.unit = unit
+		self.total = total
+		self.fields = fields
+		self.profile = None
+
+	def __enter__(self):
+		self.wall_0 = time.time()
+		self.cpu_0 = cpu_seconds()
+		self.last_progress = self.wall_0
+		profile_dir = os.environ.get('PIPELINE_PROFILE')
+		if profile_dir and not getattr(active_profile, 'stage', None):
+			self.profile = cProfile.Profile()
+			active_profile.stage = self
+			self.profile.enable()
+		return self
+
+	def add(self, num_items = 1):
+		'''Counts processed items'''
+
+		self.items = (self.items or 0) + num_items
+
+	def progress(self, done, total = None, every = 0):
+		'''Emits a progress event with throughput and ETA, at most once per `every` seconds'''
+
+		now = time.time()
+		if now - self.last_progress < every:
+			return
+		self.last_progress = now
+		total = total or self.total
+		seconds = now - self.wall_0
+		rate = done / seconds if seconds > 0 else None
+		event = dict(self.fields, event = 'progress', stage = self.name, items = done, total = total, unit = self.unit, wall_seconds = seconds, items_per_second = rate, peak_rss_mb = peak_rss_mb())
+		if total and rate:
+			event['eta_seconds'] = (total - done) / rate
+		emit(event)
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		wall = time.time() - self.wall_0
+		cpu = cpu_seconds() - self.cpu_0
+		if self.profile is not None:
+			self.profile.disable()
+			active_profile.stage = None
+			fields = ''.join('_{0}'.format(self.fields[key]) for key in sorted(self.fields))
+			self.profile.dump_stats(os.path.join(os.environ['PIPELINE_PROFILE'], '{0}{1}_{2}.prof'.format(self.name, fields, os.getpid())))
+		event = dict(self.fields, event = 'stage', stage = self.name, items = self.items, unit = self.unit, wall_seconds = wall, cpu_seconds = cpu, peak_rss_mb = peak_rss_mb(), ok = exc_type is None)
+		if self.items is not None and wall > 0:
+			event['items_per_second'] = self.items / wall
+		emit(event)
+		self.wall = wall
+		self.cpu = cpu
+		return False
+
+def stage(name, items = None, unit = None, total = None, **fields):
+	'''Returns a Stage context manager, e.g. with stage('train', paper = 'trouw', year = 1994, unit = 'words') as s: ...'''
+
+	return Stage(name, items, unit, total, **fields)
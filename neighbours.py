@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import numpy as np
+import argparse, json, os, time
+from embedding_store import open_store
+from self_similarity import word_rows, normalize
+try:
+	import hnswlib
+except ImportError:
+	hnswlib = None
+
+'''
+Nearest neighbours of words within a year slice of an embedding store, and the overlap of neighbourhoods
+between consecutive slices as a measure of meaning shift. Uses a prebuilt approximate (HNSW) index per slice
+if hnswlib is installed and the index has been built, otherwise an exact search that scans the slice in blocks
+of rows, so only one block of the (memory-mapped) matrix is in memory at a time.
+'''
+
+def index_path(store, slice_label):
+	'''Returns the filename of the HNSW index of a slice, next to the store'''
+
+	return os.path.join(store.directory, '{0}.hnsw'.format(slice_label))
+
+def build_index(store, slice_label, ef_construction = 200, M = 16):
+	'''Builds and saves the HNSW index over the rows present in a slice'''
+
+	slice_idx = store.slices.index(slice_label)
+	rows = np.flatnonzero(store.present[slice_idx])
+	index = hnswlib.Index(space = 'cosine', dim = store.vectors.shape[2])
+	index.init_index(max_elements = len(rows), ef_construction = ef_construction, M = M)
+	index.add_items(normalize(store.vectors[slice_idx][rows], np.float32), rows)
+	index.save_index(index_path(store, slice_label))
+
+def load_index(store, slice_label, ef = 100):
+	'''Loads the HNSW index of a slice, returns None if hnswlib is missing or the index has not been built'''
+
+	if hnswlib is None or not os.path.exists(index_path(store, slice_label)):
+		return None
+	index = hnswlib.Index(space = 'cosine', dim = store.vectors.shape[2])
+	index.load_index(index_path(store, slice_label))
+	index.set_ef(ef)
+	return index
+
+def exact_nearest_rows(store, slice_label, rows, k = 10, block_size = 32768):
+	'''Finds the k nearest rows (by cosine) within a slice for each of the given rows, by scanning the slice.
+	Returns rows x k arrays of neighbour rows and similarities, sorted by decreasing similarity'''
+
+	slice_idx = store.slices.index(slice_label)
+	vectors = store.vectors[slice_idx]
+	present = store.present[slice_idx]
+	queries = normalize(vectors[rows], np.float32)
+	index = np.arange(len(rows))[:, np.newaxis]
+	best_rows = np.zeros((len(rows), 0), dtype = np.int64)
+	best_similarities = np.zeros((len(rows), 0), dtype = np.float32)
+	for start in range(0, vectors.shape[0], block_size):
+		end = min(start + block_size, vectors.shape[0])
+		similarities = np.dot(queries, normalize(vectors[start:end], np.float32).T)
+		similarities[:, ~np.asarray(present[start:end])] = -np.inf
+		# Exclude the query words themselves
+		in_block = (rows >= start) & (rows < end)
+		similarities[np.flatnonzero(in_block), rows[in_block] - start] = -np.inf
+		# Take the top k of the block, merge them with the best so far and keep the top k
+		num_block = min(k, end - start)
+		top = np.argpartition(-similarities, num_block - 1, axis = 1)[:, :num_block]
+		candidate_rows = np.hstack([best_rows, top + start])
+		candidate_similarities = np.hstack([best_similarities, similarities[index, top]])
+		num_keep = min(k, candidate_similarities.shape[1])
+		top = np.argpartition(-candidate_similarities, num_keep - 1, axis = 1)[:, :num_keep]
+		best_rows = candidate_rows[index, top]
+		best_similarities = candidate_similarities[index, top]
+	order = np.argsort(-best_similarities, axis = 1)
+	return best_rows[index, order], best_similarities[index, order]
+
+def nearest_rows(store, slice_label, rows, k = 10, query_chunk = 1024):
+	'''Finds the k nearest rows within a slice for each of the given rows, using the slice's HNSW index if available.
+	Queries are processed in chunks to bound memory. Returns rows x k arrays of neighbour rows and similarities
+	(with no rows if no rows are given)'''
+
+	index = load_index(store, slice_label)
+	slice_idx = store.slices.index(slice_label)
+	neighbour_rows = [np.zeros((0, k), dtype = np.int64)]
+	similarities = [np.zeros((0, k), dtype = np.float32)]
+	for start in range(0, len(rows), query_chunk):
+		chunk = rows[start:start + query_chunk]
+		if index is None:
+			chunk_rows, chunk_similarities = exact_nearest_rows(store, slice_label, chunk, k)
+		else:
+			# Ask for one extra neighbour, as the query word is usually its own nearest neighbour
+			labels, distances = index.knn_query(normalize(store.vectors[slice_idx][chunk], np.float32), k = k + 1)
+			not_self = labels != chunk[:, np.newaxis]
+			chunk_rows = np.array([labels[idx][not_self[idx]][:k] for idx in range(len(chunk))], dtype = np.int64).reshape(len(chunk), -1)
+			chunk_similarities = np.array([1.0 - distances[idx][not_self[idx]][:k] for idx in range(len(chunk))], dtype = np.float32).reshape(len(chunk), -1)
+		neighbour_rows.append(chunk_rows)
+		similarities.append(chunk_similarities)
+	return np.vstack(neighbour_rows), np.vstack(similarities)
+
+def nearest_neighbours(store, slice_label, words, k = 10):
+	'''Returns, for each word, a list of (neighbour, similarity) in a slice, or None if the word is not in the slice'''
+
+	slice_view = store.slice(slice_label)
+	found = [word for word in words if word in slice_view]
+	neighbours = dict((word, None) for word in words)
+	if found:
+		rows = np.array([store.index[word] for word in found])
+		neighbour_rows, similarities = nearest_rows(store, slice_label, rows, k)
+		for idx, word in enumerate(found):
+			neighbours[word] = [(store.vocab[row], float(similarity)) for row, similarity in zip(neighbour_rows[idx], similarities[idx]) if np.isfinite(similarity)]
+	return [neighbours[word] for word in words]
+
+def jaccard(rows_a, rows_b):
+	'''Row-wise Jaccard similarity between two n x k arrays of neighbour sets'''
+
+	intersection = (rows_a[:, :, np.newaxis] == rows_b[:, np.newaxis, :]).any(axis = 2).sum(axis = 1)
+	return intersection / (rows_a.shape[1] + rows_b.shape[1] - intersection).astype(np.float64)
+
+def neighbourhood_overlap_matrix(store, words, k = 10, initialize = False):
+	'''Computes the Jaccard overlap of the k nearest neighbours of each word between consecutive slices.
+	Returns a boolean array marking words found in all slices, the year labels of the slice pairs,
+	and a words x pairs matrix of overlaps (NaN for words not found)'''
+
+	labels = store.slice_labels(initialize)
+	rows = word_rows(store, words)
+	found = rows >= 0
+	slice_indices = [store.slices.index(label) for label in labels]
+	found[found] = np.asarray(store.present[slice_indices][:, rows[found]]).all(axis = 0)
+	overlaps = np.empty((len(words), len(labels) - 1))
+	overlaps.fill(np.nan)
+	prev_neighbours = nearest_rows(store, labels[0], rows[found], k)[0]
+	for idx in range(1, len(labels)):
+		neighbours = nearest_rows(store, labels[idx], rows[found], k)[0]
+		overlaps[found, idx - 1] = jaccard(neighbours, prev_neighbours)
+		prev_neighbours = neighbours
+	return found, labels[1:], overlaps
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('word_list', metavar = 'LIST', type = str, nargs = '?', help = "Specify the file containing the list of words (one-per-line) to get the neighbourhood overlap for.")
+	parser.add_argument('-k', '--neighbours', metavar = 'K', type = int, default = 10, help = "Number of nearest neighbours to compare, default is 10")
+	parser.add_argument('-bi', '--build-index', action = 'store_true', help = "Build the HNSW index of every slice (requires hnswlib)")
+	parser.add_argument('-in', '--initialize', action = 'store_true', help = "Initialize embedding using first slice")
+	args = parser.parse_args()
+	if args.build_index and hnswlib is None:
+		raise SystemExit('Quitting: hnswlib is not installed, the exact search needs no index')
+
+	papers = ['volkskrant', 'trouw']
+	if args.build_index:
+		for paper in papers:
+			store = open_store(paper, '_reverse')
+			for label in store.slices:
+				print 'Building index for {0}_{1}...'.format(paper, label)
+				time_0 = time.time()
+				build_index(store, label)
+				print 'Done! took {0:.2f} seconds'.format(time.time() - time_0)
+
+	if args.word_list:
+		# Read in word list
+		words = []
+		word_list_file = open(args.word_list, 'r')
+		for line in word_list_file:
+			if ' ' in line.strip():
+				print 'More than one word on this line: {0}'.format(line.strip())
+			else:
+				words.append(line.strip())
+		print 'Read list of {0} words'.format(len(words))
+
+		results = {} # format: {'word': {'overlap_volkskrant_1995_1994': 0.1, ...}}
+		for word in words:
+			results[word] = {}
+		for paper in papers:
+			print 'Querying neighbourhoods in {0}'.format(paper)
+			time_0 = time.time()
+			store = open_store(paper, '_reverse')
+			found, pair_years, overlaps = neighbourhood_overlap_matrix(store, words, args.neighbours, args.initialize)
+			for word_idx, word in enumerate(words):
+				if found[word_idx]:
+					for idx, year in enumerate(pair_years):
+						results[word]['overlap_{0}_{1}_{2}'.format(paper, year + 1, year)] = overlaps[word_idx, idx]
+			print 'Got overlaps for {0} of {1} words, took {2:.2f} seconds'.format(int(found.sum()), len(words), time.time() - time_0)
+
+		# Output results to file
+		json.dump(results, open('{0}_neighbourhood_overlap.json'.format(args.word_list[:-4]), 'w'))
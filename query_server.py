@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import argparse, json, math, os, time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+from embedding_store import open_store
+from frequency_index import open_frequency_index, index_path
+from self_similarity import self_similarity_matrix
+from neighbours import nearest_neighbours
+
+'''
+Long-running local HTTP/JSON service for diachronic lookups. Opens the embedding stores (and frequency indexes,
+if built) of both newspapers once, then answers batched requests. POST a JSON object to:
+	/similarity  {"paper": ..., "words": [...], "initialize": false}  year-to-year self-similarity series
+	/neighbours  {"paper": ..., "words": [...], "year": ..., "k": 10}  nearest neighbours (in all years if no year given)
+	/frequency   {"paper": ..., "words": [...]}                        counts and frequencies per year
+GET /info lists the available papers and slices. Invalid requests are answered with status 400, unknown values
+(NaN) are returned as null.
+'''
+
+def check_request(request, sources):
+	'''Validates the fields shared by all requests, raises ValueError for invalid input.
+	Returns the store or frequency index of the requested paper'''
+
+	if not isinstance(request, dict):
+		raise ValueError('request must be a JSON object')
+	paper = request.get('paper')
+	if not isinstance(paper, basestring) or paper not in sources:
+		raise ValueError('paper must be one of {0}'.format(', '.join(sorted(sources))))
+	words = request.get('words')
+	if not isinstance(words, list) or not all(isinstance(word, basestring) for word in words):
+		raise ValueError('words must be a list of strings')
+	if not isinstance(request.get('initialize', False), bool):
+		raise ValueError('initialize must be true or false')
+	if request.get('initialize') and 'initial' not in getattr(sources[paper], 'slices', ['initial']):
+		raise ValueError('the store of {0} has no initial slice'.format(paper))
+	return sources[paper]
+
+def is_integer(value):
+	'''Returns whether a JSON value is an integer (and not a boolean)'''
+
+	return isinstance(value, (int, long)) and not isinstance(value, bool)
+
+def json_safe(value):
+	'''Replaces NaN and infinite floats in (nested lists and dicts of) results by None, i.e. null in JSON'''
+
+	if isinstance(value, float):
+		return value if not (math.isnan(value) or math.isinf(value)) else None
+	if isinstance(value, dict):
+		return dict((key, json_safe(item)) for key, item in value.iteritems())
+	if isinstance(value, (list, tuple)):
+		return [json_safe(item) for item in value]
+	return value
+
+def similarity_request(request):
+	store = check_request(request, stores)
+	words = request['words']
+	found, pair_years, similarities = self_similarity_matrix(store, words, request.get('initialize', False))
+	series = dict((word, similarities[idx].tolist() if found[idx] else None) for idx, word in enumerate(words))
+	return {'years': pair_years, 'similarities': series}
+
+def neighbours_request(request):
+	store = check_request(request, stores)
+	words = request['words']
+	k = request.get('k', 10)
+	if not is_integer(k) or k < 1:
+		raise ValueError('k must be a positive integer')
+	if 'year' in request and not ((is_integer(request['year']) or request['year'] == 'initial') and request['year'] in store.slices):
+		raise ValueError('year must be one of the slices {0}'.format(', '.join(str(label) for label in store.slices)))
+	years = [request['year']] if 'year' in request else store.slice_labels(request.get('initialize', False))
+	neighbours = {}
+	for year in years:
+		neighbours[year] = dict(zip(words, nearest_neighbours(store, year, words, k)))
+	return {'neighbours': neighbours}
+
+def frequency_request(request):
+	counts = check_request(request, frequency_indexes)
+	result = {'years': counts.years, 'counts': {}, 'frequencies': {}}
+	for word in request['words']:
+		result['counts'][word] = [counts.count(word, year) for year in counts.years]
+		result['frequencies'][word] = [counts.frequency(word, year) for year in counts.years]
+	return result
+
+def info_request():
+	return {'papers': dict((paper, {'slices': store.slices, 'vocab_size': len(store.vocab), 'frequencies': paper in frequency_indexes}) for paper, store in stores.items())}
+
+endpoints = {'/similarity': similarity_request, '/neighbours': neighbours_request, '/frequency': frequency_request}
+
+class QueryHandler(BaseHTTPRequestHandler):
+	'''Dispatches JSON requests to the endpoint functions'''
+
+	def send_json(self, status, data):
+		body = json.dumps(json_safe(data), allow_nan = False)
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_GET(self):
+		if self.path == '/info':
+			self.send_json(200, info_request())
+		else:
+			self.send_json(404, {'error': 'Unknown endpoint {0}'.format(self.path)})
+
+	def do_POST(self):
+		if self.path not in endpoints:
+			self.send_json(404, {'error': 'Unknown endpoint {0}'.format(self.path)})
+			return
+		time_0 = time.time()
+		try:
+			request = json.loads(self.rfile.read(int(self.headers.getheader('Content-Length', 0))))
+			result = endpoints[self.path](request)
+		except ValueError as e:
+			self.send_json(400, {'error': 'Bad request: {0}'.format(e)})
+			return
+		except Exception as e:
+			self.send_json(500, {'error': 'Internal error: {0!r}'.format(e)})
+			raise
+		result['took'] = time.time() - time_0
+		self.send_json(200, result)
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('-p', '--port', metavar = 'PORT', type = int, default = 8000, help = "Port to listen on (on localhost), default is 8000")
+	parser.add_argument('-f', '--forward', action = 'store_true', help = "Serve embeddings trained from older to recent years, instead of the reverse embeddings used by the query scripts")
+	parser.add_argument('-al', '--aligned', action = 'store_true', help = "Serve the stores of independently trained, aligned slices (see align_embeddings.py)")
+	parser.add_argument('-d', '--corpus-dir', metavar = 'DIR', type = str, default = 'working', help = "Specify the directory containing the frequency indexes, default is working")
+	parser.add_argument('-c', '--compact', metavar = 'SUFFIX', type = str, default = '', help = "Serve compact stores (see compact_store.py) with this suffix, e.g. _int8_pca100")
+	args = parser.parse_args()
+	reverse = ('_aligned' if args.aligned else '' if args.forward else '_reverse') + args.compact
+
+	# Open stores and frequency indexes once
+	stores = {}
+	frequency_indexes = {}
+	time_0 = time.time()
+	for paper in ['volkskrant', 'trouw']:
+		stores[paper] = open_store(paper, reverse)
+		if os.path.exists(os.path.join(index_path(args.corpus_dir, paper), 'meta.json')):
+			frequency_indexes[paper] = open_frequency_index(args.corpus_dir, paper)
+	print 'Opened stores for {0}, took {1:.2f} seconds'.format(', '.join(stores), time.time() - time_0)
+
+	server = ThreadingHTTPServer(('localhost', args.port), QueryHandler)
+	print 'Serving on http://localhost:{0}/'.format(args.port)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		server.server_close()
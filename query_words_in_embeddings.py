@@ -1,18 +1,25 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
-import gensim
-import codecs, argparse, time, re
-from scipy.spatial.distance import cosine
-import subprocess
-import shlex
+import codecs, argparse, time, re, os
+from embedding_store import open_store, store_path, bootstrap_suffix
+from self_similarity import bootstrap_similarity
+from slice_cache import SliceCache
+from frequency_index import open_frequency_index, index_path
+from results_io import write_results
+from instrumentation import add_arguments, configure_from_args, stage
+import artifact_cache
+import numpy as np
 import csv
-import json
 
 '''
 Script that takes a list of words, a directory containing one or more sets of diachronic embeddings.
+Slices are loaded on demand, from the packed embedding store (see embedding_store.py) or the word2vec files,
+through an LRU cache holding at most --max-slices slices (see slice_cache.py).
 Outputs csv-formatted data containing the word, its embeddings, its self-similarity across time, its
-raw counts, and its corpus frequencies (which requires corpus totals).
+raw counts, and its corpus frequencies (read from the frequency index, see frequency_index.py). Results are
+written as words x paper x year arrays (see results_io.py), and as csv. With --bootstrap, also outputs the mean and
+confidence interval of every self-similarity over the stores of bootstrap replicates (see bootstrap_embeddings.py).
 '''
 
 # Get arguments
@@ -20,7 +27,17 @@ parser = argparse.ArgumentParser(description = '')
 parser.add_argument('word_list', metavar = 'LIST', type = str, help = "Specify the file containing the list of words (one-per-line) to query.")
 parser.add_argument('embedding_dir', metavar = 'DIR', type = str, help = "Specify the directory containing the Volkskrant and Trouw embeddings.")
 parser.add_argument('-in', '--initialize', action = 'store_true', help = "Initialize embedding using first slice")
+parser.add_argument('-ms', '--max-slices', metavar = 'NUM', type = int, default = 2, help = "Maximum number of year slices to hold at a time, default is 2")
+parser.add_argument('-al', '--aligned', action = 'store_true', help = "Read the stores of independently trained, aligned slices (see align_embeddings.py) instead of the chained embeddings")
+parser.add_argument('-cp', '--compact', metavar = 'SUFFIX', type = str, default = '', help = "Read compact stores (see compact_store.py) with this suffix, e.g. _float16")
+parser.add_argument('-bs', '--bootstrap', metavar = 'NUM', type = int, help = "Also report mean and confidence interval of self-similarity over this many bootstrap replicates")
+parser.add_argument('-ci', '--confidence', metavar = 'LEVEL', type = float, default = 0.95, help = "Confidence level of the bootstrap interval, default is 0.95")
+add_arguments(parser)
+artifact_cache.add_arguments(parser)
 args = parser.parse_args()
+configure_from_args(args)
+cache = artifact_cache.open_cache(args)
+suffix = ('_aligned' if args.aligned else '_reverse') + args.compact
 
 # Read in word list
 words = []
@@ -32,86 +49,104 @@ for line in word_list_file:
 		words.append(line.strip())
 print 'List of words: {0}\n'.format(', '.join(words))
 
-# Generate year slice numbers
-years = range(2016, 1993, -1)
+# Skip querying if the results for the same word list, stores and frequency indexes are cached
+papers = ['volkskrant', 'trouw']
+results_fn = '{1}/{0}_results.npz'.format(args.word_list[:-4], args.embedding_dir)
+csv_fn = '{1}/{0}_results.csv'.format(args.word_list[:-4], args.embedding_dir)
+if cache is not None:
+	inputs = [args.word_list]
+	for paper in papers:
+		for store_suffix in [suffix] + [bootstrap_suffix(replicate) for replicate in range(args.bootstrap or 0)]:
+			inputs += [os.path.join(store_path(paper, store_suffix), fn) for fn in ['vectors.npy', 'present.npy', 'vocab.txt', 'meta.json']]
+		inputs += [os.path.join(index_path(args.embedding_dir, paper), fn) for fn in ['counts.npy', 'vocab.txt', 'meta.json']]
+	if all(os.path.exists(fn) for fn in inputs):
+		fingerprint = cache.fingerprint('query_results', inputs, {'initialize': args.initialize, 'bootstrap': args.bootstrap, 'confidence': args.confidence})
+		if cache.restore('query_results', fingerprint, os.path.dirname(results_fn)):
+			print 'Restored {0} from the cache'.format(results_fn)
+			raise SystemExit
+	else:
+		cache = None
 
-# Load models, query words, store results
+# Generate year slice numbers (similarity for year Y is between slices Y+1 and Y, the initial slice counts as 2017)
+years = range(1994, 2016 + int(args.initialize))
+year_index = dict((year, idx) for idx, year in enumerate(years))
+
+# Load models, query words, store results as words x paper x year arrays
 time_0 = time.time()
-results = {} # format: {'word': {'word': 'word', similarity_1994:0.1, ...}}
-for word in words:
-	results[word] = {'word': word}
-papers = ['volkskrant', 'trouw']
+similarity = np.empty((len(words), len(papers), len(years)))
+similarity.fill(np.nan)
+count = np.empty_like(similarity)
+count.fill(np.nan)
+frequency = np.empty_like(similarity)
+frequency.fill(np.nan)
+found = np.zeros((len(words), len(papers)), dtype = bool)
+slice_cache = SliceCache(args.max_slices)
+bootstrap = None
+if args.bootstrap:
+	bootstrap = {}
+	for name in ['mean', 'std', 'low', 'high']:
+		bootstrap[name] = np.empty_like(similarity)
+		bootstrap[name].fill(np.nan)
 
-for paper in papers:
+for paper_idx, paper in enumerate(papers):
 	print 'Querying against embeddings from {0}'.format(paper)
-	print '\tLoading models, should take a while...'
-	year_totals = {} # {year: total}
-	models = []
-	# Load embeddings
-	if args.initialize:
-		print '\tLoading initial model...'
-		models.append(gensim.models.Word2Vec.load_word2vec_format('working/{0}_initial_reverse.w2v'.format(paper)))
-		print '\tDone! took {0} seconds'.format(time.time() - time_0)
-	for year in years:
-		print '\tLoading model {0}_{1}...'.format(paper, year)
-		time_0 = time.time()
-		models.append(gensim.models.Word2Vec.load_word2vec_format('working/{0}_{1}_reverse.w2v'.format(paper, year)))
-		print '\tDone! took {0:.2f} seconds'.format(time.time() - time_0)
-		# Get word counts per year-slice subcorpus
-		processing_call = shlex.split('wc -w {0}/{1}_{2}_tokenized'.format(args.embedding_dir, paper, year))
-		proc = subprocess.Popen(processing_call, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-		year_totals[year] = proc.stdout.read().strip().split(' ')[0]
+	# Load word counts and totals per year-slice subcorpus
+	counts = open_frequency_index(args.embedding_dir, paper)
 
 	# Query words and get data points we need
 	print '\nQuerying words...'
-	for word in words:
-		print '\tQuerying word {0}'.format(word)
-		try:
-			for idx, model in enumerate(models):
-				if idx == 0:
-					continue
-				else:
-					prev_model = models[idx-1]
-					similarity = 1 - cosine(model[word], prev_model[word])
-					if args.initialize:
-						year = years[idx-1]
-					else:
-						year = years[idx]
-					results[word]['similarity_{0}_{1}_{2}'.format(paper, year + 1, year)] = similarity
-					print '\tyear: {0} - similarity: {1:.5f}'.format(year, similarity)
-					# Get count and frequency of word in corpus
-					processing_call = shlex.split("grep -c '\\b{0}\\b' {1}/{2}_{3}_tokenized".format(word, args.embedding_dir, paper, year))
-					proc = subprocess.Popen(processing_call, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-					word_count = proc.stdout.read().strip()
-					results[word]['count_{0}_{1}'.format(paper, year)] = word_count
-					results[word]['frequency_{0}_{1}'.format(paper, year)] = float(word_count)/float(year_totals[year])*1000000.0
-		except KeyError:
-			print 'Word not found.'
-			continue
-	
+	with stage('self_similarity', paper = paper, unit = 'words', items = len(words)):
+		paper_found, pair_years, similarities = slice_cache.self_similarity_matrix(paper, words, suffix, args.initialize)
+	found[:, paper_idx] = paper_found
+	rows = np.flatnonzero(paper_found)
+	found_words = [words[row] for row in rows]
+	cells = np.ix_(rows, [paper_idx], [year_index[year] for year in pair_years])
+	similarity[cells] = similarities[rows][:, np.newaxis, :]
+	with stage('frequency_lookup', paper = paper, unit = 'words', items = len(found_words)):
+		count[cells] = counts.count_matrix(found_words, pair_years)[:, np.newaxis, :]
+		frequency[cells] = counts.frequency_matrix(found_words, pair_years)[:, np.newaxis, :]
+	print 'Found {0} of {1} words'.format(int(paper_found.sum()), len(words))
+
+	# Summarize self-similarity over the bootstrap replicates
+	if args.bootstrap:
+		stores = [open_store(paper, bootstrap_suffix(replicate)) for replicate in range(args.bootstrap)]
+		with stage('bootstrap_similarity', paper = paper, unit = 'words', items = len(words) * args.bootstrap):
+			boot_found, boot_years, stats = bootstrap_similarity(stores, words, args.confidence, args.initialize)
+		rows = np.flatnonzero(boot_found)
+		cells = np.ix_(rows, [paper_idx], [year_index[year] for year in boot_years])
+		for name in stats:
+			bootstrap[name][cells] = stats[name][rows][:, np.newaxis, :]
+		print 'Found {0} of {1} words in all {2} bootstrap replicates'.format(len(rows), len(words), args.bootstrap)
+
 # Output results to file
-json.dump(results, open('{1}/{0}_results.json'.format(args.word_list[:-4], args.embedding_dir), 'w'))
+write_results(results_fn, words, papers, years, similarity, count, frequency, found, bootstrap)
 
 # Generate CSV-headers
 columns = ['word']
 for paper in papers:
-	for year in years[1:]:
-		for cat in ['similarity', 'count', 'frequency']:
-			if cat == 'similarity':
+	for year in reversed(years):
+		for cat in ['similarity'] + (['similarity_mean', 'similarity_low', 'similarity_high'] if bootstrap else []) + ['count', 'frequency']:
+			if cat.startswith('similarity'):
 				columns.append('{0}_{1}_{2}_{3}'.format(cat, paper, year + 1, year))
 			else:
 				columns.append('{0}_{1}_{2}'.format(cat, paper, year))
 
 # Write CSV to file
-with open('{1}/{0}_results.csv'.format(args.word_list[:-4], args.embedding_dir), 'wb') as of:
+with open(csv_fn, 'wb') as of:
 	writer = csv.writer(of, delimiter=';')
 	writer.writerow(columns) # Write header
-	for word in words:
-		word_results = results[word]
-		if len(word_results) == len(columns):
-			row_list = []
-			for column in columns:
-				row_list.append(word_results[column])
+	for word_idx, word in enumerate(words):
+		if found[word_idx].all():
+			row_list = [word]
+			for paper_idx in range(len(papers)):
+				for year_idx in reversed(range(len(years))):
+					row_list.append(similarity[word_idx, paper_idx, year_idx])
+					if bootstrap:
+						row_list += [bootstrap[name][word_idx, paper_idx, year_idx] for name in ['mean', 'low', 'high']]
+					row_list += [int(count[word_idx, paper_idx, year_idx]), frequency[word_idx, paper_idx, year_idx]]
 			writer.writerow(row_list)
 		else:
 			print 'No results for {0}'.format(word)
+
+if cache is not None:
+	cache.store('query_results', fingerprint, [results_fn, csv_fn], {'word_list': args.word_list})
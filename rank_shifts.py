@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import numpy as np
+import codecs, argparse, heapq, os, time
+from embedding_store import open_store
+from frequency_index import open_frequency_index, index_path
+from self_similarity import self_similarity_rows, normalized_distance
+
+'''
+Script for discovering meaning shifts in the whole vocabulary instead of a given word list. Scores every word
+present in all slices by its year-to-year self-distance, and by its frequency-normalized self-distance (as in
+analyze_and_plot_words.py), processing the vocabulary in chunks. Keeps the top-N most shifted words per year
+pair and newspaper, and writes them to a ranked tab-separated file.
+'''
+
+def push_top(heap, scores, words, top_n):
+	'''Adds (score, word) pairs to a min-heap holding the top_n highest scores'''
+
+	candidates = np.flatnonzero(np.isfinite(scores))
+	if len(candidates) > top_n:
+		candidates = candidates[np.argpartition(-scores[candidates], top_n - 1)[:top_n]]
+	for idx in candidates:
+		item = (float(scores[idx]), words[idx])
+		if len(heap) < top_n:
+			heapq.heappush(heap, item)
+		elif item > heap[0]:
+			heapq.heapreplace(heap, item)
+
+def rank_shifts(store, frequencies, top_n = 100, chunk_size = 20000, initialize = False):
+	'''Scores all words present in every slice of a store, in chunks.
+	Returns the year labels of the slice pairs and {metric: [heap per pair]} with the top_n (score, word) pairs'''
+
+	labels = store.slice_labels(initialize)
+	slice_indices = [store.slices.index(label) for label in labels]
+	rows = np.flatnonzero(np.asarray(store.present[slice_indices]).all(axis = 0))
+	pair_years = labels[1:]
+	metrics = ['distance', 'normalized_distance'] if frequencies else ['distance']
+	heaps = dict((metric, [[] for year in pair_years]) for metric in metrics)
+	for start in range(0, len(rows), chunk_size):
+		chunk = rows[start:start + chunk_size]
+		words = [store.vocab[row] for row in chunk]
+		scores = {'distance': 1.0 - self_similarity_rows(store, chunk, labels)}
+		if frequencies:
+			scores['normalized_distance'] = normalized_distance(1.0 - scores['distance'], frequencies.frequency_matrix(words, pair_years))
+		for metric in metrics:
+			for idx in range(len(pair_years)):
+				push_top(heaps[metric][idx], scores[metric][:, idx], words, top_n)
+		print '\tScored {0} of {1} words'.format(min(start + chunk_size, len(rows)), len(rows))
+	return pair_years, heaps
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('-o', '--output', metavar = 'RANKING.tsv', type = str, default = 'working/shift_ranking.tsv', help = "Specify the file to write the ranking to, default is working/shift_ranking.tsv")
+	parser.add_argument('-n', '--top-n', metavar = 'N', type = int, default = 100, help = "Number of most shifted words to keep per year pair, default is 100")
+	parser.add_argument('-cs', '--chunk-size', metavar = 'SIZE', type = int, default = 20000, help = "Number of words to score at a time, default is 20000")
+	parser.add_argument('-d', '--corpus-dir', metavar = 'DIR', type = str, default = 'working', help = "Specify the directory containing the frequency indexes, default is working")
+	parser.add_argument('-in', '--initialize', action = 'store_true', help = "Initialize embedding using first slice")
+	args = parser.parse_args()
+
+	with codecs.open(args.output, 'w', encoding = 'utf-8') as of:
+		of.write('paper\tmetric\tyears\trank\tword\tscore\n')
+		for paper in ['volkskrant', 'trouw']:
+			print 'Ranking words in {0}'.format(paper)
+			time_0 = time.time()
+			store = open_store(paper, '_reverse')
+			frequencies = None
+			if os.path.exists(os.path.join(index_path(args.corpus_dir, paper), 'meta.json')):
+				frequencies = open_frequency_index(args.corpus_dir, paper)
+			else:
+				print '\tNo frequency index found, only ranking by self-distance'
+			pair_years, heaps = rank_shifts(store, frequencies, args.top_n, args.chunk_size, args.initialize)
+			for metric in sorted(heaps):
+				for idx, year in enumerate(pair_years):
+					for rank, (score, word) in enumerate(sorted(heaps[metric][idx], reverse = True)):
+						of.write(u'{0}\t{1}\t{2}_{3}\t{4}\t{5}\t{6:.5f}\n'.format(paper, metric, year + 1, year, rank + 1, word, score))
+			print 'Done! took {0:.2f} seconds'.format(time.time() - time_0)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import numpy as np
+import argparse, json, re
+
+'''
+Columnar storage of the query results (output of query_words_in_embeddings.py): words x paper x year arrays of
+self-similarity, count and frequency in a single .npz file, with the word, paper and year axes stored alongside.
+The similarity for year Y is the self-similarity between slices Y+1 and Y. Words not found in a newspaper's
+embeddings have NaN values. Results of bootstrap replicates (query_words_in_embeddings.py --bootstrap) add arrays of
+the same shape, named bootstrap_*. Also reads the old flat-keyed results JSON, and converts it from the command line.
+'''
+
+def write_results(fn, words, papers, years, similarity, count, frequency, found, bootstrap = None):
+	'''Writes words x papers x years arrays of similarity, count and frequency, plus the words x papers found mask,
+	and optionally a dict of words x papers x years bootstrap arrays (e.g. {'mean': ..., 'low': ..., 'high': ...})'''
+
+	words = [word.decode('utf-8') if isinstance(word, str) else word for word in words]
+	np.savez(fn, words = np.array(words, dtype = np.unicode_), papers = np.array(papers, dtype = np.unicode_), years = np.array(years, dtype = np.int64),
+		similarity = np.asarray(similarity, dtype = np.float64), count = np.asarray(count, dtype = np.float64),
+		frequency = np.asarray(frequency, dtype = np.float64), found = np.asarray(found, dtype = bool),
+		**dict(('bootstrap_' + name, np.asarray(array, dtype = np.float64)) for name, array in (bootstrap or {}).items()))
+
+class Results(object):
+	'''Query results of a word list, as arrays indexed by word, paper and year (in ascending order)'''
+
+	def __init__(self, words, papers, years, similarity, count, frequency, found, bootstrap = None):
+		self.words = list(words)
+		self.papers = list(papers)
+		self.years = [int(year) for year in years]
+		self.similarity = similarity
+		self.count = count
+		self.frequency = frequency
+		self.found = found
+		self.bootstrap = bootstrap or {}
+		self.index = dict((word, idx) for idx, word in enumerate(self.words))
+
+	def select(self, mask):
+		'''Returns the results of the words selected by a boolean mask or array of indices'''
+
+		mask = np.asarray(mask)
+		if mask.dtype == bool:
+			mask = np.flatnonzero(mask)
+		return Results([self.words[idx] for idx in mask], self.papers, self.years, self.similarity[mask], self.count[mask], self.frequency[mask], self.found[mask],
+			dict((name, array[mask]) for name, array in self.bootstrap.items()))
+
+	def complete(self):
+		'''Returns the results of the words found in the embeddings of all newspapers'''
+
+		return self.select(self.found.all(axis = 1))
+
+	def word(self, word):
+		'''Returns the row of a word, raises KeyError if the word is not in the results'''
+
+		if isinstance(word, str):
+			word = word.decode('utf-8')
+		return self.index[word]
+
+def results_from_json(results):
+	'''Converts the old flat-keyed results ({'word': {'similarity_trouw_1998_1997': ..., 'count_trouw_1997': ...}}) to columns'''
+
+	words = sorted(results)
+	papers = set()
+	years = set()
+	for word in words:
+		for key in results[word]:
+			match = re.match(r'(similarity|count|frequency)_(\w+?)_(\d+)(?:_(\d+))?$', key)
+			if match:
+				papers.add(match.group(2))
+				years.add(int(match.group(4) or match.group(3)))
+	papers = sorted(papers)
+	years = sorted(years)
+	shape = (len(words), len(papers), len(years))
+	arrays = {}
+	for cat in ['similarity', 'count', 'frequency']:
+		arrays[cat] = np.empty(shape)
+		arrays[cat].fill(np.nan)
+	for word_idx, word in enumerate(words):
+		for paper_idx, paper in enumerate(papers):
+			for year_idx, year in enumerate(years):
+				keys = {'similarity': 'similarity_{0}_{1}_{2}'.format(paper, year + 1, year), 'count': 'count_{0}_{1}'.format(paper, year), 'frequency': 'frequency_{0}_{1}'.format(paper, year)}
+				for cat, key in keys.items():
+					if key in results[word]:
+						arrays[cat][word_idx, paper_idx, year_idx] = results[word][key]
+	found = ~np.isnan(arrays['similarity']).all(axis = 2)
+	return Results(words, papers, years, arrays['similarity'], arrays['count'], arrays['frequency'], found)
+
+def load_results(fn):
+	'''Loads results from a columnar .npz file, or from an old flat-keyed results JSON file'''
+
+	if fn.endswith('.json'):
+		with open(fn, 'r') as f:
+			return results_from_json(json.load(f))
+	data = np.load(fn)
+	bootstrap = dict((key[len('bootstrap_'):], data[key]) for key in data.files if key.startswith('bootstrap_'))
+	return Results(data['words'], data['papers'], data['years'], data['similarity'], data['count'], data['frequency'], data['found'], bootstrap)
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('results', metavar = 'RESULTS.json', type = str, help = "Specify the results file (in json-format) to convert to the columnar format")
+	args = parser.parse_args()
+
+	results = load_results(args.results)
+	out_fn = re.sub(r'\.json$', '', args.results) + '.npz'
+	write_results(out_fn, results.words, results.papers, results.years, results.similarity, results.count, results.frequency, results.found)
+	print 'Wrote {0} words x {1} papers x {2} years to {3}'.format(len(results.words), len(results.papers), len(results.years), out_fn)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import argparse, json, multiprocessing, os, re, subprocess, sys, threading, time
+from multiprocessing.pool import ThreadPool
+from instrumentation import add_arguments, configure_from_args
+import artifact_cache
+
+'''
+Script for training several diachronic embedding chains (newspaper x direction) at the same time. Every chain
+runs train_diachronic_embeddings.py in its own process, so the year slices within a chain stay sequential,
+while the available cores are split between the chains. With --independent, every year slice of every newspaper
+is a job of its own (to be aligned afterwards with align_embeddings.py). Finished slices are recorded in a manifest.
+'''
+
+finished_pattern = re.compile('Training on year (\d+) took')
+
+class Manifest(object):
+	'''Thread-safe record of the finished slices per chain, rewritten to disk on every update. Chains recorded by
+	earlier runs are loaded from an existing manifest and kept'''
+
+	def __init__(self, fn):
+		self.fn = fn
+		self.lock = threading.Lock()
+		self.chains = {}
+		if os.path.exists(fn):
+			with open(fn, 'r') as f:
+				self.chains = json.load(f)
+
+	def update(self, chain, **fields):
+		with self.lock:
+			self.chains.setdefault(chain, {'finished': []}).update(fields)
+			self.write()
+
+	def add_slice(self, chain, year):
+		with self.lock:
+			if year not in self.chains[chain]['finished']:
+				self.chains[chain]['finished'].append(year)
+			self.write()
+
+	def write(self):
+		with open(self.fn, 'w') as of:
+			json.dump(self.chains, of, indent = 1, sort_keys = True)
+
+def chain_name(paper, reverse, initialize = False):
+	'''Returns the name of a chain, matching the output filename suffix, with _initialize for chains that are
+	initialized on their first slice'''
+
+	return '{0}{1}{2}'.format(paper, '_reverse' if reverse else '', '_initialize' if initialize else '')
+
+def run_chain(chain):
+	'''Runs a single training chain as a subprocess, records each finished slice in the manifest'''
+
+	name, call = chain
+	fields = dict(status = 'running', command = ' '.join(call), started = time.time())
+	# A chain that is not resumed trains all of its slices again
+	if '--resume' not in call:
+		fields['finished'] = []
+	manifest.update(name, **fields)
+	with open('working/train_{0}.log'.format(name), 'w') as logfile:
+		proc = subprocess.Popen(call, stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+		for line in iter(proc.stdout.readline, ''):
+			logfile.write(line)
+			logfile.flush()
+			match = finished_pattern.match(line)
+			if match:
+				manifest.add_slice(name, int(match.group(1)))
+		returncode = proc.wait()
+	manifest.update(name, status = 'done' if returncode == 0 else 'failed', returncode = returncode, ended = time.time())
+	return name, returncode
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('-p', '--papers', metavar = 'trouw|volkskrant', type = str, nargs = '+', default = ['trouw', 'volkskrant'], help = "Specify which newspapers to train on, default is both")
+	parser.add_argument('-d', '--directions', metavar = 'forward|reverse', type = str, nargs = '+', default = ['forward', 'reverse'], help = "Specify which directions to train in, default is both")
+	parser.add_argument('-t', '--max-threads', metavar = 'NUM_THREADS', type = int, default = multiprocessing.cpu_count(), help = "Total number of threads to split between the chains, default is the number of cores")
+	parser.add_argument('-va', '--vocab-all', action = 'store_true', help = "Use the whole corpus (all years) to generate the vocabulary")
+	parser.add_argument('-in', '--initialize', action = 'store_true', help = "Initialize embedding using first slice")
+	parser.add_argument('-is', '--intersect', action ='store_true', help = "Use intersect on saved embeddings of previous slice")
+	parser.add_argument('-re', '--resume', action = 'store_true', help = "Resume every chain from the checkpoint of its last finished year slice")
+	parser.add_argument('-sh', '--shards', action = 'store_true', help = "Read the year slices from binary sentence shards (see shard_corpus.py)")
+	parser.add_argument('-id', '--independent', action = 'store_true', help = "Train every year slice independently, as separate jobs, instead of in chains")
+	parser.add_argument('-j', '--jobs', metavar = 'NUM_JOBS', type = int, help = "Number of chains or slices to train at the same time, default is all chains, or one slice per 4 threads with --independent")
+	parser.add_argument('-m', '--manifest', metavar = 'MANIFEST.json', type = str, default = 'working/training_manifest.json', help = "Specify where to write the manifest of finished slices")
+	add_arguments(parser)
+	artifact_cache.add_arguments(parser)
+	args = parser.parse_args()
+	configure_from_args(args) # Inherited by the training processes
+	for paper in args.papers:
+		if paper not in ['volkskrant', 'trouw']:
+			print '{0} is not an available newspaper!'.format(paper)
+			raise SystemExit
+	for direction in args.directions:
+		if direction not in ['forward', 'reverse']:
+			print '{0} is not an available direction!'.format(direction)
+			raise SystemExit
+
+	# Generate chains (or independent slices) to train
+	chains = []
+	for paper in args.papers:
+		if args.independent:
+			for year in range(1994,2017):
+				call = [sys.executable, '-u', 'train_diachronic_embeddings.py', paper, '--independent', '--years', str(year)]
+				chains.append(('{0}_{1}_independent'.format(paper, year), call))
+			continue
+		for direction in args.directions:
+			call = [sys.executable, '-u', 'train_diachronic_embeddings.py', paper]
+			if direction == 'reverse':
+				call.append('--reverse')
+			for flag in ['initialize', 'intersect', 'resume']:
+				if getattr(args, flag):
+					call.append('--' + flag.replace('_', '-'))
+			chains.append((chain_name(paper, direction == 'reverse', args.initialize), call))
+
+	# Split cores between chains
+	if args.jobs:
+		num_jobs = args.jobs
+	elif args.independent:
+		num_jobs = max(1, args.max_threads // 4)
+	else:
+		num_jobs = len(chains)
+	num_jobs = min(num_jobs, len(chains))
+	threads_per_chain = max(1, args.max_threads // num_jobs)
+	for name, call in chains:
+		call += ['--max-threads', str(threads_per_chain)]
+		for flag in ['vocab_all', 'shards', 'cache']:
+			if getattr(args, flag):
+				call.append('--' + flag.replace('_', '-'))
+		call += ['--cache-dir', args.cache_dir, '--cache-size', str(args.cache_size)]
+
+	start_time = time.time()
+	manifest = Manifest(args.manifest)
+	print 'Training {0} chains, {1} at a time with {2} threads each'.format(len(chains), num_jobs, threads_per_chain)
+	pool = ThreadPool(num_jobs)
+	for name, returncode in pool.imap_unordered(run_chain, chains):
+		print 'Chain {0} finished with exit code {1} after {2:.2f} seconds'.format(name, returncode, time.time() - start_time)
+	pool.close()
+	pool.join()
+	print 'Done! Total time elapsed: {0} seconds'.format(time.time() - start_time)
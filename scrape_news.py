@@ -3,118 +3,81 @@
 
 '''Scrape Dutch news sites to make a large diachronic corpus'''
 
-import re, requests, time, json, os, argparse
-from bs4 import BeautifulSoup
+import re, time, json, os, argparse, multiprocessing
+from itertools import izip
+from fetcher import Fetcher
+from article_store import ArticleStore
+import extractors
+from instrumentation import add_arguments, configure_from_args, stage
+
+# Cookie needed for scraping, fetcher used for all requests, and HTML extraction backend (replaced from the command line arguments)
+cookiewall_cookie = {'nl_cookiewall_version': '1'}
+fetcher = Fetcher()
+extractor_backend = extractors.default_backend
 
 def get_dates_from_archive(newspaper, archive_url, year):
 	'''Scrapes archive overview page for a given year for a given newspaper, returns all dates for which archive is available'''
 
 	dates = []
 	year_url = archive_url + year
-	year_page = requests.get(year_url, cookies = cookiewall_cookie)
-	year_soup = BeautifulSoup(year_page.content, 'html.parser')
-	for link in year_soup.find_all('a'):
-		try:
-			date = ''
-			if newspaper == 'trouw':
-				if re.search('archiveDay=', link['href']):
-					date = link['href'][-8:]
-					dates.append(date)
-			if newspaper == 'volkskrant':
-				if re.search('archief/detail/', link['href']):
-					date = link['href'][-9:-1]
-					dates.append(date)
-		except KeyError: # When link has no 'href', just skip
-			pass
+	year_page = fetcher.get(year_url, cookies = cookiewall_cookie)
+	if year_page is None:
+		return dates
+	for href in extractors.extract_links(year_page.content, extractor_backend):
+		if newspaper == 'trouw':
+			if re.search('archiveDay=', href):
+				dates.append(href[-8:])
+		if newspaper == 'volkskrant':
+			if re.search('archief/detail/', href):
+				dates.append(href[-9:-1])
 	return dates
 
 def get_articles_for_date_trouw(base_date_url, date):
 	'''Scrapes archive page for a certain date for Trouw, returns urls for all articles of that date'''
 
-	article_urls = []
-	date_page = requests.get(base_date_url + date, cookies = cookiewall_cookie)
-	date_soup = BeautifulSoup(date_page.content, 'html.parser')
-	for link in date_soup.find_all('a'):
-		try:
-			if link.parent.parent.parent.name == 'div' and link.parent.parent.parent['class'][0] == 'articleOverview':
-				if link.parent.parent.name == 'dl':
-					if link.parent.name == 'dd':
-						article_url= link['href']
-						if re.match('http://www.trouw.nl/tr/nl/.*/archief/article/detail/', article_url):
-							article_urls.append(article_url)
-		except AttributeError:
-			pass
-	return article_urls
+	date_page = fetcher.get(base_date_url + date, cookies = cookiewall_cookie)
+	if date_page is None:
+		return []
+	return extractors.extract_articles_trouw(date_page.content, extractor_backend)
 
 def get_articles_for_date_volkskrant(base_date_url, date):
 	'''Scrapes archive page for a certain date for Volkskrant, returns urls for all articles of that date'''
 
 	article_urls = []
-	date_page = requests.get(base_date_url + date)
-	date_soup = BeautifulSoup(date_page.content, 'html.parser')
-	next_page = True
-	next_page_url = ''
-	while next_page:
-		next_page = False
-		for link in date_soup.find_all("a"):
-			if link.parent.name == 'article':
-				article_urls.append(link['href'])
-		if date_soup.find_all("a", class_="pager--next"): # If there is a next page, get it and parse it
-			next_page = True
-			next_page_url = date_soup.find_all("a", class_="pager--next")[0]['href']
-			date_page = requests.get(next_page_url)
-			date_soup = BeautifulSoup(date_page.content, 'html.parser')
+	next_page_url = base_date_url + date
+	while next_page_url: # If there is a next page, get it and parse it
+		date_page = fetcher.get(next_page_url)
+		if date_page is None:
+			break
+		page_urls, next_page_url = extractors.extract_articles_volkskrant(date_page.content, extractor_backend)
+		article_urls += page_urls
 	return article_urls
 
 def get_text_from_article(newspaper, article_url):
 	'''Scrapes article page of a given newspaper to get all the content text, returns text'''
 
-	article_text = ''
-	try:
-		article_page = requests.get(article_url, cookies = cookiewall_cookie)
-	except requests.exceptions.TooManyRedirects: # Sometimes the article page just redirects, then skip it
-		return ''
-	except requests.exceptions.ConnectionError: # Instable connection? Wait for a bit, then skip its
-		time.sleep(5)
-		return ''
-	article_soup = BeautifulSoup(article_page.content, 'html.parser')
-	# Newspaper-specific things
-	headers = []
-	if newspaper == 'trouw':
-		headers = article_soup.find_all('h1', id='articleDetailTitle')
-	if newspaper == 'volkskrant':
-		headers = article_soup.find_all('h1', class_='article__title')
-	# Scrape header text 
-	for header in headers:
-		article_text += header.text.strip() + '\n'
-	# Scrape text body
-	for paragraph in article_soup.find_all('p'):
-		try:
-			if paragraph.parent.name == 'div':
-				is_correct_parent = False
-				# Newspaper-specific things
-				if newspaper == 'trouw':
-					is_correct_parent = re.match('art_box', paragraph.parent['id'])
-				if newspaper == 'volkskrant':
-					is_correct_parent = re.match('article__intro', paragraph.parent['class'][0]) or re.match('article__body', paragraph.parent['class'][0])			
-				if is_correct_parent:
-					if paragraph.text:
-						text = re.sub('\n+', '\n', paragraph.text) # Remove extra newlines or spaces
-						text = re.sub(' +', ' ', text)
-						article_text += text.strip() + '\n'
-		except KeyError:
-			pass
-	return article_text
+	http_status, content = fetch_article(article_url)
+	return extractors.extract_fetched_article((newspaper, extractor_backend, http_status, content))[1]
+
+def fetch_article(article_url):
+	'''Fetches an article page, returns HTTP status (None if fetching failed) and page content'''
 
-def scrape_newspaper(newspaper, years):
+	article_page = fetcher.get(article_url, cookies = cookiewall_cookie)
+	if article_page is None: # Redirect loop, or still failing after retries, then skip it
+		return None, ''
+	return article_page.status_code, article_page.content
+
+def scrape_newspaper(newspaper, years, base_year_url = None, base_date_url = None, parse_processes = None):
 	'''Scrape article texts from Trouw or Volkskrant archive, store per-year'''
 
+	# Start parsing processes before any fetching threads exist
+	parse_pool = multiprocessing.Pool(parse_processes)
 	if newspaper == 'trouw':
-		base_year_url = 'FILL THIS IN'
-		base_date_url = 'FILL THIS IN'
+		base_year_url = base_year_url or 'FILL THIS IN'
+		base_date_url = base_date_url or 'FILL THIS IN'
 	else:
-		base_year_url = 'FILL THIS IN'
-		base_date_url = 'FILL THIS IN'
+		base_year_url = base_year_url or 'FILL THIS IN'
+		base_date_url = base_date_url or 'FILL THIS IN'
 	# Cyle through years specified
 	year_range = [str(year) for year in years]
 	for year in year_range:
@@ -129,10 +92,12 @@ def scrape_newspaper(newspaper, years):
 				dates = json.load(f)
 		else:
 			logfile.write('Scraping dates for year {0}\n'.format(year))
-			if newspaper == 'trouw':
-				dates = get_dates_from_archive(newspaper, base_year_url, year)
-			if newspaper == 'volkskrant':
-				dates = get_dates_from_archive(newspaper, base_year_url, year)
+			with stage('scrape_dates', paper = newspaper, year = int(year), unit = 'dates') as dates_stage:
+				if newspaper == 'trouw':
+					dates = get_dates_from_archive(newspaper, base_year_url, year)
+				if newspaper == 'volkskrant':
+					dates = get_dates_from_archive(newspaper, base_year_url, year)
+				dates_stage.items = len(dates)
 			with open(fn, 'w') as of:
 				json.dump(dates, of)
 		time1 = time.time()
@@ -146,49 +111,79 @@ def scrape_newspaper(newspaper, years):
 		else:
 			logfile.write('Scraping article URLs for year {0}\n'.format(year))
 			article_urls = []
-			for date in dates:
-				if newspaper == 'trouw':
-					article_urls += get_articles_for_date_trouw(base_date_url, date)
-				if newspaper == 'volkskrant':
-					article_urls += get_articles_for_date_volkskrant(base_date_url, date)
+			if newspaper == 'trouw':
+				get_articles_for_date = get_articles_for_date_trouw
+			if newspaper == 'volkskrant':
+				get_articles_for_date = get_articles_for_date_volkskrant
+			with stage('scrape_article_urls', paper = newspaper, year = int(year), unit = 'dates', total = len(dates)) as urls_stage:
+				for date_urls in fetcher.map(lambda date: get_articles_for_date(base_date_url, date), dates):
+					article_urls += date_urls
+					urls_stage.add()
+					urls_stage.progress(urls_stage.items, every = 60)
 			with open(fn, 'w') as of:
 				json.dump(article_urls, of)
 		article_urls = list(set(article_urls)) # Remove duplicates
 		time2 = time.time()
 		logfile.write('Found {0} article URLs for year {1}, took {2} seconds\n'.format(len(article_urls), year, time2 - time1))
-		# Scrape text from article pages
+		# Scrape text from article pages, skipping those already in the article store
 		logfile.write('Scraping article text for year {0}\n'.format(year))
-		fn = 'working/{1}_{0}'.format(year, newspaper)
-		with open(fn, 'w') as of:
-			prev_time = time.time()
-			for idx, article_url in enumerate(article_urls):
+		store = ArticleStore('working/{1}_{0}.db'.format(year, newspaper))
+		done_urls = store.done_urls()
+		todo_urls = [article_url for article_url in article_urls if article_url not in done_urls]
+		logfile.write('Skipping {0} articles already scraped\n'.format(len(article_urls) - len(todo_urls)))
+		prev_time = time.time()
+		# Articles are fetched concurrently by threads, parsed by a process pool, and recorded as they come in
+		fetched_pages = fetcher.map(fetch_article, todo_urls)
+		parse_jobs = ((newspaper, extractor_backend, http_status, content) for http_status, content in fetched_pages)
+		fetched_articles = parse_pool.imap(extractors.extract_fetched_article, parse_jobs, chunksize = 16)
+		with stage('scrape_articles', paper = newspaper, year = int(year), unit = 'articles', total = len(todo_urls)) as articles_stage:
+			for idx, (article_url, (http_status, article_text)) in enumerate(izip(todo_urls, fetched_articles)):
 				if idx % 100 == 0 and idx > 1:
-					logfile.write('Scraping article {0} of {1}. Previous 100 took {2} seconds.\n'.format(idx, len(article_urls), time.time() - prev_time))
+					logfile.write('Scraping article {0} of {1}. Previous 100 took {2} seconds.\n'.format(idx, len(todo_urls), time.time() - prev_time))
 					prev_time = time.time()
-				if newspaper == 'trouw':
-					of.write(get_text_from_article(newspaper, article_url).encode('utf-8'))
-				if newspaper == 'volkskrant':
-					of.write(get_text_from_article(newspaper, article_url).encode('utf-8'))
+					articles_stage.progress(idx)
+				store.add(article_url, http_status, article_text)
+				articles_stage.add()
+			store.commit()
+		# Export flat text file for the year
+		fn = 'working/{1}_{0}'.format(year, newspaper)
+		with stage('export_articles', paper = newspaper, year = int(year), unit = 'articles') as export_stage:
+			num_articles = export_stage.items = store.export(fn, article_urls)
+		store.close()
+		logfile.write('Wrote {0} of {1} articles to {2}\n'.format(num_articles, len(article_urls), fn))
 		time3 = time.time()
 		logfile.write('Done! Took {0} seconds\n'.format(time3 - time2))
 	logfile.close()
+	parse_pool.close()
+	parse_pool.join()
 		
 if __name__ == '__main__':
 	# Parse arguments
 	parser = argparse.ArgumentParser(description = 'Arguments for newspaper scraping')
 	parser.add_argument('newspaper', metavar = 'trouw|volkskrant', type = str, help = 'Specify whether to scrape Trouw or Volkskrant')
 	parser.add_argument('-y', '--year', metavar = 'YEAR', type = str, help = "Specify which year of Trouw (1994-2016) or Volkskrant (1994-2016) to scrape. If this argument is not given, all years will be scraped")
+	parser.add_argument('-c', '--concurrency', metavar = 'NUM', type = int, default = 8, help = "Maximum number of pages to fetch at the same time, default is 8")
+	parser.add_argument('-rl', '--rate-limit', metavar = 'RATE', type = float, default = 5.0, help = "Maximum number of requests per second per host, default is 5")
+	parser.add_argument('-rt', '--retries', metavar = 'NUM', type = int, default = 3, help = "Number of times to retry a failed request (with exponential backoff), default is 3")
+	parser.add_argument('-yu', '--base-year-url', metavar = 'URL', type = str, help = "Override the archive URL of the year overview pages, e.g. to scrape a local copy")
+	parser.add_argument('-du', '--base-date-url', metavar = 'URL', type = str, help = "Override the archive URL of the date pages, e.g. to scrape a local copy")
+	parser.add_argument('-pa', '--parser', metavar = 'lxml|soup', type = str, default = extractors.default_backend, help = "HTML extraction backend, default is lxml if it is installed, else soup (BeautifulSoup)")
+	parser.add_argument('-pp', '--parse-processes', metavar = 'NUM', type = int, help = "Number of processes for parsing article pages, default is the number of cores")
+	add_arguments(parser)
 	args = parser.parse_args()
+	configure_from_args(args)
+	fetcher = Fetcher(args.concurrency, args.rate_limit, args.retries)
+	if args.parser == 'lxml' and not extractors.lxml:
+		raise SystemExit('Quitting: lxml is not installed, use --parser soup')
+	extractor_backend = args.parser
 	# Get years to scrape
 	if args.year:
 		years = [args.year]
 	else:
 		years = range(1994,2017)
-	# Define cookie needed for scraping
-	cookiewall_cookie = {'nl_cookiewall_version': '1'}
 	if args.newspaper.lower() == 'trouw':
-		scrape_newspaper('trouw', years)
+		scrape_newspaper('trouw', years, args.base_year_url, args.base_date_url, args.parse_processes)
 	elif args.newspaper.lower() == 'volkskrant' or args.newspaper.lower() == 'vk':
-		scrape_newspaper('volkskrant', years)
+		scrape_newspaper('volkskrant', years, args.base_year_url, args.base_date_url, args.parse_processes)
 	else:
 		print '{0} is not a valid option for scraping'.format(args.newspaper)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import numpy as np
+
+'''
+Vectorized year-to-year self-similarity for whole word lists. Gathers the store rows of all words once per
+slice and computes the cosine similarity of every consecutive slice pair as one row-wise dot product. The
+slices can also come from elsewhere, e.g. loaded one at a time through the slice cache (see slice_cache.py).
+Also summarizes self-similarity over bootstrap replicates (see bootstrap_embeddings.py) as mean and interval.
+'''
+
+def word_rows(store, words):
+	'''Maps words to store rows, returns array of rows (-1 for words not in the store vocabulary)'''
+
+	return np.array([store.index.get(word, -1) for word in words], dtype = np.int64)
+
+def normalize(vectors, dtype = np.float64):
+	'''Normalizes rows to unit length (as float64, or the given type), leaves all-zero rows at zero'''
+
+	vectors = np.asarray(vectors, dtype = dtype)
+	norms = np.sqrt((vectors * vectors).sum(axis = 1))
+	norms[norms == 0] = 1.0
+	return vectors / norms[:, np.newaxis]
+
+def self_similarity_slices(slices, num_words, num_slices):
+	'''Computes self-similarity between consecutive slices for a list of words, from an iterable over the slices in
+	chain order yielding (present, vectors): a boolean array marking the words in the slice (None if all are), and
+	their vectors, one row per word. Only two slices are needed at a time, so the iterable can load them lazily.
+	Returns a boolean array marking words found in all slices, and a words x pairs matrix of similarities
+	(NaN for words not found)'''
+
+	found = np.ones(num_words, dtype = bool)
+	similarities = np.empty((num_words, num_slices - 1))
+	prev_vectors = None
+	for idx, (present, vectors) in enumerate(slices):
+		if present is not None:
+			found &= present
+		vectors = normalize(vectors)
+		if prev_vectors is not None:
+			similarities[:, idx - 1] = (vectors * prev_vectors).sum(axis = 1)
+		prev_vectors = vectors
+	similarities[~found] = np.nan
+	return found, similarities
+
+def self_similarity_rows(store, rows, labels):
+	'''Computes self-similarity between consecutive slices (given by labels, in chain order) for store rows,
+	which must be present in all those slices. Returns a rows x pairs matrix of similarities'''
+
+	# Keep rows sorted for sequential reads from the memory-mapped store
+	order = np.argsort(rows)
+	sorted_rows = rows[order]
+	slices = ((None, store.vectors[store.slices.index(label)][sorted_rows]) for label in labels)
+	similarities = np.empty((len(rows), len(labels) - 1))
+	similarities[order] = self_similarity_slices(slices, len(rows), len(labels))[1]
+	return similarities
+
+def self_similarity_matrix(store, words, initialize = False):
+	'''Computes self-similarity between consecutive slices (in chain order) for a list of words.
+	Returns a boolean array marking words found in all slices, the year labels of the slice pairs,
+	and a words x pairs matrix of similarities (NaN for words not found)'''
+
+	labels = store.slice_labels(initialize)
+	rows = word_rows(store, words)
+	found = rows >= 0
+	slice_indices = [store.slices.index(label) for label in labels]
+	found[found] = np.asarray(store.present[slice_indices][:, rows[found]]).all(axis = 0)
+	similarities = np.empty((len(words), len(labels) - 1))
+	similarities.fill(np.nan)
+	similarities[found] = self_similarity_rows(store, rows[found], labels)
+	return found, labels[1:], similarities
+
+def average_similarity(store, words, initialize = False):
+	'''Computes the average self-similarity between consecutive slices over the words found in all slices.
+	Returns a boolean array marking the words found, the year labels of the slice pairs, and the averages per pair'''
+
+	found, pair_years, similarities = self_similarity_matrix(store, words, initialize)
+	return found, pair_years, similarities[found].mean(axis = 0)
+
+def bootstrap_similarity(stores, words, confidence = 0.95, initialize = False):
+	'''Computes self-similarity for a list of words in the stores of bootstrap replicates of the same chain.
+	Returns a boolean array marking words found in all replicates, the year labels of the slice pairs, and a dict
+	of words x pairs arrays over the replicates: mean, standard deviation, and the percentile confidence interval'''
+
+	replicates = []
+	pair_years = None
+	for store in stores:
+		found, labels, similarities = self_similarity_matrix(store, words, initialize)
+		if pair_years is not None and labels != pair_years:
+			raise ValueError('Bootstrap replicates have different slices: {0} and {1}'.format(pair_years, labels))
+		pair_years = labels
+		replicates.append(similarities)
+	replicates = np.array(replicates)
+	found = ~np.isnan(replicates).any(axis = 2).any(axis = 0)
+	stats = {}
+	for name in ['mean', 'std', 'low', 'high']:
+		stats[name] = np.empty(replicates.shape[1:])
+		stats[name].fill(np.nan)
+	values = replicates[:, found]
+	stats['mean'][found] = values.mean(axis = 0)
+	stats['std'][found] = values.std(axis = 0, ddof = 1) if len(stores) > 1 else 0.0
+	tail = 50.0 * (1.0 - confidence)
+	stats['low'][found], stats['high'][found] = np.percentile(values, [tail, 100.0 - tail], axis = 0)
+	return found, pair_years, stats
+
+def normalized_distance(similarities, frequencies):
+	'''Divides self-distance by the log-frequency of each year, relative to the word's lowest log-frequency
+	(as in analyze_and_plot_words.py). Takes and returns words x years arrays, NaN where frequency is zero'''
+
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		log_frequencies = np.log10(frequencies) + 1
+		log_frequencies[~np.isfinite(log_frequencies)] = np.nan
+		norm_log_frequencies = log_frequencies / log_frequencies.min(axis = 1)[:, np.newaxis]
+		return (1.0 - similarities) / norm_log_frequencies
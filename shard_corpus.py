@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import numpy as np
+import codecs, argparse, time, os
+from array import array
+from frequency_index import open_frequency_index
+
+'''
+Script for converting the tokenized year slices of a newspaper into binary sentence shards: every token is
+mapped to its id in the frequency index vocabulary (see frequency_index.py) and stored as a uint32 array,
+with sentence offsets. ShardSentences streams the shards back to gensim, without decoding and splitting text
+in every training epoch. ResampledSentences resamples any sentence iterator, for bootstrap replicates of a slice.
+'''
+
+def shard_path(corpus_dir, paper, year):
+	'''Returns the filename of the sentence shard for a given newspaper and year slice'''
+
+	return os.path.join(corpus_dir, '{0}_{1}_shard.npz'.format(paper, year))
+
+def build_shard(corpus_dir, paper, year, vocab_index, compress = False, seed = None):
+	'''Converts a tokenized slice to a shard of token ids, optionally shuffling the sentence order'''
+
+	ids = array('I')
+	offsets = array('L', [0])
+	with codecs.open(os.path.join(corpus_dir, '{0}_{1}_tokenized'.format(paper, year)), 'r', encoding = 'utf-8') as f:
+		for line in f:
+			ids.extend([vocab_index[token] for token in line.split()])
+			offsets.append(len(ids))
+	ids = np.frombuffer(ids, dtype = np.uint32)
+	offsets = np.array(offsets, dtype = np.uint64)
+	if seed is not None:
+		# Preshuffle sentences once, so training sees them in a fixed random order
+		order = np.random.RandomState(seed).permutation(len(offsets) - 1)
+		lengths = (offsets[1:] - offsets[:-1])[order]
+		ids = np.concatenate([ids[offsets[idx]:offsets[idx + 1]] for idx in order]) if len(order) else ids
+		offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.uint64)
+	save = np.savez_compressed if compress else np.savez
+	save(shard_path(corpus_dir, paper, year), ids = ids, offsets = offsets)
+
+class ShardSentences(object):
+	'''Iterates over the sentences (lists of words) of one or more shards, like gensim's LineSentence'''
+
+	def __init__(self, paths, vocab, max_sentence_length = 10000):
+		self.paths = paths
+		self.vocab = np.array(vocab, dtype = object)
+		self.max_sentence_length = max_sentence_length
+
+	def __iter__(self):
+		for path in self.paths:
+			shard = np.load(path)
+			tokens = self.vocab[shard['ids']]
+			offsets = shard['offsets']
+			for idx in xrange(len(offsets) - 1):
+				start, end = int(offsets[idx]), int(offsets[idx + 1])
+				# Split long sentences like LineSentence does
+				while start < end:
+					yield tokens[start:min(end, start + self.max_sentence_length)].tolist()
+					start += self.max_sentence_length
+
+class ResampledSentences(object):
+	'''Poisson bootstrap of a sentence iterator: every sentence is repeated Poisson(rate) times. The same random seed
+	is used in every pass, so all training epochs see the same resample, without materializing it'''
+
+	def __init__(self, sentences, rate = 1.0, seed = None):
+		self.sentences = sentences
+		self.rate = rate
+		self.seed = seed
+
+	def __iter__(self):
+		rng = np.random.RandomState(self.seed)
+		for sentence in self.sentences:
+			for repeat in xrange(rng.poisson(self.rate)):
+				yield sentence
+
+def shard_sentences(corpus_dir, paper, years):
+	'''Returns a sentence iterator over the shards of the given years of a newspaper'''
+
+	with codecs.open(os.path.join(corpus_dir, '{0}_counts'.format(paper), 'vocab.txt'), 'r', encoding = 'utf-8') as f:
+		vocab = [line.rstrip('\n') for line in f]
+	return ShardSentences([shard_path(corpus_dir, paper, year) for year in years], vocab)
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('newspaper', metavar = 'trouw|volkskrant', type = str, help = "Specify which newspaper (Trouw or Volkskrant) to convert")
+	parser.add_argument('-d', '--corpus-dir', metavar = 'DIR', type = str, default = 'working', help = "Specify the directory containing the tokenized year slices, default is working")
+	parser.add_argument('-c', '--compress', action = 'store_true', help = "Compress the shards (slower to read, smaller on disk)")
+	parser.add_argument('-s', '--shuffle', metavar = 'SEED', type = int, help = "Preshuffle the sentences of each slice with the given random seed")
+	args = parser.parse_args()
+	paper = args.newspaper
+	if paper not in ['volkskrant', 'trouw']:
+		print 'Not an available newspaper!'
+		raise SystemExit
+
+	# The frequency index provides the shared vocabulary of all slices
+	vocab_index = open_frequency_index(args.corpus_dir, paper).index
+	for year in range(1994,2017):
+		print 'Converting {0}_{1}...'.format(paper, year)
+		time_0 = time.time()
+		build_shard(args.corpus_dir, paper, year, vocab_index, args.compress, args.shuffle)
+		print 'Done! took {0:.2f} seconds'.format(time.time() - time_0)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import numpy as np
+import os
+from collections import OrderedDict
+from embedding_store import EmbeddingStore, store_path, w2v_path
+from instrumentation import stage
+from self_similarity import self_similarity_slices
+try:
+	import gensim
+except ImportError:
+	gensim = None
+
+'''
+On-demand access to the year slices of the diachronic embeddings, with a bounded least-recently-used cache of
+slices keyed by (paper, slice, suffix). A slice is only loaded when a query needs it: as a memory-mapped slice of
+the packed store (see embedding_store.py) if there is one, else from its word2vec text file with gensim. Walking
+the year pairs keeps at most max_slices slices resident, so memory is bounded by the window instead of the
+number of years, and a lookup of a few words only touches the slices it needs. The cache only provides the rows
+of the slices, self-similarity is computed from them as for a store (see self_similarity.py).
+'''
+
+class LoadedSlice(object):
+	'''A single year slice: word index, vectors (one row per word) and the mask of rows present in the slice'''
+
+	def __init__(self, index, vectors, present = None):
+		self.index = index
+		self.vectors = vectors
+		self.present = present
+
+	def __contains__(self, word):
+		row = self.index.get(word)
+		return row is not None and (self.present is None or bool(self.present[row]))
+
+	def __getitem__(self, word):
+		if word not in self:
+			raise KeyError(word)
+		return np.asarray(self.vectors[self.index[word]], dtype = np.float32)
+
+	def rows(self, words):
+		'''Returns a boolean array marking the words present in the slice, and a words x dim array of their
+		vectors (zero for words not present)'''
+
+		rows = np.array([self.index.get(word, -1) for word in words], dtype = np.int64)
+		present = rows >= 0
+		if self.present is not None:
+			present[present] = np.asarray(self.present[rows[present]])
+		vectors = np.zeros((len(words), self.vectors.shape[1]), dtype = np.float32)
+		# Read rows in sorted order, sequentially from a memory-mapped store
+		order = np.argsort(rows[present])
+		sorted_rows = rows[present][order]
+		found_vectors = np.empty((len(sorted_rows), self.vectors.shape[1]), dtype = np.float32)
+		found_vectors[order] = self.vectors[sorted_rows]
+		vectors[present] = found_vectors
+		return present, vectors
+
+class SliceCache(object):
+	'''LRU cache of year slices of all newspapers, holding at most max_slices slices at a time'''
+
+	def __init__(self, max_slices = 2):
+		self.max_slices = max(1, max_slices)
+		self.slices = OrderedDict()
+		self.stores = {}
+		self.hits = 0
+		self.misses = 0
+
+	def store(self, paper, suffix):
+		'''Returns the packed store of a newspaper and suffix (opened once, memory-mapped), or None if not packed'''
+
+		if (paper, suffix) not in self.stores:
+			directory = store_path(paper, suffix)
+			self.stores[(paper, suffix)] = EmbeddingStore(directory) if os.path.exists(os.path.join(directory, 'meta.json')) else None
+		return self.stores[(paper, suffix)]
+
+	def slice_labels(self, paper, suffix = '', initialize = False):
+		'''Returns the slice labels of a newspaper in chain order, from its store or else the default chain of years'''
+
+		store = self.store(paper, suffix)
+		if store is not None:
+			return store.slice_labels(initialize)
+		years = range(1994,2017)
+		if suffix.startswith('_reverse') or suffix.startswith('_independent'):
+			years.reverse()
+		return (['initial'] if initialize else []) + years
+
+	def load(self, paper, label, suffix):
+		'''Loads a slice from the packed store, or from its word2vec text file'''
+
+		store = self.store(paper, suffix)
+		if store is not None:
+			slice_idx = store.slices.index(label)
+			return LoadedSlice(store.index, store.vectors[slice_idx], store.present[slice_idx])
+		fn = w2v_path(paper, label, suffix)
+		if gensim is None or not os.path.exists(fn):
+			raise SystemExit('Quitting: no embedding store in {0}, and {1}'.format(store_path(paper, suffix), 'gensim is not installed' if gensim is None else 'no file {0}'.format(fn)))
+		model = gensim.models.Word2Vec.load_word2vec_format(fn)
+		return LoadedSlice(dict((word, vocab.index) for word, vocab in model.vocab.iteritems()), model.syn0)
+
+	def slice(self, paper, label, suffix = ''):
+		'''Returns a slice, loading it (and evicting the least recently used slice if the cache is full) if needed'''
+
+		key = (paper, label, suffix)
+		if key in self.slices:
+			self.hits += 1
+			loaded = self.slices.pop(key)
+		else:
+			self.misses += 1
+			while len(self.slices) >= self.max_slices:
+				self.slices.popitem(last = False)
+			with stage('load_slice', paper = paper, year = label, suffix = suffix):
+				loaded = self.load(paper, label, suffix)
+		self.slices[key] = loaded
+		return loaded
+
+	def slice_rows(self, paper, words, labels, suffix = ''):
+		'''Yields the rows of a list of words in each of the given slices, loading the slices one at a time'''
+
+		for label in labels:
+			yield self.slice(paper, label, suffix).rows(words)
+
+	def self_similarity_matrix(self, paper, words, suffix = '', initialize = False):
+		'''Computes self-similarity between consecutive slices (in chain order) for a list of words, walking the
+		slice pairs through the cache. Returns a boolean array marking words found in all slices, the year labels
+		of the slice pairs, and a words x pairs matrix of similarities (NaN for words not found)'''
+
+		labels = self.slice_labels(paper, suffix, initialize)
+		found, similarities = self_similarity_slices(self.slice_rows(paper, words, labels, suffix), len(words), len(labels))
+		return found, labels[1:], similarities
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import argparse, itertools, json, multiprocessing, os, sys, time
+from multiprocessing.pool import ThreadPool
+import schedule_training
+from schedule_training import Manifest, chain_name, run_chain
+from embedding_store import pack_embeddings, open_store
+from frequency_index import build_frequency_index, index_path
+from self_similarity import average_similarity
+from instrumentation import add_arguments, configure_from_args
+import artifact_cache
+
+'''
+Script for a hyperparameter sweep: trains the reverse embedding chain of each newspaper for every configuration in
+a grid of Word2Vec hyperparameters, and scores every configuration by the average self-similarity of a word list
+(as in get_average_similarity.py). The vocabulary slices are counted once, in the frequency index, and every
+configuration builds its vocabulary from those counts instead of scanning the text again. Configuration chains
+run as parallel processes (as in schedule_training.py), splitting the available cores.
+'''
+
+# Hyperparameters that can be swept, as (argument name, trainer flag)
+grid_params = [('sg', '--sg'), ('hs', '--hs'), ('alpha', '--alpha'), ('size', '--size'), ('window', '--window'), ('min_count', '--min-count'), ('iter', '--iter')]
+
+def config_tag(config, vocab_all = False):
+	'''Returns the output filename tag of a configuration, e.g. _sg1_hs1_alpha0.01_size200_window5_mincount30_iter20,
+	with _vocaball appended for chains with a vocabulary from all years'''
+
+	return ''.join('_{0}{1}'.format(name.replace('_', ''), config[name]) for name, flag in grid_params) + ('_vocaball' if vocab_all else '')
+
+def config_grid(args):
+	'''Returns all configurations (dicts of hyperparameters) in the grid given by the arguments'''
+
+	names = [name for name, flag in grid_params]
+	return [dict(zip(names, values)) for values in itertools.product(*[getattr(args, name) for name in names])]
+
+def score_config(paper, tag, words):
+	'''Scores the trained chain of a configuration by the average self-similarity of the words (over all year pairs)'''
+
+	store = open_store(paper, '_reverse' + tag)
+	found, pair_years, averages = average_similarity(store, words)
+	return {'score': float(averages.mean()), 'found': int(found.sum()),
+		'avg_similarity': dict(('{0}_{1}'.format(year + 1, year), float(average)) for year, average in zip(pair_years, averages))}
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('-p', '--papers', metavar = 'trouw|volkskrant', type = str, nargs = '+', default = ['trouw', 'volkskrant'], help = "Specify which newspapers to train on, default is both")
+	parser.add_argument('-sg', '--sg', metavar = '0|1', type = int, nargs = '+', default = [1], help = "Training algorithms to try: 1 for skip-gram, 0 for CBOW, default is 1")
+	parser.add_argument('-hs', '--hs', metavar = '0|1', type = int, nargs = '+', default = [1], help = "Hierarchical softmax (1) or negative sampling (0) to try, default is 1")
+	parser.add_argument('-lr', '--alpha', metavar = 'RATE', type = float, nargs = '+', default = [0.01], help = "Initial learning rates to try, default is 0.01")
+	parser.add_argument('-sz', '--size', metavar = 'DIM', type = int, nargs = '+', default = [200], help = "Embedding dimensions to try, default is 200")
+	parser.add_argument('-w', '--window', metavar = 'SIZE', type = int, nargs = '+', default = [5], help = "Context window sizes to try, default is 5")
+	parser.add_argument('-mc', '--min-count', metavar = 'COUNT', type = int, nargs = '+', default = [30], help = "Minimum counts to try, default is 30")
+	parser.add_argument('-it', '--iter', metavar = 'NUM', type = int, nargs = '+', default = [20], help = "Numbers of epochs per slice to try, default is 20")
+	parser.add_argument('-va', '--vocab-all', action = 'store_true', help = "Use the whole corpus (all years) to generate the vocabulary")
+	parser.add_argument('-wl', '--word-list', metavar = 'LIST', type = str, default = 'most_frequent_words_5000.txt', help = "Specify the list of words (one-per-line) to score configurations with, default is most_frequent_words_5000.txt")
+	parser.add_argument('-t', '--max-threads', metavar = 'NUM_THREADS', type = int, default = multiprocessing.cpu_count(), help = "Total number of threads to split between the chains, default is the number of cores")
+	parser.add_argument('-j', '--jobs', metavar = 'NUM_JOBS', type = int, help = "Number of chains to train at the same time, default is one per 4 threads")
+	parser.add_argument('-o', '--output', metavar = 'RESULTS.json', type = str, default = 'working/sweep_results.json', help = "Specify where to write the scores of all configurations")
+	parser.add_argument('-m', '--manifest', metavar = 'MANIFEST.json', type = str, default = 'working/sweep_manifest.json', help = "Specify where to write the manifest of finished slices")
+	add_arguments(parser)
+	artifact_cache.add_arguments(parser)
+	args = parser.parse_args()
+	configure_from_args(args)
+	cache = artifact_cache.open_cache(args)
+	for paper in args.papers:
+		if paper not in ['volkskrant', 'trouw']:
+			print '{0} is not an available newspaper!'.format(paper)
+			raise SystemExit
+	start_time = time.time()
+
+	# Count all slices once, every configuration builds its vocabulary from these counts
+	for paper in args.papers:
+		if not os.path.exists(os.path.join(index_path('working', paper), 'meta.json')):
+			print 'Counting tokens in {0}...'.format(paper)
+			build_frequency_index('working', paper, range(1994,2017), cache)
+
+	# Generate a chain for every configuration and newspaper
+	configs = config_grid(args)
+	num_jobs = min(args.jobs or max(1, args.max_threads // 4), len(configs) * len(args.papers))
+	threads_per_chain = max(1, args.max_threads // num_jobs)
+	chains = []
+	for config in configs:
+		for paper in args.papers:
+			call = [sys.executable, '-u', 'train_diachronic_embeddings.py', paper, '--reverse', '--vocab-counts', '--tag', config_tag(config, args.vocab_all), '--max-threads', str(threads_per_chain)]
+			for name, flag in grid_params:
+				call += [flag, str(config[name])]
+			if args.vocab_all:
+				call.append('--vocab-all')
+			if args.cache:
+				call.append('--cache')
+			call += ['--cache-dir', args.cache_dir, '--cache-size', str(args.cache_size)]
+			chains.append((chain_name(paper, True) + config_tag(config, args.vocab_all), call))
+
+	# Train chains in parallel
+	schedule_training.manifest = Manifest(args.manifest)
+	print 'Training {0} configurations x {1} newspapers, {2} chains at a time with {3} threads each'.format(len(configs), len(args.papers), num_jobs, threads_per_chain)
+	pool = ThreadPool(num_jobs)
+	returncodes = {}
+	for name, returncode in pool.imap_unordered(run_chain, chains):
+		returncodes[name] = returncode
+		print 'Chain {0} finished with exit code {1} after {2:.2f} seconds'.format(name, returncode, time.time() - start_time)
+	pool.close()
+	pool.join()
+
+	# Score every configuration by the average self-similarity of the word list
+	words = [line.strip() for line in open(args.word_list, 'r') if line.strip()]
+	reverse_years = range(2016, 1993, -1)
+	results = []
+	for config in configs:
+		tag = config_tag(config, args.vocab_all)
+		result = {'tag': tag, 'config': config, 'papers': {}}
+		for paper in args.papers:
+			if returncodes[chain_name(paper, True) + tag] != 0:
+				print 'Training {0} failed, see working/train_{0}.log'.format(chain_name(paper, True) + tag)
+				continue
+			pack_embeddings(paper, reverse_years, '_reverse' + tag, cache = cache)
+			result['papers'][paper] = score_config(paper, tag, words)
+		if len(result['papers']) == len(args.papers):
+			result['score'] = sum(paper_result['score'] for paper_result in result['papers'].values()) / len(args.papers)
+		else:
+			result['score'] = None
+		results.append(result)
+	results.sort(key = lambda result: result['score'], reverse = True)
+	with open(args.output, 'w') as of:
+		json.dump(results, of, indent = 1, sort_keys = True)
+
+	print 'Configurations by average self-similarity:'
+	for result in results:
+		print '\t{0}\t{1}'.format('{0:.4f}'.format(result['score']) if result['score'] is not None else 'failed', result['tag'])
+	print 'Done! Wrote {0}, total time elapsed: {1:.2f} seconds'.format(args.output, time.time() - start_time)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import argparse, json, multiprocessing, os, re, shutil, time
+from collections import deque
+from instrumentation import add_arguments, configure_from_args, stage
+
+'''
+Script for tokenizing the raw year slices of a newspaper (working/{paper}_{year}, as written by scrape_news.py)
+into the {paper}_{year}_tokenized slices and the combined {paper}_all_tokenized file used by the other scripts:
+one sentence per line, tokens separated by spaces, case preserved. Raw files are streamed in chunks of lines,
+which are tokenized and sentence-split by a process pool. Only a bounded number of chunks is in flight, and
+results are written in order, so memory use does not depend on the size of the corpus. The number of tokens
+and sentences per slice is counted in the same pass and written to working/{paper}_tokenized_totals.json.
+'''
+
+# Abbreviations keeping their period, so they do not end a sentence
+abbreviations = ['aanv', 'afb', 'afd', 'blz', 'bijv', 'ca', 'cf', 'dhr', 'dr', 'drs', 'e', 'enz', 'etc', 'evt', 'fa', 'ing', 'ir', 'jl', 'jr', 'max', 'min', 'mln', 'mld', 'mevr', 'mr', 'mw', 'nl', 'nr', 'prof', 'resp', 'sr', 'st', 'tel', 'vgl', 'vs', 'zg']
+
+token_pattern = re.compile(ur'''
+	(?:https?://|www\.)\S+[^\s.,;:!?)"'] # URLs
+	|[\w.+-]+@[\w-]+(?:\.[\w-]+)+ # E-mail addresses
+	|'s-\w+(?:-\w+)* # Place names like 's-Hertogenbosch
+	|'(?:s|t|n)\b # Clitics like 's ochtends, 't, 'n
+	|\b(?:[^\W\d_]\.){2,} # Abbreviations with several periods, like o.a. and m.b.t.
+	|\b(?:''' + '|'.join(abbreviations) + ur''')\. # Abbreviations with one period
+	|\d+(?:[.,:/]\d+)* # Numbers, amounts, times and dates, like 1.000, 3,5, 12:30
+	|\w+(?:['’-]\w+)* # Words, including auto's, zo'n and Noord-Holland
+	|\.{2,}|… # Ellipses
+	|[^\w\s] # Any other character on its own
+	''', re.UNICODE | re.VERBOSE | re.IGNORECASE)
+
+sentence_ends = set([u'.', u'!', u'?', u'…']) | set([u'.' * length for length in range(2, 10)])
+closing = set([u'"', u"'", u')', u'”', u'’', u'\xbb'])
+# Quotes that open as well as close a quotation
+straight_quotes = set([u'"', u"'"])
+
+def tokenize_paragraph(text):
+	'''Tokenizes a paragraph, returns a list of sentences (lists of tokens)'''
+
+	sentences = []
+	sentence = []
+	tokens = token_pattern.findall(text)
+	for idx, token in enumerate(tokens):
+		sentence.append(token)
+		if token in sentence_ends or (token in closing and len(sentence) > 1 and sentence[-2] in sentence_ends):
+			next_token = tokens[idx + 1] if idx + 1 < len(tokens) else None
+			# A straight quote after the end of a sentence opens the next sentence if no quote is open in this one
+			# and a capital or number follows it, else it closes this sentence
+			if next_token in straight_quotes and sentence.count(next_token) % 2 == 0 and idx + 2 < len(tokens) and not tokens[idx + 2][0].islower():
+				sentences.append(sentence)
+				sentence = []
+			# A sentence only ends before a capital, a number or an opening quote or bracket
+			elif next_token is None or not (next_token in closing or next_token[0].islower() or next_token in sentence_ends):
+				sentences.append(sentence)
+				sentence = []
+	if sentence:
+		sentences.append(sentence)
+	return sentences
+
+def tokenize_chunk(lines):
+	'''Process pool worker: tokenizes a chunk of raw lines (UTF-8), returns the tokenized text and its number of tokens and sentences'''
+
+	output = []
+	num_tokens = 0
+	for line in lines:
+		for sentence in tokenize_paragraph(line.decode('utf-8', 'replace')):
+			output.append(u' '.join(sentence))
+			num_tokens += len(sentence)
+	text = u'\n'.join(output) + u'\n' if output else u''
+	return text.encode('utf-8'), num_tokens, len(output)
+
+def read_chunks(f, chunk_size):
+	'''Yields chunks of (at most chunk_size) non-empty lines of a file'''
+
+	chunk = []
+	for line in f:
+		if line.strip():
+			chunk.append(line)
+			if len(chunk) >= chunk_size:
+				yield chunk
+				chunk = []
+	if chunk:
+		yield chunk
+
+def tokenize_slice(pool, fn, outputs, chunk_size = 2000, max_pending = 8, tokenize_stage = None):
+	'''Tokenizes a raw year slice with the process pool, writes the result in order to all output files.
+	At most max_pending chunks are queued at the same time. Returns the number of tokens and sentences'''
+
+	num_tokens = 0
+	num_sentences = 0
+	pending = deque()
+	def write(result):
+		text, chunk_tokens, chunk_sentences = result
+		for of in outputs:
+			of.write(text)
+		return chunk_tokens, chunk_sentences
+	with open(fn, 'r') as f:
+		for chunk in read_chunks(f, chunk_size):
+			pending.append(pool.apply_async(tokenize_chunk, (chunk,)))
+			if len(pending) >= max_pending:
+				chunk_tokens, chunk_sentences = write(pending.popleft().get())
+				num_tokens += chunk_tokens
+				num_sentences += chunk_sentences
+				if tokenize_stage is not None:
+					tokenize_stage.progress(num_tokens, every = 10)
+		while pending:
+			chunk_tokens, chunk_sentences = write(pending.popleft().get())
+			num_tokens += chunk_tokens
+			num_sentences += chunk_sentences
+	return num_tokens, num_sentences
+
+def totals_path(corpus_dir, paper):
+	'''Returns the filename of the token and sentence totals per slice of a newspaper'''
+
+	return os.path.join(corpus_dir, '{0}_tokenized_totals.json'.format(paper))
+
+def tokenize_newspaper(corpus_dir, paper, years, processes = None, chunk_size = 2000, write_all = True):
+	'''Tokenizes the raw year slices of a newspaper, and optionally writes the combined slice of all years (from the
+	tokenized slices of every year, not only the given ones). Returns the totals per year, which are also merged into
+	the totals file'''
+
+	pool = multiprocessing.Pool(processes)
+	max_pending = 2 * (processes or multiprocessing.cpu_count())
+	totals = {}
+	if os.path.exists(totals_path(corpus_dir, paper)):
+		with open(totals_path(corpus_dir, paper), 'r') as f:
+			totals = json.load(f)
+	# Write to temporary files, so an interrupted run never leaves a partial slice behind
+	all_fn = os.path.join(corpus_dir, '{0}_all_tokenized'.format(paper))
+	all_years = range(1994,2017)
+	# Write the combined slice while tokenizing if all years are tokenized in order, else rebuild it afterwards
+	all_file = open(all_fn + '.tmp', 'w') if write_all and list(years) == all_years else None
+	for year in years:
+		print 'Tokenizing {0}_{1}...'.format(paper, year)
+		time_0 = time.time()
+		fn = os.path.join(corpus_dir, '{0}_{1}_tokenized'.format(paper, year))
+		with open(fn + '.tmp', 'w') as of:
+			with stage('tokenize_slice', paper = paper, year = year, unit = 'tokens') as tokenize_stage:
+				num_tokens, num_sentences = tokenize_slice(pool, os.path.join(corpus_dir, '{0}_{1}'.format(paper, year)), [of] + ([all_file] if all_file else []), chunk_size, max_pending, tokenize_stage)
+				tokenize_stage.items = num_tokens
+		os.rename(fn + '.tmp', fn)
+		totals[str(year)] = {'tokens': num_tokens, 'sentences': num_sentences}
+		print 'Done! {0} tokens in {1} sentences, took {2:.2f} seconds'.format(num_tokens, num_sentences, time.time() - time_0)
+	if all_file:
+		all_file.close()
+		os.rename(all_fn + '.tmp', all_fn)
+	elif write_all:
+		slice_fns = [os.path.join(corpus_dir, '{0}_{1}_tokenized'.format(paper, year)) for year in all_years]
+		missing = [year for year, fn in zip(all_years, slice_fns) if not os.path.exists(fn)]
+		if missing:
+			print 'Not writing {0}: no tokenized slices for {1}'.format(all_fn, ', '.join(str(year) for year in missing))
+		else:
+			print 'Combining all tokenized slices into {0}...'.format(all_fn)
+			with open(all_fn + '.tmp', 'w') as of:
+				for fn in slice_fns:
+					with open(fn, 'r') as f:
+						shutil.copyfileobj(f, of)
+			os.rename(all_fn + '.tmp', all_fn)
+	pool.close()
+	pool.join()
+	with open(totals_path(corpus_dir, paper), 'w') as of:
+		json.dump(totals, of, indent = 1, sort_keys = True)
+	return dict((year, totals[str(year)]) for year in years)
+
+def format_count(count):
+	'''Formats a token count in millions, as in corpus_stats.txt'''
+
+	return '{0:.1f}M'.format(count / 1e6)
+
+if __name__ == '__main__':
+	# Get arguments
+	parser = argparse.ArgumentParser(description = '')
+	parser.add_argument('newspaper', metavar = 'trouw|volkskrant', type = str, help = "Specify which newspaper (Trouw or Volkskrant) to tokenize")
+	parser.add_argument('-y', '--years', metavar = 'YEAR', type = int, nargs = '+', default = range(1994,2017), help = "Specify which years to tokenize, default is 1994-2016")
+	parser.add_argument('-d', '--corpus-dir', metavar = 'DIR', type = str, default = 'working', help = "Specify the directory containing the raw year slices, default is working")
+	parser.add_argument('-p', '--processes', metavar = 'NUM', type = int, help = "Number of tokenizer processes, default is the number of cores")
+	parser.add_argument('-cs', '--chunk-size', metavar = 'NUM_LINES', type = int, default = 2000, help = "Number of raw lines (paragraphs) per chunk, default is 2000")
+	parser.add_argument('-na', '--no-all', action = 'store_true', help = "Do not write the combined {paper}_all_tokenized file of all years")
+	add_arguments(parser)
+	args = parser.parse_args()
+	configure_from_args(args)
+	paper = args.newspaper
+	if paper not in ['volkskrant', 'trouw']:
+		print 'Not an available newspaper!'
+		raise SystemExit
+
+	time_0 = time.time()
+	totals = tokenize_newspaper(args.corpus_dir, paper, args.years, args.processes, args.chunk_size, not args.no_all)
+	print '\n{0} TOKEN COUNTS, PER YEAR'.format(paper.upper())
+	for year in args.years:
+		print '{0} - {1}'.format(year, format_count(totals[year]['tokens']))
+	total = sum(year_totals['tokens'] for year_totals in totals.values())
+	print 'TOTAL - {0}'.format(format_count(total))
+	print 'AVERAGE - {0}'.format(format_count(total / float(len(totals))))
+	print 'Done! Total time elapsed: {0:.2f} seconds'.format(time.time() - time_0)
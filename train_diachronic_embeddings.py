@@ -2,7 +2,12 @@
 # -*- coding:utf-8 -*-
 
 import gensim
-import codecs, argparse, time
+import numpy as np
+import codecs, argparse, time, os, glob
+from shard_corpus import shard_sentences, shard_path, ResampledSentences
+from frequency_index import open_frequency_index, index_path
+from instrumentation import add_arguments, configure_from_args, stage
+import artifact_cache
 
 '''
 Script for training word embeddings on a diachronic corpus using gensim, in per-year slices. 
@@ -19,69 +24,273 @@ parser.add_argument('-r', '--reverse', action = 'store_true', help = "Train in r
 parser.add_argument('-va', '--vocab-all', action = 'store_true', help = "Use the whole corpus (all years) to generate the vocabulary") 
 parser.add_argument('-in', '--initialize', action = 'store_true', help = "Initialize embedding using first slice")
 parser.add_argument('-is', '--intersect', action ='store_true', help = "Use intersect on saved embeddings of previous slice")
+parser.add_argument('-re', '--resume', action = 'store_true', help = "Resume training from the checkpoint of the last finished year slice")
+parser.add_argument('-ay', '--append-year', metavar = 'YEAR', type = int, help = "Only train a newly added year slice, on top of the checkpoint of the year before")
+parser.add_argument('-sh', '--shards', action = 'store_true', help = "Read the year slices from binary sentence shards (see shard_corpus.py) instead of tokenized text")
+parser.add_argument('-id', '--independent', action = 'store_true', help = "Train every year slice independently from scratch (to be aligned afterwards with align_embeddings.py)")
+parser.add_argument('-y', '--years', metavar = 'YEAR', type = int, nargs = '+', help = "Only train these year slices (with --independent)")
+parser.add_argument('-kc', '--keep-checkpoints', action = 'store_true', help = "Keep the full model checkpoints of all year slices, instead of only the last one")
+parser.add_argument('-vc', '--vocab-counts', action = 'store_true', help = "Build the vocabulary from the frequency index (see frequency_index.py) instead of scanning the text")
+parser.add_argument('-sg', '--sg', metavar = '0|1', type = int, default = 1, help = "Training algorithm: 1 for skip-gram, 0 for CBOW, default is 1")
+parser.add_argument('-hs', '--hs', metavar = '0|1', type = int, default = 1, help = "Use hierarchical softmax (1) or negative sampling (0), default is 1")
+parser.add_argument('-lr', '--alpha', metavar = 'RATE', type = float, default = 0.01, help = "Initial learning rate, default is 0.01")
+parser.add_argument('-sz', '--size', metavar = 'DIM', type = int, default = 200, help = "Dimension of the embeddings, default is 200")
+parser.add_argument('-w', '--window', metavar = 'SIZE', type = int, default = 5, help = "Context window size, default is 5")
+parser.add_argument('-mc', '--min-count', metavar = 'COUNT', type = int, default = 30, help = "Ignore words with a lower count in the vocabulary slice(s), default is 30")
+parser.add_argument('-it', '--iter', metavar = 'NUM', type = int, default = 20, help = "Number of training epochs per slice, default is 20")
+parser.add_argument('-sd', '--seed', metavar = 'SEED', type = int, default = 1, help = "Random seed of the model initialization (and of --resample), default is 1")
+parser.add_argument('-rs', '--resample', metavar = 'RATE', type = float, help = "Train on a bootstrap resample of every slice, repeating each sentence Poisson(RATE) times, e.g. 1.0")
+parser.add_argument('-tg', '--tag', metavar = 'TAG', type = str, default = '', help = "Append this tag to all output filenames, e.g. to keep the results of different hyperparameters apart")
+add_arguments(parser)
+artifact_cache.add_arguments(parser)
 args = parser.parse_args()
+configure_from_args(args)
+cache = artifact_cache.open_cache(args)
 paper = args.newspaper
 if paper not in ['volkskrant', 'trouw']:
 	print 'Not an available newspaper!'
 	raise SystemExit
 
-# Initialize model
-model = gensim.models.Word2Vec(sg=1, hs=1, alpha=0.01, size=200, window=5, min_count=30, iter=20, workers = args.max_threads)
-print 'Initialized model'
-
 # Generate year slice numbers
 years = range(1994,2017)
+if args.append_year:
+	if args.reverse:
+		print 'Appending a year is only possible when training from older to recent years!'
+		raise SystemExit
+	years = range(1994, args.append_year + 1)
 if args.reverse:
 	years.reverse()
 
-# Initialize vocabulary
-if args.vocab_all:
-	try:
-		vocab_file = codecs.open('working/{0}_all_tokenized'.format(paper), 'r', encoding = 'utf-8')
-	except IOError:
-		print 'The file working/{0}_all_tokenized doesn\'t exist!'.format(paper)
-		raise SystemExit
+# Add reverse and tag to output filenames
+if args.reverse:
+	suffix = '_reverse' + args.tag
 else:
+	suffix = args.tag
+
+# Word2Vec hyperparameters
+hyperparameters = dict(sg=args.sg, hs=args.hs, alpha=args.alpha, size=args.size, window=args.window, min_count=args.min_count, iter=args.iter, seed=args.seed)
+
+def checkpoint_path(year):
+	'''Returns the filename of the full model checkpoint saved after training on a year slice'''
+
+	return 'working/{0}_{1}{2}.model'.format(paper, year, suffix)
+
+def checkpoint_files(year):
+	'''Returns the files of a checkpoint (gensim stores large arrays next to it, as .npy files)'''
+
+	return glob.glob(checkpoint_path(year)) + glob.glob(checkpoint_path(year) + '.*.npy')
+
+def remove_checkpoint(year):
+	'''Removes the checkpoint of a year slice'''
+
+	for fn in checkpoint_files(year):
+		os.remove(fn)
+
+def new_model():
+	'''Returns a new, untrained model'''
+
+	return gensim.models.Word2Vec(workers = args.max_threads, **hyperparameters)
+
+def vocab_sentences(vocab_years):
+	'''Returns the sentences to build the vocabulary from: all years, or the given year slices'''
+
+	if args.shards:
+		return shard_sentences('working', paper, years if args.vocab_all else vocab_years)
+	if args.vocab_all:
+		fn = 'working/{0}_all_tokenized'.format(paper)
+	else:
+		fn = 'working/{0}_{1}_tokenized'.format(paper, vocab_years[0])
 	try:
-		vocab_file = codecs.open('working/{0}_{1}_tokenized'.format(paper, years[0]), 'r', encoding = 'utf-8')
+		vocab_file = codecs.open(fn, 'r', encoding = 'utf-8')
 	except IOError:
-		print 'The file working/{0}_{1}_tokenized doesn\'t exist!'.format(paper, years[0])
+		print 'The file {0} doesn\'t exist!'.format(fn)
 		raise SystemExit
-vocab_sentences = gensim.models.word2vec.LineSentence(vocab_file)
-model.build_vocab(vocab_sentences)
-print 'Initialized vocabulary'
+	return gensim.models.word2vec.LineSentence(vocab_file)
 
-# Add reverse to output filenames
-if args.reverse:
-	reverse = '_reverse'
+def build_vocab(model, vocab_years):
+	'''Builds the vocabulary of a model by scanning the vocabulary slices, or from their counts in the frequency index,
+	so the scan is shared by all models (e.g. of a hyperparameter sweep) instead of repeated for each'''
+
+	if not args.vocab_counts:
+		model.build_vocab(vocab_sentences(vocab_years))
+		return
+	counts = open_frequency_index('working', paper)
+	vocab_years = years if args.vocab_all else vocab_years[:1]
+	totals = np.asarray(counts.counts[[counts.year_index[year] for year in vocab_years]]).sum(axis = 0, dtype = np.int64)
+	words = sorted(counts.index, key = counts.index.get)
+	model.raw_vocab = dict((words[idx], int(totals[idx])) for idx in np.flatnonzero(totals))
+	model.corpus_count = sum(counts.meta['sentences'][counts.year_index[year]] for year in vocab_years)
+	model.scale_vocab()
+	model.finalize_vocab()
+
+def vocab_inputs(vocab_years):
+	'''Returns the input files the vocabulary is built from, for fingerprinting'''
+
+	if args.vocab_counts:
+		return [os.path.join(index_path('working', paper), fn) for fn in ['counts.npy', 'vocab.txt', 'meta.json']]
+	if args.shards:
+		return [shard_path('working', paper, year) for year in (years if args.vocab_all else vocab_years)] + ['working/{0}_counts/vocab.txt'.format(paper)]
+	if args.vocab_all:
+		return ['working/{0}_all_tokenized'.format(paper)]
+	return ['working/{0}_{1}_tokenized'.format(paper, vocab_years[0])]
+
+def slice_inputs(year):
+	'''Returns the input files of a year slice, for fingerprinting'''
+
+	if args.shards:
+		return [shard_path('working', paper, year)] + ['working/{0}_counts/vocab.txt'.format(paper)]
+	return ['working/{0}_{1}_tokenized'.format(paper, year)]
+
+def slice_fingerprints():
+	'''Returns the cache fingerprint of every slice in the chain, which depends on all slices before it'''
+
+	params = dict(hyperparameters, paper = paper, suffix = suffix, initialize = args.initialize, intersect = args.intersect, shards = args.shards, resample = args.resample,
+		vocab_all = args.vocab_all, vocab_counts = args.vocab_counts, vocab = cache.fingerprint('vocab', vocab_inputs(years[:1])))
+	fingerprints = []
+	previous = None
+	for year in years:
+		previous = cache.fingerprint('train_slice', slice_inputs(year), dict(params, year = year, previous = previous))
+		fingerprints.append(previous)
+	return fingerprints
+
+def slice_sentences(year):
+	'''Returns the sentences of a year slice, from its shard or its tokenized text file, resampled with --resample'''
+
+	if args.shards:
+		sentences = shard_sentences('working', paper, [year])
+	else:
+		input_file = codecs.open('working/{0}_{1}_tokenized'.format(paper, year), 'r', encoding = 'utf-8')
+		sentences = gensim.models.word2vec.LineSentence(input_file)
+	if args.resample:
+		# Seeded per slice, so every replicate and slice gets a different, reproducible resample
+		return ResampledSentences(sentences, args.resample, [args.seed, year])
+	return sentences
+
+# Train every slice from scratch if argument given, no chaining
+if args.independent:
+	for year in (args.years or years):
+		fingerprint = None
+		if cache is not None and all(os.path.exists(fn) for fn in slice_inputs(year) + vocab_inputs([year])):
+			fingerprint = cache.fingerprint('train_independent', slice_inputs(year) + vocab_inputs([year]), dict(hyperparameters, paper = paper, year = year, tag = args.tag, vocab_all = args.vocab_all, shards = args.shards, resample = args.resample))
+			if cache.restore('train_independent', fingerprint, 'working'):
+				print 'Restored year {0} from the cache'.format(year)
+				continue
+		print 'Training on year {0}'.format(year)
+		time_before = time.time()
+		model = new_model()
+		with stage('build_vocab', paper = paper, year = year, mode = 'independent'):
+			build_vocab(model, [year])
+		with stage('train_slice', paper = paper, year = year, mode = 'independent', unit = 'words') as train_stage:
+			train_stage.items = model.train(slice_sentences(year))
+		model.save_word2vec_format('working/{0}_{1}_independent{2}.w2v'.format(paper, year, args.tag))
+		if fingerprint is not None:
+			cache.store('train_independent', fingerprint, ['working/{0}_{1}_independent{2}.w2v'.format(paper, year, args.tag)], {'paper': paper, 'year': year})
+		print 'Training on year {0} took {1} seconds'.format(year, time.time() - time_before)
+	print 'Done! Total time elapsed: {0} seconds'.format(time.time() - start_time)
+	raise SystemExit
+
+# Cache fingerprints of the slices in the chain
+# Only fingerprint existing files, missing slices are reported when training
+if cache is not None and not all(os.path.exists(fn) for fn in vocab_inputs(years[:1]) + [fn for year in years for fn in slice_inputs(year)]):
+	print 'Not using the cache, not all input slices exist'
+	cache = None
+fingerprints = slice_fingerprints() if cache is not None else None
+
+# Find slice to start from when resuming or appending
+start_idx = 0
+if args.append_year:
+	start_idx = len(years) - 1
+	# The checkpoint of the last slice of a finished chain is cached, so appending also works from the cache
+	if not os.path.exists(checkpoint_path(years[start_idx - 1])) and not (cache is not None and cache.restore('train_checkpoint', fingerprints[start_idx - 1], 'working')):
+		print 'The checkpoint {0} doesn\'t exist!'.format(checkpoint_path(years[start_idx - 1]))
+		raise SystemExit
+elif args.resume:
+	for idx in reversed(range(len(years))):
+		if os.path.exists(checkpoint_path(years[idx])):
+			start_idx = idx + 1
+			break
+	if start_idx == len(years):
+		print 'All year slices have already been trained'
+		raise SystemExit
+	if start_idx == 0:
+		print 'No checkpoint found, training from the start'
+
+# Skip the slices whose outputs are cached for the same inputs, hyperparameters and flags
+if cache is not None:
+	num_cached = 0
+	while num_cached < len(years) and cache.has('train_slice', fingerprints[num_cached]):
+		num_cached += 1
+	# Training continues from the checkpoint of the last restored slice, and only the checkpoint of the last slice of
+	# a chain is cached, so only restore up to a slice with a cached checkpoint (or the whole chain)
+	while start_idx < num_cached < len(years) and not cache.has('train_checkpoint', fingerprints[num_cached - 1]):
+		num_cached -= 1
+	if num_cached > start_idx:
+		for idx in range(start_idx, num_cached):
+			cache.restore('train_slice', fingerprints[idx], 'working')
+		cache.restore('train_checkpoint', fingerprints[num_cached - 1], 'working')
+		if start_idx > 0 and not args.keep_checkpoints:
+			remove_checkpoint(years[start_idx - 1])
+		print 'Restored year slices {0} to {1} from the cache'.format(years[start_idx], years[num_cached - 1])
+		start_idx = num_cached
+	if start_idx == len(years):
+		print 'All year slices have already been trained'
+		raise SystemExit
+
+if start_idx > 0:
+	# Load model from checkpoint
+	model = gensim.models.Word2Vec.load(checkpoint_path(years[start_idx - 1]))
+	model.workers = args.max_threads
+	print 'Loaded checkpoint of year {0}'.format(years[start_idx - 1])
 else:
-	reverse = ''
+	# Initialize model
+	model = new_model()
+	print 'Initialized model'
+
+	# Initialize vocabulary
+	with stage('build_vocab', paper = paper, year = years[0], mode = 'chained' + suffix):
+		build_vocab(model, years[:1])
+	print 'Initialized vocabulary'
 
 # Cycle through year slices
 for idx, year in enumerate(years):
+	if idx < start_idx:
+		continue
 	# Initialize on first slice if argument given
 	if idx == 0 and args.initialize:
 		print 'Initializing on year {0}'.format(year)
 		time_before = time.time()
-		input_file = codecs.open('working/{0}_{1}_tokenized'.format(paper, year), 'r', encoding = 'utf-8')
-		sentences = gensim.models.word2vec.LineSentence(input_file)
-		model.train(sentences)
-		model.save_word2vec_format('working/{0}_initial{1}.w2v'.format(paper, reverse))
+		with stage('train_slice', paper = paper, year = 'initial', mode = 'chained' + suffix, unit = 'words') as train_stage:
+			train_stage.items = model.train(slice_sentences(year))
+		model.save_word2vec_format('working/{0}_initial{1}.w2v'.format(paper, suffix))
 		if args.intersect:
-			model.intersect_word2vec_format('working/{0}_initial{1}.w2v'.format(paper, reverse))
+			model.intersect_word2vec_format('working/{0}_initial{1}.w2v'.format(paper, suffix))
 		print 'Initializing took {0} seconds'.format(time.time() - time_before)
 	# Train on year slices
 	print 'Training on year {0}'.format(year)
 	time_before = time.time()
 	# Intersect if argument given
 	if idx != 0 and args.intersect:
-		model.intersect_word2vec_format('working/{0}_{1}{2}.w2v'.format(paper, years[idx - 1], reverse))
+		model.intersect_word2vec_format('working/{0}_{1}{2}.w2v'.format(paper, years[idx - 1], suffix))
 	# Read new input slice
-	input_file = codecs.open('working/{0}_{1}_tokenized'.format(paper, year), 'r', encoding = 'utf-8')
-	sentences = gensim.models.word2vec.LineSentence(input_file)
-	# Train and store embeddings
-	model.train(sentences)
-	model.save_word2vec_format('working/{0}_{1}{2}.w2v'.format(paper, year, reverse))
+	sentences = slice_sentences(year)
+	# Train and store embeddings, and a full checkpoint to continue training from
+	with stage('train_slice', paper = paper, year = year, mode = 'chained' + suffix, unit = 'words') as train_stage:
+		train_stage.items = model.train(sentences)
+	with stage('save_slice', paper = paper, year = year, mode = 'chained' + suffix):
+		model.save_word2vec_format('working/{0}_{1}{2}.w2v'.format(paper, year, suffix))
+		# Remove an older checkpoint of this slice first, so none of its .npy files are left next to the new one
+		remove_checkpoint(year)
+		model.save(checkpoint_path(year))
+	if cache is not None:
+		# Cache the embeddings of every slice, but the full checkpoint only of the last slice, to append or continue from
+		outputs = ['working/{0}_{1}{2}.w2v'.format(paper, year, suffix)]
+		if idx == 0 and args.initialize:
+			outputs.append('working/{0}_initial{1}.w2v'.format(paper, suffix))
+		cache.store('train_slice', fingerprints[idx], outputs, {'paper': paper, 'year': year})
+		if idx == len(years) - 1:
+			cache.store('train_checkpoint', fingerprints[idx], checkpoint_files(year), {'paper': paper, 'year': year})
+	if idx != 0 and not args.keep_checkpoints:
+		remove_checkpoint(years[idx - 1])
 	print 'Training on year {0} took {1} seconds'.format(year, time.time() - time_before)
 
 print 'Done! Total time elapsed: {0} seconds'.format(time.time() - start_time)